@@ -11,7 +11,12 @@ import os
 import argparse
 import matplotlib
 import scipy.sparse as sp
+import sys
 from matplotlib import gridspec
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "classifications"))
+from patent_ids import encode_index, encode_patent_ids, decode_patent_ids
+from citation_ingest import date_days, NO_DATE
+from citation_statistics import load_citation_statistics, curve_matrix
 
 """ Set to non-GUI environment before importing pyplot"""
 matplotlib.use('Agg')
@@ -19,16 +24,17 @@ import matplotlib.pyplot as plt
 
 """ auxiliary functions"""
 
-def rm_leading_zeros(keylist):
-    """ Function to remove leading zeros and spaces from list of strings (such as patent IDs)
-     Arguments: keylist: list of strings
-     Returns: list of strings"""
-    keylist = [di.strip() for di in keylist]
-    maxlen = np.max([len(di) for di in keylist])
-    for i in range(maxlen - 1):
-        keylist = [di[1:] if di[0]=="0" else di for di in keylist]
-        newlen = len(keylist)
-    return keylist
+def reindex_by_patent_ids(pddf, keys):
+    """ Function to select the rows of a data frame indexed by patent IDs in the order of a list of patent IDs.
+     IDs are matched by their canonical int64 keys (see patent_ids.py), so leading zeros and spaces do not matter.
+     Arguments: pddf: pandas DataFrame indexed by patent IDs
+                keys: list or array of strings (patent IDs)
+     Returns: pandas DataFrame indexed by keys (NaN rows for missing IDs)"""
+    pddf = encode_index(pddf, errors="coerce")
+    pddf = pddf[~pddf.index.duplicated(keep='first')]
+    pddf = pddf.reindex(encode_patent_ids(keys, errors="coerce"))
+    pddf.index = keys
+    return pddf
 
 
 """ class definitions"""
@@ -47,7 +53,7 @@ class CitationCurveSet():
         self.voluntaryOnly = voluntaryOnly
         self.patentYearDataframeFile = "patents_dates_years.pkl"
         if self.voluntaryOnly:
-            self.citationCurveFileName = "citation_curves_voluntary.pkl"
+            self.citationStatisticsDirName = "citation_statistics_voluntary"
             self.citationCurveTLenFileName = "citation_curves_total_lengths_voluntary.pkl"
             self.citationCurveMatrixFileName = "citation_curves_voluntary.npz"
             self.citationCurveMatrixKeysFileName = "citation_curves_voluntary_keys.pkl"
@@ -55,7 +61,7 @@ class CitationCurveSet():
             self.separationClassFile = "citation_curves_voluntary_separation_class.pkl"
             self.separationYearFile = "citation_curves_voluntary_separation_year.pkl"
         else:
-            self.citationCurveFileName = "citation_curves.pkl"
+            self.citationStatisticsDirName = "citation_statistics"
             self.citationCurveTLenFileName = "citation_curves_total_lengths.pkl"
             self.citationCurveMatrixFileName = "citation_curves.npz"
             self.citationCurveMatrixKeysFileName = "citation_curves_keys.pkl"
@@ -80,42 +86,27 @@ class CitationCurveSet():
             self.citation_curve_matrix = sp.load_npz(self.citationCurveMatrixFileName) 
             
         else:
-            print("Loading citation lists...")
-            assert os.path.exists(self.citationCurveFileName)
-            with open(self.citationCurveFileName, "rb") as rfile:
-                self.citation_curves = pickle.load(rfile)
-
-            print("Loading dates lists...")
-            pddf = pd.read_pickle(self.patentYearDataframeFile)      # should have: "applied date", "granted date", "applied year", "granted year"
-            
-            print("Removing empty entries from citation curves...")
-            for key in np.asarray(list(self.citation_curves.keys())):
-                if len(self.citation_curves[key]) == 0:
-                    del self.citation_curves[key]
+            print("Loading citation statistics...")
+            assert os.path.exists(self.citationStatisticsDirName)
+            statistics = load_citation_statistics(self.citationStatisticsDirName, mmap_mode="r")
             
             print("Obtaining keys...")
-            self.citation_curves_keys = np.asarray(list(self.citation_curves.keys()))
-            print("Cleaning and sorting dates list...")
-            #pddf = pddf.loc[self.citation_curves_keys]
-            #pddf = pddf.loc[pddf["granted date"].notnull()]
-            pddf = pddf.reindex(self.citation_curves_keys)
-            pddf = pddf.reindex(pddf["granted date"].notnull())
-            pddf = pddf.sort_values(by=["granted date"], ascending=False)
-            print("Obtaining cleaned keys...")
-            self.citation_curves_keys = np.asarray(pddf.index)
+            """Patents with at least one citation in the citation curves, sorted by granted date (newest first)"""
+            grant_days = statistics["grant_days"]
+            rows = np.flatnonzero((np.diff(statistics["curve_offsets"]) > 0) & (grant_days != NO_DATE))
+            rows = rows[np.argsort(-grant_days[rows].astype(np.int64), kind="stable")]
+            self.citation_curves_keys = decode_patent_ids(statistics["nodes"][rows])
             
             print("Populating citation curve length records...")
-            #last_granted_date = max(pddf["granted date"])
-            last_possible_citation_date = pd.to_datetime("2018-09-01")                                  # this is about when we downloaded the citation file
-            self.tlen = np.asarray([td.days for td in (last_possible_citation_date - pddf["granted date"])])
+            last_possible_citation_day = date_days(pd.Series(["2018-09-01"]))[0]                    # this is about when we downloaded the citation file
+            self.tlen = last_possible_citation_day - grant_days[rows].astype(np.int64)
             self.maxlen = max(self.tlen)
             
             print("Converting citation curves into sparse matrix...")
-            self.citation_curve_matrix = None
-            self.populate_citation_curve_matrix()
-            
-            print("Freeing memory...")
-            del self.citation_curves
+            """The sparse matrix lists the number of new citations by days of age of the patent. Summing over rows up to a 
+               certain column gives the number of citations up to that day. As rows are sorted by age of the patents,
+               subsetting the rows gives the patents alive in the dataset after a certain day of life."""
+            self.citation_curve_matrix = curve_matrix(statistics, rows, self.maxlen + 1)
             
             print("Saving citation curves as sparse matrix and saving associated records...")
             sp.save_npz(self.citationCurveMatrixFileName, self.citation_curve_matrix)
@@ -127,39 +118,13 @@ class CitationCurveSet():
         assert self.citation_curve_matrix.shape[0] == len(self.tlen) == len(self.citation_curves_keys)
         print("Sanity check succeeded. All set up.")
     
-    def populate_citation_curve_matrix(self):
-        """Function to transform citation curves in dict fromat into csr sparse matrix.
-                The sparse matrix lists the number of new citation by days of age of the patent.
-                Summing over rows up to a certain column will thus conveniently give the number of citations on that day.
-                The matrix is sorted by ages of the patents (i.e. inversely by length of life so far). Consequently
-                subsetting the rows allows to get the subset of patents alive in the dataset after a certain day of life.
-            Arguments: None
-            Resturns None"""
-        self.citation_curve_matrix = sp.dok_matrix((len(self.citation_curves_keys), self.maxlen+1), dtype=np.int8)
-        maxidx = len(self.citation_curves_keys)
-        for idx, key in enumerate(self.citation_curves_keys):
-            print("Done {0:7d} / {1:7d}".format(idx, maxidx), end="\r")
-            times = self.citation_curves[key]
-            inttimes = [td.days for td in times]
-            unique_inttimes, count_inttimes = np.unique(inttimes, return_index=True)
-            duplicates = np.setdiff1d(np.arange(len(inttimes)), count_inttimes)
-            try:
-                self.citation_curve_matrix[idx, unique_inttimes] = 1
-                for dup in duplicates:
-                    self.citation_curve_matrix[idx, dup] += 1
-            except:
-                print("\nFailed at: self.citation_curve_matrix[idx, inttimes] = 1")
-                pdb.set_trace()
-
-        self.citation_curve_matrix = self.citation_curve_matrix.tocsr()
-        
     def populate_class_separation(self, cpc_matrix_file="patent_classification_matrix_all.npz", cpc_keys_file="patent_classification_matrix_node_keys7.pkl"):
         """Method for populating separation of patents (citation curves) by patent CPC classes.
            The method populates the variable self.class_separation as a pandas dataframe with bool indicators of whether
                 the patent belongs to a each of the CPC sections. This can easily be extended to classes by using
-                    categs = np.unique([k[:2] for k in cpc_keys[2]])
+                    parent_codes = pd.Series(cpc_keys[2], dtype=object).str[:3]
                 instead of
-                    categs = np.unique([k[0] for k in cpc_keys[2]])
+                    parent_codes = pd.Series(cpc_keys[2], dtype=object).str[:1]
             Arguments:
                 cpc_matrix_file: str    -   filename of patent classification matrix
                 cpc_keys_file:  str     -   filename of pickle file containing keys for patent classification matrix
@@ -174,23 +139,23 @@ class CitationCurveSet():
             with open(cpc_keys_file, "rb") as rfile:
                 cpc_keys = pickle.load(rfile)
             
-            """Define categories"""
-            categs = np.unique([k[0] for k in cpc_keys[2]])     # sections
-            #categs = np.unique([k[:2] for k in cpc_keys[2]])    # classes
-            #categs = np.unique(cpc_keys[2])                     # subclasses
+            """Define categories: parent code of each column"""
+            parent_codes = pd.Series(cpc_keys[2], dtype=object).str[:1]     # sections
+            #parent_codes = pd.Series(cpc_keys[2], dtype=object).str[:3]    # classes
+            #parent_codes = pd.Series(cpc_keys[2], dtype=object)            # subclasses
+            parent_idx, categs = pd.factorize(parent_codes, sort=True)
             
-            """Create and populate data frame"""
-            cpc_df = pd.DataFrame(index=rm_leading_zeros(cpc_keys[0]))
+            """Roll up columns to categories with one sparse product"""
+            aggregation = sp.csr_matrix((np.ones(len(parent_idx), dtype=np.int32), parent_idx, \
+                                            np.arange(len(parent_idx) + 1)), shape=(len(parent_idx), len(categs)))
+            cat_presence = sp.csr_matrix(cpc, dtype=np.int32).dot(aggregation).toarray() > 0
             
-            for cat in categs:
-                columns = np.where(np.array([k[0] for k in cpc_keys[2]])==cat)[0]
-                sum_columns = cpc[:,columns].sum(axis=1)
-                cat_presence = np.array(sum_columns) > 0
-                cpc_df[cat] = cat_presence
+            """Create and populate data frame"""
+            cpc_df = pd.DataFrame(cat_presence, index=cpc_keys[0], columns=categs)
             
             """Select correct subset in correct order"""
             #self.class_separation = cpc_df.loc[self.citation_curves_keys]      # deprecated
-            self.class_separation = cpc_df.reindex(self.citation_curves_keys)
+            self.class_separation = reindex_by_patent_ids(cpc_df, self.citation_curves_keys)
             
             """Fill NA entries as False (not belonging to this category)"""
             for cat in categs:
@@ -218,22 +183,18 @@ class CitationCurveSet():
             with open(cpc_greenness_file, "rb") as rfile:
                 """Load data frame"""
                 CPC_df = pd.read_pickle(rfile)
-                CPC_df.index = rm_leading_zeros(CPC_df.index)
             """Select correct IDs in correct order"""
-            self.green_separation = CPC_df.reindex(self.citation_curves_keys)
+            self.green_separation = reindex_by_patent_ids(CPC_df, self.citation_curves_keys)
             
             """Keyword based"""
             with open(keyword_greenness_file, "rb") as rfile:
                 """Load data frame"""
                 keyword_shapira = pd.read_pickle(rfile)
-                keyword_shapira.index = rm_leading_zeros(keyword_shapira.index)
                 """Remove pattern match information, only keep index (all rows were positive identifications)"""
                 keyword_shapira["keyword_shapira"] = True
                 keyword_shapira = keyword_shapira[["keyword_shapira"]]
-            """Remove duplicate rows"""                     # TODO: why are there duplicate rows??
-            keyword_shapira = keyword_shapira[~keyword_shapira.index.duplicated(keep='first')]
-            """Select correct IDs in correct order"""
-            keyword_shapira = keyword_shapira.reindex(self.citation_curves_keys)
+            """Select correct IDs in correct order (duplicate rows are removed)"""   # TODO: why are there duplicate rows??
+            keyword_shapira = reindex_by_patent_ids(keyword_shapira, self.citation_curves_keys)
             """Fill NA as False. (All present IDs are True.)"""
             keyword_shapira["keyword_shapira"].fillna(False,inplace=True)    #TODO: colname
             
@@ -270,7 +231,7 @@ class CitationCurveSet():
 
             """Select correct IDs in correct order"""
             #self.year_separation = pddf.loc[self.citation_curves_keys]     # deprecated
-            self.year_separation = pddf.reindex(self.citation_curves_keys)
+            self.year_separation = reindex_by_patent_ids(pddf, self.citation_curves_keys)
             
             """Save"""
             self.year_separation.to_pickle(self.separationYearFile)
@@ -0,0 +1,331 @@
+"""Script to ingest the citation file from USPTO/patentsview in one pass
+        Website: http://www.patentsview.org/download/
+        Data: http://s3.amazonaws.com/data-patentsview-org/20180528/download/uspatentcitation.tsv.zip
+        Code book: http://www.patentsview.org/data/Patents_DB_dictionary_bulk_downloads.xlsx
+   The zipped file is streamed in large chunks of lines by a columnar reader (read_citation_chunks) that
+   materialises only the needed columns. Citing (origin) and cited (destination) patent IDs are
+   encoded as canonical int64 patent keys (see classifications/patent_ids.py) and factorised into int32 node ids
+   on the fly (nodes are numbered in order of first appearance, origin before destination). The node ids are shared by all citation
+   networks (see network_selection). The edges are appended to typed arrays:
+        origin      - int32 - node id of the citing patent
+        destination - int32 - node id of the cited patent
+        category    - int8  - index of the citation category in CITATION_CATEGORIES (who added the citation)
+        date        - int32 - citation date in days since 1970-01-01 (NO_DATE if missing or irregular)
+   The edge list and the node keys are saved as raw npy arrays in the directory citation_edges (see
+   classifications/matrix_store.py) and are used by citation_parse.py. This replaces the separate node list step.
+   Lines with patent IDs that cannot be encoded are skipped and counted.
+
+How to run:
+
+python3 citation_ingest.py
+python3 citation_ingest.py --zipfile uspatentcitation.tsv.zip --member data/20180528/bulk-downloads/uspatentcitation.tsv
+python3 citation_ingest.py --benchmarkreader
+"""
+
+"""inport modules"""
+import numpy as np
+import pandas as pd
+import zipfile
+import argparse
+import csv
+import time
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "classifications"))
+from patent_ids import encode_patent_ids
+from matrix_store import save_array
+
+CITATION_COLUMNS = ["patent_id", "citation_id", "date", "category"]
+CITATION_CATEGORIES = ["unknown", "cited by applicant", "cited by examiner", "cited by other", "cited by third party"]
+NO_DATE = np.iinfo(np.int32).min
+"""Citation networks: all citations and citations added by the applicant (see network_selection)"""
+CITATION_NETWORKS = ["general", "voluntary"]
+
+"""Class definitions"""
+"""Node index class. Assigns int32 node ids to int64 patent keys in order of first appearance."""
+class NodeIndex():
+    def __init__(self):
+        """Constructor method. Prepares sorted lookup arrays.
+            No Arguments
+            Returns:
+                Instance of object."""
+        self.keys = np.zeros(0, dtype=np.int64)           # patent key of each node id
+        self.sorted_keys = np.zeros(0, dtype=np.int64)    # keys in ascending order ...
+        self.sorted_ids = np.zeros(0, dtype=np.int32)     # ... and their node ids
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, keys):
+        """Method to obtain node ids of patent keys.
+            Arguments:
+                keys - numpy array of int64 - patent keys
+            Returns:
+                numpy array of int32 - node ids (-1 for unknown keys)"""
+        if len(self.sorted_keys) == 0:
+            return np.full(len(keys), -1, dtype=np.int32)
+        position = np.minimum(np.searchsorted(self.sorted_keys, keys), len(self.sorted_keys) - 1)
+        return np.where(self.sorted_keys[position] == keys, self.sorted_ids[position], -1).astype(np.int32)
+
+    def add(self, keys):
+        """Method to obtain node ids of patent keys, recording unknown keys as new nodes in order of first
+           appearance.
+            Arguments:
+                keys - numpy array of int64 - patent keys
+            Returns:
+                numpy array of int32 - node ids"""
+        codes, uniques = pd.factorize(keys)
+        unique_ids = self.lookup(uniques)
+        new = unique_ids < 0
+        if new.any():
+            unique_ids[new] = np.arange(len(self.keys), len(self.keys) + new.sum(), dtype=np.int32)
+            self.keys = np.concatenate([self.keys, uniques[new]])
+            """Merge new keys into the sorted lookup arrays; the stable sort merges the two sorted runs"""
+            order = np.argsort(uniques[new])
+            sorted_keys = np.concatenate([self.sorted_keys, uniques[new][order]])
+            sorted_ids = np.concatenate([self.sorted_ids, unique_ids[new][order]])
+            merge_order = np.argsort(sorted_keys, kind="stable")
+            self.sorted_keys = sorted_keys[merge_order]
+            self.sorted_ids = sorted_ids[merge_order]
+        return unique_ids[codes]
+
+"""Citation edge list class. Ingests the citation file and records nodes and typed edge arrays."""
+class CitationEdgeList():
+    def __init__(self):
+        """Constructor method. Prepares node index and edge array chunks.
+            No Arguments
+            Returns:
+                Instance of object."""
+        self.nodes = NodeIndex()
+        self.chunks = {"origin": [], "destination": [], "category": [], "date": []}
+        self.skipped = 0
+
+    def parse_chunk(self, table):
+        """Method to parse a chunk of the citation file and append its edges.
+            Arguments:
+                table - pandas DataFrame - columns patent_id, citation_id, date, category (strings)
+            Returns:
+                None."""
+        origin_keys = encode_patent_ids(table["patent_id"].to_numpy(str), errors="coerce")
+        destination_keys = encode_patent_ids(table["citation_id"].to_numpy(str), errors="coerce")
+        valid = (origin_keys >= 0) & (destination_keys >= 0)
+        self.skipped += int((~valid).sum())
+        table = table[valid]
+
+        """Node ids in order of first appearance, origin before destination"""
+        node_ids = self.nodes.add(np.column_stack([origin_keys[valid], destination_keys[valid]]).ravel())
+        self.chunks["origin"].append(node_ids[0::2])
+        self.chunks["destination"].append(node_ids[1::2])
+        self.chunks["category"].append(category_codes(table["category"]))
+        self.chunks["date"].append(date_days(table["date"]))
+
+    def populate(self, zipsourcefile="uspatentcitation.tsv.zip", sourcefile="data/20180528/bulk-downloads/uspatentcitation.tsv", \
+                                                                                                chunksize=2000000):
+        """Method to read the zipped citation file in chunks of lines and parse every chunk.
+            Optional arguments:
+                zipsourcefile - type:string - path to zip file holding the source
+                sourcefile - type:string - path to sourcefile in the zip file.
+                chunksize - type:int - number of lines per chunk
+            Returns:
+                None."""
+        n_lines = 0
+        for table in read_citation_chunks(zipsourcefile, sourcefile, chunksize):
+            self.parse_chunk(table)
+            n_lines += len(table)
+            print("\rParsed {0:11d} lines, {1:10d} nodes".format(n_lines, len(self.nodes)), end="")
+        print("\nSkipped {} lines with irregular patent IDs".format(self.skipped))
+
+    def edges(self):
+        """Method to obtain the edge arrays.
+            No Arguments
+            Returns:
+                dict of numpy arrays - origin, destination, category, date"""
+        return {name: np.concatenate(chunks) for name, chunks in self.chunks.items()}
+
+    def save(self, dirname="citation_edges"):
+        """Method to save node keys and edge arrays as npy files.
+            Arguments:
+                dirname - string - directory name
+            Returns:
+                None."""
+        save_citation_edges(dirname, self.nodes.keys, self.edges())
+
+"""Function definitions"""
+
+def read_citation_chunks(zipsourcefile="uspatentcitation.tsv.zip", sourcefile="data/20180528/bulk-downloads/uspatentcitation.tsv", \
+                                                                                                chunksize=2000000):
+    """Generator function. Reads the tab separated citation file directly from the zip file in chunks of lines
+       with the C parser of pandas. Only the needed columns (by header name) are materialised: patent_id,
+       citation_id and date as strings, category as categorical with categories CITATION_CATEGORIES[1:] (other
+       values become NaN, i.e. unknown).
+        Arguments:
+            zipsourcefile - string - path to zip file holding the source
+            sourcefile - string - path to sourcefile in the zip file
+            chunksize - int - number of lines per chunk
+        Yields pandas DataFrame with columns patent_id, citation_id, date, category"""
+    with zipfile.ZipFile(zipsourcefile) as zfile:
+        with zfile.open(sourcefile, "r") as rfile:
+            for table in pd.read_csv(rfile, sep="\t", header=0, usecols=CITATION_COLUMNS, \
+                                        dtype={"patent_id": str, "citation_id": str, "date": str, \
+                                               "category": "category"}, \
+                                        na_filter=False, quoting=csv.QUOTE_NONE, engine="c", chunksize=chunksize):
+                table["category"] = table["category"].cat.set_categories(CITATION_CATEGORIES[1:])
+                yield table[CITATION_COLUMNS]
+
+def benchmark_reader(zipsourcefile="uspatentcitation.tsv.zip", sourcefile="data/20180528/bulk-downloads/uspatentcitation.tsv", \
+                                                                                                n_lines=5000000):
+    """Function to compare the line by line parsing (decode, split, strip) with the chunked reader on the first
+       lines of the citation file.
+        Arguments:
+            zipsourcefile - string - path to zip file holding the source
+            sourcefile - string - path to sourcefile in the zip file
+            n_lines - int - number of lines
+        Returns None"""
+    start = time.time()
+    with zipfile.ZipFile(zipsourcefile) as zfile:
+        with zfile.open(sourcefile, "r") as rfile:
+            rfile.readline()
+            for i, line in enumerate(rfile):
+                if i >= n_lines:
+                    break
+                elementi = line.decode("UTF-8").split("\t")
+                origin, destination, date, cited_by = elementi[1].strip(), elementi[2].strip(), elementi[3], \
+                                                                                elementi[7].replace("cited by ", "")
+    line_time = time.time() - start
+    start = time.time()
+    for table in read_citation_chunks(zipsourcefile, sourcefile, chunksize=min(n_lines, 2000000)):
+        n_lines -= len(table)
+        if n_lines <= 0:
+            break
+    chunk_time = time.time() - start
+    print("Line by line: {0:.2f}s, chunked reader: {1:.2f}s, speedup {2:.1f}x".format(line_time, chunk_time, \
+                                                                                        line_time / chunk_time))
+
+def category_codes(category):
+    """Function to encode citation categories as int8 index in CITATION_CATEGORIES (0 for unknown categories).
+        Arguments:
+            category - pandas Series of strings - citation categories
+        Returns numpy array of int8"""
+    if not isinstance(category.dtype, pd.CategoricalDtype):
+        category = category.str.strip()
+        category = category.where(category.isin(CITATION_CATEGORIES[1:])).astype(\
+                                                                        pd.CategoricalDtype(CITATION_CATEGORIES[1:]))
+    codes = category.cat.set_categories(CITATION_CATEGORIES[1:]).cat.codes.to_numpy()
+    return (codes + 1).astype(np.int8)
+
+def date_days(dates):
+    """Function to parse citation dates (YYYY-MM-DD; days or months 00 are read as 01) as days since 1970-01-01.
+        Arguments:
+            dates - pandas Series of strings - dates
+        Returns numpy array of int32 (NO_DATE for missing or irregular dates)"""
+    dates = pd.to_datetime(dates.str.strip().str.replace("-00", "-01", regex=False), format="%Y-%m-%d", \
+                                                                                                errors="coerce")
+    days = dates.to_numpy().astype("datetime64[D]").astype(np.int64)
+    days[dates.isna().to_numpy()] = NO_DATE
+    return days.astype(np.int32)
+
+def node_days(node_keys, dates):
+    """Function to obtain a date for each node id (e.g. the grant date of the patent) in days since 1970-01-01.
+        Arguments:
+            node_keys - numpy array of int64 - patent key of each node id
+            dates - pandas Series of datetime - dates indexed by patent ID (first one used for duplicate IDs)
+        Returns numpy array of int32 (NO_DATE for patents without date)"""
+    keys = encode_patent_ids(dates.index, errors="coerce")
+    days = dates.to_numpy().astype("datetime64[D]").astype(np.int64)
+    known = (keys >= 0) & dates.notna().to_numpy()
+    keys, days = keys[known], days[known]
+    order = np.argsort(keys, kind="stable")
+    keys, days = keys[order], days[order]
+    first = np.append(True, keys[1:] != keys[:-1]) if len(keys) > 0 else np.zeros(0, dtype=bool)
+    keys, days = keys[first], days[first]
+    node_days = np.full(len(node_keys), NO_DATE, dtype=np.int32)
+    if len(keys) > 0:
+        position = np.minimum(np.searchsorted(keys, node_keys), len(keys) - 1)
+        found = keys[position] == node_keys
+        node_days[found] = days[position[found]]
+    return node_days
+
+def save_citation_edges(dirname, node_keys, edges):
+    """Function to save node keys and edge arrays as npy files.
+        Arguments:
+            dirname - string - directory name; created if it does not exist
+            node_keys - numpy array of int64 - patent key of each node id
+            edges - dict of numpy arrays - origin, destination, category, date
+        Returns None"""
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    save_array(os.path.join(dirname, "nodes.npy"), node_keys)
+    for name, array in edges.items():
+        save_array(os.path.join(dirname, name + ".npy"), array)
+
+def load_citation_edges(dirname="citation_edges", mmap_mode=None):
+    """Function to load node keys and edge arrays saved with save_citation_edges().
+        Arguments:
+            dirname - string - directory name
+            mmap_mode - string or None - numpy memory map mode
+        Returns:
+            tuple of:
+                numpy array of int64 - patent key of each node id
+                dict of numpy arrays - origin, destination, category, date"""
+    node_keys = np.load(os.path.join(dirname, "nodes.npy"), mmap_mode=mmap_mode)
+    edges = {name: np.load(os.path.join(dirname, name + ".npy"), mmap_mode=mmap_mode) for name in \
+                                                                        ["origin", "destination", "category", "date"]}
+    return node_keys, edges
+
+def network_selection(edges, network):
+    """Function to select the edges of a citation network. The networks are filtered views of the same edge list.
+        Arguments:
+            edges - dict of numpy arrays - origin, destination, category, date
+            network - string - "general" (all citations) or "voluntary" (citations added by the applicant)
+        Returns numpy array of bool or None (all edges)"""
+    if network == "general":
+        return None
+    assert network == "voluntary", "Unknown citation network {}".format(network)
+    return np.asarray(edges["category"]) == CITATION_CATEGORIES.index("cited by applicant")
+
+def window_selection(edges, first_day, last_day, selected=None):
+    """Function to select the edges with citation dates in a time window.
+        Arguments:
+            edges - dict of numpy arrays - origin, destination, category, date
+            first_day, last_day - int - first and last day of the window in days since 1970-01-01
+            selected - numpy array of bool or None - edges to restrict further (e.g. a network, see network_selection)
+        Returns numpy array of bool (edges without date are not selected)"""
+    date = np.asarray(edges["date"])
+    window = (date >= max(first_day, NO_DATE + 1)) & (date <= last_day)
+    if selected is not None:
+        window &= selected
+    return window
+
+def first_appearance_order(edges, selected=None):
+    """Function to obtain the node ids of the nodes incident to (selected) edges in order of first appearance,
+       origin before destination.
+        Arguments:
+            edges - dict of numpy arrays - origin, destination, category, date
+            selected - numpy array of bool or None - edges to consider (all if None)
+        Returns numpy array of int32"""
+    origin, destination = edges["origin"], edges["destination"]
+    if selected is not None:
+        origin, destination = origin[selected], destination[selected]
+    return pd.unique(np.column_stack([origin, destination]).ravel()).astype(np.int32)
+
+""" main entry point """
+
+if __name__ == "__main__":
+    """Parse terminal arguments"""
+    parser = argparse.ArgumentParser(description="Single pass ingest of the USPTO citation file.")
+    parser.add_argument("--zipfile", default="uspatentcitation.tsv.zip", help="Zipped citation file.")
+    parser.add_argument("--member", default="data/20180528/bulk-downloads/uspatentcitation.tsv", \
+                                                                                help="Path of the file in the zip file.")
+    parser.add_argument("--chunksize", type=int, default=2000000, help="Number of lines per chunk.")
+    parser.add_argument("--output", default="citation_edges", help="Output directory.")
+    parser.add_argument("--benchmarkreader", action="store_true", help="Compare line by line parsing and chunked " \
+                                                                            "reader on the first 5M lines and exit.")
+    args = parser.parse_args()
+    if args.benchmarkreader:
+        benchmark_reader(args.zipfile, args.member)
+        raise SystemExit
+
+    CE = CitationEdgeList()
+    CE.populate(args.zipfile, args.member, args.chunksize)
+    CE.save(args.output)
+    print("Saved {0} nodes and {1} edges".format(len(CE.nodes), sum(len(chunk) for chunk in CE.chunks["origin"])))
@@ -2,26 +2,39 @@
         Website: http://www.patentsview.org/download/
         Data: http://s3.amazonaws.com/data-patentsview-org/20180528/download/uspatentcitation.tsv.zip
         Code book: http://www.patentsview.org/data/Patents_DB_dictionary_bulk_downloads.xlsx
-   Script will read the list of nodes provided by citation_parse_full_node_list.py for efficiency. So 
-        citation_parse_full_node_list.py must be executed first.
-   Script will compute and save the network, citation counts, and pageranks."""
+   Script will read the list of nodes and the edges from the edge list saved by citation_ingest.py and build the
+        citation matrix from it (see citation_graph.py). So citation_ingest.py must be executed first.
+   Script will compute and save the networks, citation counts, and pageranks. Both citation networks (all citations
+        and citations added by the applicant) are built in one run as filtered views of the same edge list and share
+        its node index (node ids of citation_ingest.py).
+   Script will compute and save citation statistics by patent (citation curves, received citations) as ragged arrays
+        over the same node index, see citation_statistics.py."""
 
-import networkx as nx
 import pandas as pd
 import os
-import psutil
 import pdb
 import pickle
 import scipy as sp
 import numpy as np
-import zipfile
 import argparse
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "classifications"))
+from citation_ingest import load_citation_edges, network_selection, node_days, NO_DATE, \
+                                                                                                    CITATION_NETWORKS
+from citation_graph import adjacency_matrix, incident_nodes
+from pagerank import pagerank, validate_pagerank, PAGERANK_METHODS
+from citation_statistics import citation_statistics, save_citation_statistics
 
 """Argument handling"""
 parser = argparse.ArgumentParser(description='Script to parse patent citations to obtain network, pageranks, statistics')
-parser.add_argument("--networks", action="store_true", help="build and save citation network and pageranks")
+parser.add_argument("--networks", action="store_true", help="build and save citation networks (all citations and applicant citations) and pageranks")
 parser.add_argument("--statistics", action="store_true", help="obtain and save citation statistics by patent")
-parser.add_argument("--voluntaryonly", action="store_true", help="include only citations created by the applicant, not the examiner, not other, not unknown. Can be combined with --networks or with --statictics or both.")
+parser.add_argument("--voluntaryonly", action="store_true", help="include only citations created by the applicant, not the examiner, not other, not unknown. Applies to --statistics; --networks always builds both networks.")
+parser.add_argument("--pagerankmethod", default="gauss-seidel", choices=PAGERANK_METHODS, help="PageRank solver (see pagerank.py)")
+parser.add_argument("--float32", action="store_true", help="compute pageranks in single precision")
+parser.add_argument("--warmstart", action="store_true", help="start PageRank iterations from previously saved pageranks")
+parser.add_argument("--validatepagerank", action="store_true", help="validate pageranks by residual norms and by comparison to a direct solver on random subgraphs")
+parser.add_argument("--threads", type=int, default=os.cpu_count(), help="number of threads for the sparse matrix-vector products of PageRank (default: number of cores)")
 args = parser.parse_args()
 if args.networks == False and args.statistics == False:
     print("Error: No options received, script does not know what to do.")    
@@ -30,136 +43,70 @@ if args.networks == False and args.statistics == False:
 
 """Citation space class"""
 class CitationSpace():
-    def __init__(self, buildNetworks=True, voluntaryOnly=False, buildCitationCurve=False):
+    def __init__(self, buildNetworks=True, voluntaryOnly=False, buildCitationCurve=False, edgeListPath="citation_edges"):
         """Constructor. Reads node list, prepares sparse matrix and variables.
             Arguments:
                 buildNetworks   - bool - should the citation matrix be constructed, 
-                voluntaryOnly   - bool - should only citations put by the applicant be considered or all citations, 
+                voluntaryOnly   - bool - should only citations put by the applicant be considered or all citations (statistics only), 
                 buildCitationCurve - bool - should the citations for each patent be recorded with dates.
+                edgeListPath    - str  - directory of the edge list saved by citation_ingest.py
             Returns:
                 CitationSpace instance."""
         self.buildNetworks = buildNetworks
         self.voluntaryOnly = voluntaryOnly 
         self.buildCitationCurve = buildCitationCurve
             
-        # load nodelist if it exists
-        if voluntaryOnly:
-            fullNodeListPath = "full_node_list_voluntary.pkl"
+        # load nodelist from the ingested edge list if it exists
+        if os.path.exists(os.path.join(edgeListPath, "nodes.npy")):
+            node_keys, edges = load_citation_edges(edgeListPath, mmap_mode="r")
+            self.node_keys = node_keys
         else:
-            fullNodeListPath = "full_node_list.pkl"
-        if os.path.exists(fullNodeListPath):
-            with open(fullNodeListPath, "rb") as ifile:
-                self.DGnodes = pickle.load(ifile)
-                self.DGindex = len(self.DGnodes)
-        else:
-            assert False, "Error: script requires prerecorded nodelist. Please execute citation_parse_full_node_list.py first"
+            assert False, "Error: script requires ingested edge list. Please execute citation_ingest.py first"
         
         if self.buildNetworks:
-            #self.DG = nx.DiGraph()
-            self.DGA = sp.sparse.dok_matrix((self.DGindex, self.DGindex), dtype=bool)
+            """Adjacency matrices (csr) directly from the edge arrays, one per network, all over the shared node index.
+               The nodes of a network are the nodes incident to at least one of its edges."""
+            self.DGA = {}
+            self.network_nodes = {}
+            for network in CITATION_NETWORKS:
+                print("Building {} citation matrix from edge list".format(network))
+                selected = network_selection(edges, network)
+                self.DGA[network] = adjacency_matrix(edges["origin"], edges["destination"], len(node_keys), selected)
+                self.network_nodes[network] = incident_nodes(edges["origin"], edges["destination"], len(node_keys), \
+                                                                                                            selected)
             self.pageranks = {}
         
         if self.buildCitationCurve:
-            self.datedf = pd.read_pickle("patents_dates_years.pkl")
-            self.citation_curves = {patentID: [] for patentID in self.DGnodes}           # should eventually hold the number of citations up to day x vs. age of patent. For this we would still have to parse the application date (and the mapping from patent to application). 
-            self.received_citation_list = {patentID: [] for patentID in self.DGnodes}
-            self.received_citation_count = {patentID: 0 for patentID in self.DGnodes}
+            selected = network_selection(edges, "voluntary" if voluntaryOnly else "general")
+            self.edges = edges
+            self.selected = selected
+            """Grant day of each node id"""
+            self.grant_days = node_days(node_keys, pd.read_pickle("patents_dates_years.pkl")["granted date"])
             self.cfound = 0
             self.cnotfound = 0
 
-    def record_node(self, label):
-        """Method to record additional nodes. This should be done by the citation_parse_full_node_list.py script,
-           so this method will throw an error if called in this script. Logic is included in comments below."""
-        try:
-            assert False, "Error: unknown node encountered"
-        except:
-            pdb.set_trace()
-        #self.DGnodes[label] = self.DGindex
-        #self.DGindex += 1
-        #return self.DGindex - 1
-
-    def parse_citation_file_line(self, line):
-        """Method to parse a single citation as recorded in the USPTO source file
-            Arguments:
-                line - type: bytes - the line to be parsed
-            Returns:
-                None."""
-        elementi = line.decode("UTF-8").split("\t")
-        assert len(elementi) == 9
-        origin, destination, date, cited_by = elementi[1], elementi[2], elementi[3], elementi[7]
-        origin = origin.strip()
-        destination = destination.strip()
-        cited_by = cited_by.replace("cited by ", "")
-        if self.buildNetworks and ((not self.voluntaryOnly) or (cited_by == "applicant")):
-            origin_idx, destination_idx = self.DGnodes.get(origin), self.DGnodes.get(destination)
-            if origin_idx is None:
-                origin_idx = self.record_node(origin)
-            if destination_idx is None:
-                destination_idx = self.record_node(destination)
-            self.DGA[origin_idx, destination_idx] = 1
-        if self.buildCitationCurve and ((not self.voluntaryOnly) or (cited_by == "applicant")):
-            self.received_citation_count[destination] += 1
-            try:
-                #if date[-2:] == "00":
-                #    date = date[:-2] + "01"
-                #date = pd.to_datetime(date)
-                date_origin = self.datedf["granted date"].get(origin)             # date of citing patent
-                self.received_citation_list[destination].append(date_origin)
-                date_destination = self.datedf["granted date"].get(destination)   # date of cited patent
-                if (date_origin is None) or (date_destination is None):
-                    #print("None date encountered in patent citation {0} -> {1} at {2}".format(origin, destination, str(date)))
-                    self.cnotfound += 1
-                    #pdb.set_trace()
-                else:                                                           # do not record in curve if citation date could not be found
-                    age_at_citation = date_origin - date_destination
-                    self.citation_curves[destination].append(age_at_citation)       
-                    self.cfound += 1
-                print("Parsed {1:11d}; found {1:11d}, not found {2:11d}".format(self.cfound + self.cnotfound, self.cfound, self.cnotfound), end="\r")
-            except:
-                #print("\nIrregular date encountered " + str(date))
-                print("\nIrregularity while trying to determine citation date {0} -> {1} at {2}".format(origin, destination, str(date)))
-                self.received_citation_list[destination].append(pd.to_datetime(np.nan)) # record date as np.nan if it could not be found
-                #pdb.set_trace()
-            
-    def populate(self, zipsourcefile = "uspatentcitation.tsv.zip", sourcefile="data/20180528/bulk-downloads/uspatentcitation.tsv"):
-        """Method to populate the variables. Will open zipped sourcefile and parse every line. Will interrupt
-           if some memory limit is exceeded.
-            Optional arguments:
-                zipsourcefile - type:string - path to zip file holding the source
-                sourcefile - type:string - path to sourcefile in the zip file.
+    def populate(self):
+        """Method to populate the citation statistics from the edge list: the grant days of citing and cited patents
+           are looked up by node id for all citations at once; the ages of the cited patents at citation (in days) are
+           stored as int32 arrays together with the node ids of the cited patents. (The citation matrix is built from
+           the edge list in the constructor.)
+            No Arguments
             Returns:
                 None."""
-        with zipfile.ZipFile(zipsourcefile) as zfile:
-            with zfile.open(sourcefile, "r") as rfile:
-                for i, line in enumerate(rfile):
-                    if i>0:
-                        self.parse_citation_file_line(line)
-                    #if (i)%10000 == 0:
-                    #    """Print progress."""
-                    #    print("\rParsing line {}".format(i), end="")
-                    if (i)%100000 == 0:
-                        """Print memory usage statistics."""
-                        process = psutil.Process(os.getpid())
-                        mem_usage = process.memory_info().rss
-                        print("\nMemory usage: {}".format(round(mem_usage/1000000000, 3)))
-                        
-                        """If at any point we exceed some memory limit (32G), save and exit."""
-                        if mem_usage > 32000000000:
-                            print("Uses too much memory, ...interrupting.")
-                            #self.compute_pagerank()
-                            self.save()
-                            #self.compute_network_pagerank()
-                            raise SystemExit
-                            pdb.set_trace()
-    
-    def sort_citation_curves(self):
-        cclen = len(self.citation_curves)
-        i = 0
-        for cc in self.citation_curves:
-            i += 1
-            print("Sorting citation curves: {0:11d}/{1:11d}".format(i, cclen))
-            self.citation_curves[cc].sort()
-
+        if not self.buildCitationCurve:
+            return
+        origin, destination = self.edges["origin"], self.edges["destination"]
+        if self.selected is not None:
+            origin, destination = origin[self.selected], destination[self.selected]
+        self.citation_destinations = np.asarray(destination, dtype=np.int32)
+        self.citing_days = self.grant_days[origin]                      # grant day of citing patent
+        cited_days = self.grant_days[destination]                       # grant day of cited patent
+        found = (self.citing_days != NO_DATE) & (cited_days != NO_DATE)  # do not record in curve if citation date could not be found
+        self.age_destinations = self.citation_destinations[found]
+        self.citation_ages = self.citing_days[found] - cited_days[found]
+        self.cfound = int(found.sum())
+        self.cnotfound = len(found) - self.cfound
+        print("Parsed {0:11d}; found {1:11d}, not found {2:11d}".format(self.cfound + self.cnotfound, self.cfound, self.cnotfound))
     
     def save(self):
         """Method to save all computed data structures: pageranks, citation matrix, citation statistics.
@@ -167,127 +114,68 @@ class CitationSpace():
             Returns:
                 None."""
         if self.buildNetworks:
-            if self.voluntaryOnly:
-                outputFileName = "citation_network_voluntary.npz"
-                outputFileNamePR = "pagerank_voluntary.pkl"
-            else:
-                outputFileName = "citation_network_general.npz"        
-                outputFileNamePR = "pagerank_general.pkl"
-            
-            """ save pageranks """
-            if len(self.pageranks) > 0:
-                with open(outputFileNamePR, "wb") as ofile:
-                    pickle.dump(self.pageranks, ofile, protocol=pickle.HIGHEST_PROTOCOL)
-
-            """ save network as sparse matrix
-                Syntax for saving and loading sparse matrices is:
-                    sp.sparse.save_npz("filename.npz", sparse_matrix)
-                    reloaded_matrix = sp.sparse.load_npz("filename.npz")"""
-            try:
-                print("Transforming matrix")
-                save_mtx = self.DGA.tocsr()
-                print("Matrix transformed. Saving...")
-                sp.sparse.save_npz(outputFileName, save_mtx)
-                print("Matrix saved.")
-            except:
-                print("Cannot save matrix for whatever reason")
-                pass
+            for network in CITATION_NETWORKS:
+                outputFileName = "citation_network_{}.npz".format(network)
+                outputFileNamePR = "pagerank_{}.pkl".format(network)
+                
+                """ save pageranks (pandas Series indexed by patent key, NaN for nodes not in the network) """
+                if network in self.pageranks:
+                    with open(outputFileNamePR, "wb") as ofile:
+                        pickle.dump(self.pageranks[network], ofile, protocol=pickle.HIGHEST_PROTOCOL)
+    
+                """ save network as sparse matrix
+                    Syntax for saving and loading sparse matrices is:
+                        sp.sparse.save_npz("filename.npz", sparse_matrix)
+                        reloaded_matrix = sp.sparse.load_npz("filename.npz")"""
+                try:
+                    print("Saving {} matrix...".format(network))
+                    sp.sparse.save_npz(outputFileName, self.DGA[network])
+                    print("Matrix saved.")
+                except:
+                    print("Cannot save matrix for whatever reason")
+                    pass
             
         """ save also the citation statistics    """
         if self.buildCitationCurve:
-            if self.voluntaryOnly:
-                citationCurveFileName = "citation_curves_voluntary.pkl"
-                citationListFileName = "received_citation_list_voluntary.pkl"
-                citationCountFileName = "received_citation_count_voluntary.pkl"
-            else:
-                citationCurveFileName = "citation_curves.pkl"
-                citationListFileName = "received_citation_list.pkl"
-                citationCountFileName = "received_citation_count.pkl"
-            if self.citation_curves:
-                self.sort_citation_curves()
-                with open(citationCurveFileName, "wb") as ofile:
-                    pickle.dump(self.citation_curves, ofile, protocol=pickle.HIGHEST_PROTOCOL)
-            if len(self.received_citation_list) > 0:
-                with open(citationListFileName, "wb") as ofile:
-                    pickle.dump(self.received_citation_list, ofile, protocol=pickle.HIGHEST_PROTOCOL)
-            if len(self.received_citation_count) > 0:
-                with open(citationCountFileName, "wb") as ofile:
-                    pickle.dump(self.received_citation_count, ofile, protocol=pickle.HIGHEST_PROTOCOL)
+            """Ragged arrays by node id (see citation_statistics.py)"""
+            statisticsDirName = "citation_statistics_voluntary" if self.voluntaryOnly else "citation_statistics"
+            save_citation_statistics(statisticsDirName, citation_statistics(self.node_keys, self.grant_days, \
+                                                    self.citation_destinations, self.citing_days, \
+                                                    self.age_destinations, self.citation_ages))
         
-    def compute_network_pagerank(self, validate=False):
-        """Method to compute network pagerank. Requires citation matrix to be populated.
+    def compute_network_pagerank(self, validate=False, method="gauss-seidel", dtype=np.float64, warmStart=False, nThreads=1):
+        """Method to compute the pageranks of both networks. Requires citation matrices to be populated.
             Arguments:
-                validate - bool - should this pagerank computation method be validated by comparison to the one in networkx
+                validate - bool - should the pageranks be validated (residual norm on the full network, direct solver on
+                                  random subgraphs, networkx on tiny networks; see pagerank.validate_pagerank)
+                method - str - PageRank solver, see pagerank.py
+                dtype - numpy dtype - np.float64 or np.float32
+                warmStart - bool - should the iterations start from previously saved pageranks (if any)
+                nThreads - int - number of threads for the sparse matrix-vector products (see spmv.py)
             Returns:
                 None."""
-        """Compute and save pagerank"""
-        self.pageranks = comp_PageRank(self.DGA)
-        
-        """ validation with networkx """
-        if validate:
-            print("Valitation of pagerank computation requested. This is not recommended, will take a very long time, and comsume large amounts of memory.")
-            net = nx.from_scipy_sparse_matrix(self.DGA, create_using=nx.DiGraph())
-            pr = nx.pagerank(net)           #default alpha=.85
-            try:
-                assert self.pageranks == pr, "Pageranks not identical"
-            except:
-                pass
-            try:
-                diffs = np.asarray(list(pr.values()))-np.asarray(self.pageranks)
-                assert (abs(diffs) < 10**-4).all(), "Pageranks not even close"
-            except:
-                print(diffs)
+        for network in CITATION_NETWORKS:
+            """Compute pagerank on the nodes of the network (nodes without citations of this type are not part of it)"""
+            nodes = np.flatnonzero(self.network_nodes[network])
+            subgraph = self.DGA[network]
+            if len(nodes) < len(self.node_keys):
+                subgraph = subgraph[nodes][:, nodes]
+            start = None
+            if warmStart and os.path.exists("pagerank_{}.pkl".format(network)):
+                """Previous pageranks are matched by patent key; new nodes start from the mean"""
+                start = pd.read_pickle("pagerank_{}.pkl".format(network)).reindex(self.node_keys[nodes]).to_numpy(copy=True)
+                start[np.isnan(start)] = np.nanmean(start) if not np.isnan(start).all() else 1.
+            ranks, info = pagerank(subgraph, method=method, dtype=dtype, start=start, n_threads=nThreads, verbose=False)
+            print("PageRank of {0} network: {1} iterations, {2:.1f} s, L1 change {3:.2e}".format(network, \
+                                                                    info["iterations"], info["time"], info["residual"]))
+            self.pageranks[network] = pd.Series(np.nan, index=pd.Index(self.node_keys, name="PatID"))
+            self.pageranks[network].iloc[nodes] = ranks
+            
+            """ validation """
+            if validate:
+                passed, _ = validate_pagerank(subgraph, ranks, method=method, dtype=dtype)
+                print("Validation of {0} pageranks {1}".format(network, "passed" if passed else "FAILED"))
             
-def comp_PageRank(DG, d=0.85, precision_limit = 10**-8):
-    """ Function to compute PageRank from scipy sparse matrix. Following 
-           - https://en.wikipedia.org/wiki/PageRank
-           - http://blog.samuelmh.com/2015/02/pagerank-sparse-matrices-python-ipython.html
-           - https://networkx.github.io/documentation/latest/_modules/networkx/algorithms/link_analysis/pagerank_alg.html#pagerank
-        Parameters:
-            DG - adjacency matrix, assumed to be sp.sparse, 2d and square. 
-                 Note that links in this matrix are assumed to be the right way around: DG[i,j] records whether a link i->j exists,
-                 not the other way around (j->i).
-            d - PageRank dampening parameter
-            precision_limit - pagerank precision limit
-        Returns: 
-            pagerank values as numpy ndarray
-        Algorithm is 
-            Iterate:
-                 pr(t+1) = d*M*pr(t) + renormalization 
-            until pr(t+1) - pr(t) converges,
-            where M is the transposed adjacency patrix with columns normalized to sum to 1.
-            Initialization:
-                 pr(0) = vector of size mrank with all elements 1./mrank
-    """
-    
-    """ Check that matrix is scipy.sparse object, is 2d and is square """
-    assert sp.sparse.issparse(DG)
-    assert DG.ndim == 2
-    mrank, mrank2 = DG.shape
-    assert mrank == mrank2
-    
-    """ Compute matrix M (overwriting DG to save memory)"""
-    L_recip = 1/DG.sum(axis=1).A.ravel()
-    L_recip[~np.isfinite(L_recip)] = 0
-    L_recip_matrix = sp.sparse.diags(L_recip)
-    DG = DG.T
-    DG = DG.dot(L_recip_matrix)
-    
-    """ Initialize pagerank vector """
-    pr_old = np.ones(mrank)
-    pr = np.ones(mrank) * 1./mrank
-    
-    """ Iterative computation"""
-    iterations = 0
-    while (abs(pr_old-pr) >= precision_limit).any():
-        iterations += 1
-        print("PageRank computation. Iteration {0:4d}".format(iterations))
-        pr_old = pr
-        pr = d*DG.dot(pr_old) #+ np.ones(mrank)*((1-d)/mrank)   # additive term useless since we have to renormalize in the next line (since some colum sums will be zero for sparse matrices)
-        pr += (1-pr.sum()) / mrank
-    
-    return pr
-    
 """main entry point"""
 
 if __name__ == "__main__":
@@ -316,6 +204,8 @@ if __name__ == "__main__":
     
     if args.networks:
         """Compute pageranks and save again."""
-        CS.compute_network_pagerank()
+        CS.compute_network_pagerank(method=args.pagerankmethod, dtype=np.float32 if args.float32 else np.float64, \
+                                                                    warmStart=args.warmstart, nThreads=args.threads, \
+                                                                    validate=args.validatepagerank)
         CS.save()
     #pdb.set_trace()
@@ -0,0 +1,114 @@
+"""Functions to store the citation statistics by patent (citation_parse.py --statistics) as ragged arrays.
+   Each statistic is a csr-like ragged array over the node ids of the edge list (citation_ingest.py): an int64
+   offsets array (number of nodes + 1) and a values array holding the values of node i in
+   values[offsets[i]:offsets[i + 1]], sorted within each node (one lexsort for all nodes). The arrays are:
+        nodes            - int64 - patent key of each node id (see classifications/patent_ids.py)
+        grant_days       - int32 - grant date of each node in days since 1970-01-01 (NO_DATE if unknown)
+        curve_offsets    - int64 - offsets of the citation curves
+        curve_ages       - int16 (int32 if needed) - age of the cited patent at each citation in days
+        received_offsets - int64 - offsets of the received citations (number of received citations: differences)
+        received_days    - int32 - grant date of the citing patent of each received citation (NO_DATE if unknown)
+   The arrays are saved as raw npy files in a directory (citation_statistics or citation_statistics_voluntary,
+   see classifications/matrix_store.py) and can be memory mapped. Citation curves are 2 bytes per citation
+   instead of a Python object per citation in dictionaries of lists keyed by patent ID.
+"""
+
+"""inport modules"""
+import numpy as np
+import scipy
+import scipy.sparse
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "classifications"))
+from matrix_store import save_array
+from matrix_merge import ragged_slices
+
+STATISTICS_ARRAYS = ["nodes", "grant_days", "curve_offsets", "curve_ages", "received_offsets", "received_days"]
+
+"""Function definitions"""
+
+def ragged_rows(rows, values, n_rows):
+    """Function to group values by row into a ragged array, sorted within rows.
+        Arguments:
+            rows - numpy array of int - row (node id) of each value
+            values - numpy array - the values
+            n_rows - int - number of rows
+        Returns:
+            tuple of:
+                numpy array of int64 - offsets (n_rows + 1)
+                numpy array - values sorted by row and within rows"""
+    offsets = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=offsets[1:])
+    return offsets, values[np.lexsort((values, rows))]
+
+def compact_days(days):
+    """Function to store day counts as int16 if they fit, as int32 otherwise.
+        Arguments:
+            days - numpy array of int - day counts
+        Returns numpy array of int16 or int32"""
+    limits = np.iinfo(np.int16)
+    if len(days) == 0 or (days.min() >= limits.min and days.max() <= limits.max):
+        return days.astype(np.int16)
+    return days.astype(np.int32)
+
+def citation_statistics(node_keys, grant_days, destinations, citing_days, age_destinations, ages):
+    """Function to obtain the ragged arrays of the citation statistics from the arrays of the citations.
+        Arguments:
+            node_keys - numpy array of int64 - patent key of each node id
+            grant_days - numpy array of int32 - grant day of each node id (NO_DATE if unknown)
+            destinations - numpy array of int - node id of the cited patent of each citation
+            citing_days - numpy array of int32 - grant day of the citing patent of each citation
+            age_destinations - numpy array of int - node id of the cited patent of each citation with known ages
+            ages - numpy array of int - age of the cited patent at these citations in days
+        Returns dict of numpy arrays, see STATISTICS_ARRAYS"""
+    statistics = {"nodes": np.asarray(node_keys, dtype=np.int64), "grant_days": np.asarray(grant_days, dtype=np.int32)}
+    statistics["curve_offsets"], statistics["curve_ages"] = ragged_rows(age_destinations, compact_days(ages), \
+                                                                                                    len(node_keys))
+    statistics["received_offsets"], statistics["received_days"] = ragged_rows(destinations, \
+                                                            np.asarray(citing_days, dtype=np.int32), len(node_keys))
+    return statistics
+
+def save_citation_statistics(dirname, statistics):
+    """Function to save the ragged arrays of the citation statistics as npy files.
+        Arguments:
+            dirname - string - directory name; created if it does not exist
+            statistics - dict of numpy arrays - see STATISTICS_ARRAYS
+        Returns None"""
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    for name in STATISTICS_ARRAYS:
+        save_array(os.path.join(dirname, name + ".npy"), statistics[name])
+
+def load_citation_statistics(dirname="citation_statistics", mmap_mode=None):
+    """Function to load the ragged arrays of the citation statistics saved with save_citation_statistics().
+        Arguments:
+            dirname - string - directory name
+            mmap_mode - string or None - numpy memory map mode
+        Returns dict of numpy arrays, see STATISTICS_ARRAYS"""
+    return {name: np.load(os.path.join(dirname, name + ".npy"), mmap_mode=mmap_mode) for name in STATISTICS_ARRAYS}
+
+def curve_matrix(statistics, rows, n_columns):
+    """Function to obtain the citation curves of some nodes as csr matrix of the number of citations by age in days.
+       As ages are sorted within rows, repeat ages are adjacent and are counted by run lengths. Ages outside of
+       0 to n_columns - 1 (citations before the grant date or after the end of the data) are not included.
+        Arguments:
+            statistics - dict of numpy arrays - citation statistics, see STATISTICS_ARRAYS
+            rows - numpy array of int - node ids of the rows of the matrix, in order
+            n_columns - int - number of columns (maximum age + 1)
+        Returns scipy.sparse csr matrix of int32 (len(rows) x n_columns)"""
+    offsets, ages = ragged_slices(statistics["curve_offsets"], statistics["curve_ages"], rows)
+    row_of_age = np.repeat(np.arange(len(rows), dtype=np.int64), np.diff(offsets))
+    ages = ages.astype(np.int64)
+    valid = (ages >= 0) & (ages < n_columns)
+    if not valid.all():
+        print("{} citations outside of the age range are not included".format(np.count_nonzero(~valid)))
+        row_of_age, ages = row_of_age[valid], ages[valid]
+    """Runs of equal (row, age)"""
+    run_start = np.ones(len(ages), dtype=bool)
+    run_start[1:] = (row_of_age[1:] != row_of_age[:-1]) | (ages[1:] != ages[:-1])
+    run_start = np.flatnonzero(run_start)
+    counts = np.diff(np.append(run_start, len(ages))).astype(np.int32)
+    indptr = np.searchsorted(row_of_age[run_start], np.arange(len(rows) + 1, dtype=np.int64))
+    matrix = scipy.sparse.csr_matrix((counts, ages[run_start], indptr), shape=(len(rows), n_columns))
+    matrix.has_canonical_format = True
+    return matrix
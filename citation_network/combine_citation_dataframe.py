@@ -1,39 +1,41 @@
-import pandas as pd
-import pdb
+"""Script to combine pageranks and received citation counts of both citation networks into one data frame.
+   Both networks (citation_parse.py --networks) are filtered views of the same edge list (citation_ingest.py) and
+   share its node index, so that the columns are aligned by construction. Nodes that are not part of a network
+   (no citation of its type) have NaN entries in its columns. The data frame is indexed by int64 patent keys
+   (see classifications/patent_ids.py)."""
 
-def parse_citation_type_frame(cdf, nodeDictFileName, arrayFileNames, colnames):
-    node_dict = pd.read_pickle(nodeDictFileName)
-    next_df = pd.DataFrame.from_dict(node_dict, orient='index')
-    next_df['counter'] = range(len(next_df))
-    assert all(next_df['counter'] == next_df[0])
-    next_df.drop(next_df.columns, inplace=True, axis=1)
-    pagerank_colname, citationcount_colname = colnames
-    pagerank_array = pd.read_pickle(arrayFileNames[0])
-    citationcount_dict = pd.read_pickle(arrayFileNames[1])
-    citationcount_df = pd.DataFrame.from_dict(citationcount_dict, orient='index')
-    citationcount_df.columns = [citationcount_colname]
-    #pdb.set_trace()
-    next_df[pagerank_colname] = pagerank_array
-    cdf = pd.concat([cdf, next_df, citationcount_df], axis=1, sort=True)
-    print(cdf.head())
-    return cdf
+import pandas as pd
+import numpy as np
+from citation_ingest import load_citation_edges, network_selection, CITATION_NETWORKS
+from citation_graph import incident_nodes, received_citations
 
-def combine_all_citation_frames():
-    pddf = pd.DataFrame()
-    
-    nextarrayfiles = ["pagerank_general.pkl", "received_citation_count.pkl"]
-    nextcolnames = ['Pagerank (all)', 'Received citations (all)']
-    nodeDictFile = "full_node_list.pkl"
-    pddf = parse_citation_type_frame(pddf, nodeDictFile, nextarrayfiles, nextcolnames)
+NETWORK_COLUMNS = {"general": ['Pagerank (all)', 'Received citations (all)'],
+                   "voluntary": ['Pagerank (assignee citations only)', 'Received citations (assignee citations only)']}
 
-    nextarrayfiles = ["pagerank_voluntary.pkl", "received_citation_count_voluntary.pkl"]
-    nextcolnames = ['Pagerank (assignee citations only)', 'Received citations (assignee citations only)']
-    nodeDictFile = "full_node_list_voluntary.pkl"
-    pddf = parse_citation_type_frame(pddf, nodeDictFile, nextarrayfiles, nextcolnames)
+def parse_citation_type_frame(node_keys, edges, network, pagerankFileName, colnames):
+    """Function to obtain pageranks and received citation counts of a citation network as data frame.
+        Arguments:
+            node_keys - numpy array of int64 - patent key of each node id
+            edges - dict of numpy arrays - origin, destination, category, date
+            network - string - network name, see citation_ingest.network_selection
+            pagerankFileName - string - pickled pagerank series (indexed by patent key) saved by citation_parse.py
+            colnames - list of strings - names of pagerank and citation count columns
+        Returns pandas DataFrame indexed by patent key"""
+    pagerank_colname, citationcount_colname = colnames
+    selected = network_selection(edges, network)
+    in_network = incident_nodes(edges["origin"], edges["destination"], len(node_keys), selected)
+    citation_count = received_citations(edges["destination"], len(node_keys), selected).astype(float)
+    citation_count[~in_network] = np.nan
+    pagerank = pd.read_pickle(pagerankFileName)
+    return pd.DataFrame({pagerank_colname: pagerank, citationcount_colname: citation_count}, \
+                                                                            index=pd.Index(node_keys, name="PatID"))
 
-    pdb.set_trace()
-    #pddf.index = pddf.index.str.strip()
+def combine_all_citation_frames(edgeListPath="citation_edges"):
+    node_keys, edges = load_citation_edges(edgeListPath, mmap_mode="r")
+    pddf = pd.concat([parse_citation_type_frame(node_keys, edges, network, "pagerank_{}.pkl".format(network), \
+                                                NETWORK_COLUMNS[network]) for network in CITATION_NETWORKS], axis=1)
+    print(pddf.head())
     pddf.to_pickle("patents_citation_df.pkl")
-    
+
 if __name__ == '__main__':
     combine_all_citation_frames()
@@ -0,0 +1,470 @@
+"""Functions to compute the PageRank of the citation networks (adjacency matrices built by citation_graph.py).
+   The PageRank vector x (summing to 1) solves
+        x = alpha * (M x + w (d^T x)) + (1 - alpha) * v
+   where M is the transposed adjacency matrix with columns normalised to sum to 1 (M[i, j] = 1/outdegree(j) if j
+   cites i), d marks the dangling nodes (no outgoing citations), w is the dangling vector (distribution of the rank
+   of dangling nodes) and v is the teleport vector. By default w = v = uniform, which is the PageRank computed by
+   comp_PageRank (dangling rank and teleport added by renormalisation).
+   Solvers (method argument of pagerank()):
+        power          - power iteration
+        gauss-seidel   - block Gauss-Seidel sweeps: the nodes are split into blocks of consecutive node ids that are
+                         updated one after the other, each with the ranks already updated in the sweep; the dangling
+                         rank is taken from the previous sweep
+        extrapolation  - power iteration with quadratic extrapolation every few iterations (Kamvar, Haveliwala,
+                         Manning, Golub 2003: Extrapolation methods for accelerating PageRank computations)
+   Iteration stops when the L1 norm of the change of x is below the tolerance. In float32 mode, matrix data and rank
+   vectors are float32 (half the memory traffic per iteration) and the products M x are float32 (accumulated in
+   float32); only the dangling rank, the normalisation sums and the residuals are summed in float64, and the
+   tolerance is raised to at least 10 float32 machine epsilons. Iterations can be warm started from a previous
+   result. The matrix-vector products can be multi-threaded (n_threads, see spmv.py).
+
+How to run (timing and validation against comp_PageRank):
+
+python3 pagerank.py --matrix citation_network_general.npz
+python3 pagerank.py --matrix citation_network_general.npz --float32
+python3 pagerank.py --matrix citation_network_general.npz --validate gauss-seidel
+"""
+
+"""inport modules"""
+import numpy as np
+import scipy
+import scipy.sparse
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from spmv import row_block, matrix_operator
+
+PAGERANK_METHODS = ["power", "gauss-seidel", "extrapolation"]
+
+"""Function definitions"""
+
+def transition_matrix(adjacency, dtype=np.float64):
+    """Function to obtain the column normalised transposed adjacency matrix M and the dangling nodes.
+        Arguments:
+            adjacency - scipy.sparse matrix - square adjacency matrix, adjacency[i, j] != 0 if i cites j
+            dtype - numpy dtype - float type of M
+        Returns:
+            tuple of:
+                scipy.sparse csr matrix - M (rows: cited node, columns: citing node)
+                numpy array of int - dangling nodes"""
+    assert scipy.sparse.issparse(adjacency) and adjacency.shape[0] == adjacency.shape[1]
+    out_degree = np.asarray(adjacency.sum(axis=1), dtype=np.float64).ravel()
+    dangling = np.flatnonzero(out_degree == 0)
+    inverse = np.zeros(len(out_degree), dtype=dtype)
+    inverse[out_degree > 0] = 1. / out_degree[out_degree > 0]
+    transposed = scipy.sparse.csr_matrix(adjacency.T)
+    data = inverse[transposed.indices]
+    data *= transposed.data
+    return scipy.sparse.csr_matrix((data, transposed.indices, transposed.indptr), shape=transposed.shape), dangling
+
+def probability_vector(vector, n, dtype=np.float64):
+    """Function to obtain a probability vector (uniform if None, normalised to sum 1 otherwise) or a block of
+       probability vectors (each column normalised to sum 1).
+        Arguments:
+            vector - numpy array (n or n x k) or None - non-negative weights
+            n - int - length
+            dtype - numpy dtype - float type
+        Returns numpy array"""
+    if vector is None:
+        return np.full(n, 1. / n, dtype=dtype)
+    vector = np.asarray(vector, dtype=np.float64)
+    assert len(vector) == n and np.isfinite(vector).all() and (vector >= 0).all() and \
+                                    (vector.sum(axis=0) > 0).all(), "Invalid teleport, dangling, or start vector"
+    return np.ascontiguousarray(vector / vector.sum(axis=0), dtype=dtype)
+
+def power_step(M, x, dangling, dangling_weights, teleport, alpha):
+    """Function to compute one power iteration step.
+        Arguments:
+            M - scipy.sparse csr matrix or spmv.ParallelSpMV - transition matrix (see transition_matrix)
+            x - numpy array - current ranks
+            dangling - numpy array of int - dangling nodes
+            dangling_weights - numpy array - dangling vector w
+            teleport - numpy array - teleport vector v
+            alpha - float - damping factor
+        Returns numpy array - new ranks"""
+    dangling_rank = x[dangling].sum(dtype=np.float64)
+    x_new = M.dot(x)
+    x_new *= alpha
+    x_new += (alpha * dangling_rank) * dangling_weights
+    x_new += (1 - alpha) * teleport
+    return x_new
+
+def gauss_seidel_sweep(M_blocks, x, dangling, dangling_weights, teleport, alpha, bounds):
+    """Function to compute one block Gauss-Seidel sweep.
+        Arguments:
+            M_blocks - list of scipy.sparse csr matrices or spmv.ParallelSpMV - row blocks of the transition matrix
+            x, dangling, dangling_weights, teleport, alpha - see power_step
+            bounds - numpy array of int - first node of each block and number of nodes
+        Returns numpy array - new ranks"""
+    x_new = x.copy()
+    dangling_rank = x[dangling].sum(dtype=np.float64)
+    for M_block, start, end in zip(M_blocks, bounds[:-1], bounds[1:]):
+        block = M_block.dot(x_new)
+        block *= alpha
+        block += (alpha * dangling_rank) * dangling_weights[start:end]
+        block += (1 - alpha) * teleport[start:end]
+        x_new[start:end] = block
+    return x_new
+
+def personalized_pagerank(adjacency, teleport, alpha=0.85, tol=1e-7, max_iter=1000, dtype=np.float64, dangling=None, \
+                                                                        start=None, n_threads=1, verbose=True):
+    """Function to compute personalised PageRank for several teleport vectors at once. The k rank vectors are
+       iterated as one dense block X (n x k): each iteration is one product of the sparse matrix with the block, so
+       the matrix is read once for all k vectors instead of once per vector (power iteration).
+        Arguments:
+            adjacency - scipy.sparse matrix - square adjacency matrix, adjacency[i, j] != 0 if i cites j
+            teleport - numpy array (n x k) - non-negative teleport weights, one column per personalisation
+            alpha - float - damping factor
+            tol - float - tolerance of the L1 norm of the change of each rank vector between iterations (at least
+                          10 machine epsilons of dtype, see pagerank)
+            max_iter - int - maximum number of iterations
+            dtype - numpy dtype - np.float64 or np.float32
+            dangling - numpy array (n) or None - dangling weights (the teleport vector of each column if None)
+            start - numpy array (n x k) or None - start ranks, e.g. a previous result (teleport vectors if None)
+            n_threads - int - number of threads for the matrix products (see spmv.py)
+            verbose - bool - print the largest change of the rank vectors in every iteration
+        Returns:
+            tuple of:
+                numpy array of float64 (n x k) - ranks (columns sum to 1)
+                dict - iterations, residual (L1 norm of the last change of each column), time (seconds), converged"""
+    start_time = time.time()
+    tol = max(tol, 10 * np.finfo(dtype).eps)
+    M, dangling_nodes = transition_matrix(adjacency, dtype)
+    n = M.shape[0]
+    teleport = probability_vector(teleport, n, dtype)
+    assert teleport.ndim == 2, "Teleport weights must be a block (n x k)"
+    dangling_weights = teleport if dangling is None else probability_vector(dangling, n, dtype)[:, None]
+    X = teleport.copy() if start is None else probability_vector(start, n, dtype)
+    """Damping factor applied to the matrix data once instead of to the product in every iteration"""
+    M.data *= alpha
+    pool = ThreadPoolExecutor(n_threads) if n_threads > 1 else None
+    M_operator = matrix_operator(M, n_threads, pool)
+    """Dangling rank as product with an indicator vector (BLAS) rather than a copy of the dangling rows"""
+    dangling_indicator = np.zeros(n, dtype=np.float64)
+    dangling_indicator[dangling_nodes] = 1
+
+    info = {"iterations": 0, "residual": np.full(teleport.shape[1], np.inf), "converged": False}
+    for iteration in range(1, max_iter + 1):
+        dangling_rank = dangling_indicator.dot(X)
+        X_new = M_operator.dot(X)
+        if dangling is None:
+            X_new += teleport * ((1 - alpha) + alpha * dangling_rank).astype(dtype)
+        else:
+            X_new += (alpha * dangling_rank).astype(dtype) * dangling_weights
+            X_new += (1 - alpha) * teleport
+        X_new /= X_new.sum(axis=0, dtype=np.float64)
+        X -= X_new
+        np.abs(X, out=X)
+        residual = X.sum(axis=0, dtype=np.float64)
+        X = X_new
+        info.update(iterations=iteration, residual=residual)
+        if verbose:
+            print("Personalised PageRank iteration {0:4d}, max. L1 change {1:.3e}".format(iteration, residual.max()))
+        if residual.max() < tol:
+            info["converged"] = True
+            break
+    if pool is not None:
+        pool.shutdown()
+    info["time"] = time.time() - start_time
+    return X.astype(np.float64), info
+
+def quadratic_extrapolation(x0, x1, x2, x3):
+    """Function to extrapolate the limit of the iterates x(k-3), x(k-2), x(k-1), x(k) assuming that the
+       iteration error is dominated by the two leading eigenvectors (Kamvar et al. 2003, algorithm 3).
+        Arguments:
+            x0, x1, x2, x3 - numpy arrays - the last four iterates
+        Returns numpy array - extrapolated ranks (non-negative, not normalised)"""
+    Y = np.column_stack([x1 - x0, x2 - x0]).astype(np.float64)
+    y = (x3 - x0).astype(np.float64)
+    """Least squares solution of Y (gamma1, gamma2) = -y from the normal equations (2 x 2)"""
+    gamma1, gamma2 = np.linalg.lstsq(Y.T.dot(Y), -Y.T.dot(y), rcond=None)[0]
+    gamma3 = 1.
+    beta0, beta1, beta2 = gamma1 + gamma2 + gamma3, gamma2 + gamma3, gamma3
+    x = beta0 * x1 + beta1 * x2 + beta2 * x3
+    return np.maximum(x, 0).astype(x3.dtype)
+
+def pagerank(adjacency, alpha=0.85, tol=1e-7, max_iter=1000, method="power", dtype=np.float64, teleport=None, \
+                        dangling=None, start=None, blocks=64, extrapolation_interval=10, n_threads=1, verbose=True):
+    """Function to compute PageRank from a scipy sparse adjacency matrix.
+        Arguments:
+            adjacency - scipy.sparse matrix - square adjacency matrix, adjacency[i, j] != 0 if i cites j
+            alpha - float - damping factor
+            tol - float - tolerance of the L1 norm of the change of the ranks between iterations (at least
+                          10 machine epsilons of dtype, the rounding error of the ranks)
+            max_iter - int - maximum number of iterations (sweeps)
+            method - string - solver, one of PAGERANK_METHODS
+            dtype - numpy dtype - np.float64 or np.float32
+            teleport - numpy array or None - teleport weights (uniform if None)
+            dangling - numpy array or None - dangling weights (same as teleport if None)
+            start - numpy array or None - start ranks, e.g. a previous result (uniform if None)
+            blocks - int - number of blocks (gauss-seidel)
+            extrapolation_interval - int - iterations between extrapolations (extrapolation)
+            n_threads - int - number of threads for the matrix-vector products (see spmv.py)
+            verbose - bool - print the change of the ranks in every iteration
+        Returns:
+            tuple of:
+                numpy array of float64 - ranks (sum 1)
+                dict - iterations, residual (L1 norm of the last change), time (seconds), converged (bool)"""
+    assert method in PAGERANK_METHODS, "Unknown PageRank method {}".format(method)
+    start_time = time.time()
+    tol = max(tol, 10 * np.finfo(dtype).eps)
+    M, dangling_nodes = transition_matrix(adjacency, dtype)
+    n = M.shape[0]
+    teleport = probability_vector(teleport, n, dtype)
+    dangling_weights = teleport if dangling is None else probability_vector(dangling, n, dtype)
+    x = probability_vector(start, n, dtype)
+    bounds = np.linspace(0, n, min(blocks, n) + 1).astype(np.int64)
+    history = []
+    pool = ThreadPoolExecutor(n_threads) if n_threads > 1 else None
+    if method == "gauss-seidel":
+        M_blocks = [matrix_operator(row_block(M, start, end), n_threads, pool) for start, end in \
+                                                                                        zip(bounds[:-1], bounds[1:])]
+    else:
+        M_operator = matrix_operator(M, n_threads, pool)
+
+    info = {"iterations": 0, "residual": np.inf, "converged": False}
+    for iteration in range(1, max_iter + 1):
+        if method == "gauss-seidel":
+            x_new = gauss_seidel_sweep(M_blocks, x, dangling_nodes, dangling_weights, teleport, alpha, bounds)
+        else:
+            x_new = power_step(M_operator, x, dangling_nodes, dangling_weights, teleport, alpha)
+        """Renormalise (rounding errors; Gauss-Seidel sweeps do not preserve the sum)"""
+        x_new /= x_new.sum(dtype=np.float64)
+        residual = np.abs(x_new - x).sum(dtype=np.float64)
+        x = x_new
+        info.update(iterations=iteration, residual=residual)
+        if verbose:
+            print("PageRank ({0}) iteration {1:4d}, L1 change {2:.3e}".format(method, iteration, residual))
+        if residual < tol:
+            info["converged"] = True
+            break
+        if method == "extrapolation":
+            history = history[-3:] + [x]
+            if iteration % extrapolation_interval == 0 and len(history) == 4:
+                x = quadratic_extrapolation(*history)
+                x /= x.sum(dtype=np.float64)
+                history = []
+    if pool is not None:
+        pool.shutdown()
+    info["time"] = time.time() - start_time
+    return x.astype(np.float64), info
+
+def comp_PageRank(DG, d=0.85, precision_limit = 10**-8):
+    """ Function to compute PageRank from scipy sparse matrix. Following
+           - https://en.wikipedia.org/wiki/PageRank
+           - http://blog.samuelmh.com/2015/02/pagerank-sparse-matrices-python-ipython.html
+           - https://networkx.github.io/documentation/latest/_modules/networkx/algorithms/link_analysis/pagerank_alg.html#pagerank
+        Former implementation of citation_parse.py, kept as reference for the validation of pagerank().
+        Parameters:
+            DG - adjacency matrix, assumed to be sp.sparse, 2d and square.
+                 Note that links in this matrix are assumed to be the right way around: DG[i,j] records whether a link i->j exists,
+                 not the other way around (j->i).
+            d - PageRank dampening parameter
+            precision_limit - pagerank precision limit
+        Returns:
+            pagerank values as numpy ndarray
+        Algorithm is
+            Iterate:
+                 pr(t+1) = d*M*pr(t) + renormalization
+            until pr(t+1) - pr(t) converges,
+            where M is the transposed adjacency patrix with columns normalized to sum to 1.
+            Initialization:
+                 pr(0) = vector of size mrank with all elements 1./mrank
+    """
+
+    """ Check that matrix is scipy.sparse object, is 2d and is square """
+    assert scipy.sparse.issparse(DG)
+    assert DG.ndim == 2
+    mrank, mrank2 = DG.shape
+    assert mrank == mrank2
+
+    """ Compute matrix M (overwriting DG to save memory)"""
+    L_recip = 1/DG.sum(axis=1).A.ravel()
+    L_recip[~np.isfinite(L_recip)] = 0
+    L_recip_matrix = scipy.sparse.diags(L_recip)
+    DG = DG.T
+    DG = DG.dot(L_recip_matrix)
+
+    """ Initialize pagerank vector """
+    pr_old = np.ones(mrank)
+    pr = np.ones(mrank) * 1./mrank
+
+    """ Iterative computation"""
+    iterations = 0
+    while (abs(pr_old-pr) >= precision_limit).any():
+        iterations += 1
+        print("PageRank computation. Iteration {0:4d}".format(iterations))
+        pr_old = pr
+        pr = d*DG.dot(pr_old) #+ np.ones(mrank)*((1-d)/mrank)   # additive term useless since we have to renormalize in the next line (since some colum sums will be zero for sparse matrices)
+        pr += (1-pr.sum()) / mrank
+
+    return pr
+
+def pagerank_residual(adjacency, x, alpha=0.85, teleport=None, dangling=None):
+    """Function to compute the residual of a PageRank vector, || alpha * (M x + w (d^T x)) + (1 - alpha) * v - x ||_1,
+       from the adjacency matrix directly (M x = A^T (x / outdegree), not with transition_matrix used by the solvers).
+       A solution with error e has a residual of at most (1 + alpha) ||e||_1 and an error of at most
+       residual / (1 - alpha).
+        Arguments:
+            adjacency - scipy.sparse matrix - square adjacency matrix, adjacency[i, j] != 0 if i cites j
+            x - numpy array - PageRank vector
+            alpha, teleport, dangling - see pagerank
+        Returns float"""
+    x = np.asarray(x, dtype=np.float64)
+    n = len(x)
+    out_degree = np.asarray(adjacency.sum(axis=1), dtype=np.float64).ravel()
+    is_dangling = out_degree == 0
+    teleport = probability_vector(teleport, n)
+    dangling_weights = teleport if dangling is None else probability_vector(dangling, n)
+    scaled = np.divide(x, out_degree, out=np.zeros(n), where=~is_dangling)
+    image = alpha * (adjacency.T.dot(scaled) + dangling_weights * x[is_dangling].sum()) + (1 - alpha) * teleport
+    return np.abs(image - x).sum()
+
+def dense_pagerank(adjacency, alpha=0.85, teleport=None, dangling=None):
+    """Function to compute PageRank of a small graph with a direct dense solver (independent of the iterative
+       solvers): solves (I - alpha * (M + w d^T)) x = (1 - alpha) * v.
+        Arguments:
+            adjacency - scipy.sparse matrix - square adjacency matrix (a few thousand nodes)
+            alpha, teleport, dangling - see pagerank
+        Returns numpy array of float64"""
+    A = np.asarray(adjacency.todense(), dtype=np.float64)
+    n = A.shape[0]
+    out_degree = A.sum(axis=1)
+    is_dangling = out_degree == 0
+    teleport = probability_vector(teleport, n)
+    dangling_weights = teleport if dangling is None else probability_vector(dangling, n)
+    P = np.divide(A, out_degree[:, None], out=np.zeros_like(A), where=~is_dangling[:, None]).T
+    P += np.outer(dangling_weights, is_dangling)
+    x = np.linalg.solve(np.eye(n) - alpha * P, (1 - alpha) * teleport)
+    return x / x.sum()
+
+def random_induced_subgraph(neighbours, size, rng):
+    """Function to sample nodes for an induced subgraph by breadth first search (along cited and citing edges) from
+       random start nodes, so that the subgraph keeps edges (uniformly sampled nodes of a large sparse graph have
+       almost none).
+        Arguments:
+            neighbours - scipy.sparse csr matrix - symmetric adjacency matrix (adjacency + adjacency.T)
+            size - int - number of nodes
+            rng - numpy.random.Generator - random number generator
+        Returns numpy array of int - sorted node ids"""
+    n = neighbours.shape[0]
+    size = min(size, n)
+    chosen = np.zeros(n, dtype=bool)
+    n_chosen = 0
+    frontier = np.zeros(0, dtype=np.int64)
+    while n_chosen < size:
+        if len(frontier) == 0:
+            start = rng.integers(n)
+            while chosen[start]:
+                start = rng.integers(n)
+            frontier = np.array([start])
+        else:
+            frontier = np.unique(neighbours[frontier].indices)
+            frontier = frontier[~chosen[frontier]]
+            rng.shuffle(frontier)
+        frontier = frontier[:size - n_chosen]
+        chosen[frontier] = True
+        n_chosen += len(frontier)
+    return np.flatnonzero(chosen)
+
+def validate_pagerank(adjacency, x, alpha=0.85, tol=1e-7, method="power", dtype=np.float64, n_subgraphs=5, \
+                                            subgraph_size=2000, networkx_limit=10000, seed=0, verbose=True):
+    """Function to validate a PageRank vector and the solver that produced it in time linear in the number of edges:
+        - residual norm of x on the full graph (see pagerank_residual)
+        - on random induced subgraphs: solver result vs. direct dense solution (see dense_pagerank)
+        - on graphs with at most networkx_limit nodes, if networkx is installed: x vs. networkx.pagerank
+        Arguments:
+            adjacency - scipy.sparse csr matrix - square adjacency matrix
+            x - numpy array - PageRank vector of adjacency
+            alpha - float - damping factor
+            tol, method, dtype - arguments of the solver (see pagerank)
+            n_subgraphs - int - number of random subgraphs
+            subgraph_size - int - number of nodes of each subgraph
+            networkx_limit - int - largest graph compared with networkx
+            seed - int - random seed
+            verbose - bool - print the results
+        Returns:
+            tuple of:
+                bool - all checks passed (residual below 10 tol, errors below 10 tol / (1 - alpha))
+                dict - residual, subgraph errors (L1), networkx error (L1, if computed)"""
+    rng = np.random.default_rng(seed)
+    tol = max(tol, 10 * np.finfo(dtype).eps)
+    error_limit = 10 * tol / (1 - alpha)
+    results = {"residual": pagerank_residual(adjacency, x, alpha), "subgraph errors": []}
+    passed = results["residual"] < 10 * tol
+    if verbose:
+        print("Validation: residual {0:.2e} on the full graph ({1} nodes)".format(results["residual"], len(x)))
+    if subgraph_size >= len(x):
+        """The subgraph is the full graph"""
+        n_subgraphs = min(n_subgraphs, 1)
+    neighbours = scipy.sparse.csr_matrix(adjacency + adjacency.T) if n_subgraphs > 0 else None
+    for _ in range(n_subgraphs):
+        nodes = random_induced_subgraph(neighbours, subgraph_size, rng)
+        subgraph = adjacency[nodes][:, nodes]
+        solution, _ = pagerank(subgraph, alpha=alpha, tol=tol, method=method, dtype=dtype, verbose=False)
+        error = np.abs(solution - dense_pagerank(subgraph, alpha)).sum()
+        results["subgraph errors"].append(error)
+        passed &= error < error_limit
+        if verbose:
+            print("Validation: L1 error {0:.2e} on a subgraph with {1} nodes, {2} edges".format(error, len(nodes), \
+                                                                                                        subgraph.nnz))
+    if len(x) <= networkx_limit:
+        try:
+            import networkx as nx
+        except ImportError:
+            nx = None
+        if nx is not None:
+            net = nx.from_scipy_sparse_array(adjacency, create_using=nx.DiGraph)
+            pr = nx.pagerank(net, alpha=alpha, tol=1e-12)
+            results["networkx error"] = np.abs(np.asarray([pr[i] for i in range(len(x))]) - x).sum()
+            passed &= results["networkx error"] < error_limit
+            if verbose:
+                print("Validation: L1 difference {0:.2e} to networkx".format(results["networkx error"]))
+    return bool(passed), results
+
+def benchmark_pagerank(adjacency, tol=1e-7, dtype=np.float64):
+    """Function to compare the solvers with comp_PageRank: prints iterations, wall-clock time, and deviation.
+        Arguments:
+            adjacency - scipy.sparse matrix - adjacency matrix
+            tol - float - L1 tolerance of the solvers
+            dtype - numpy dtype - float type of the solvers
+        Returns None"""
+    start_time = time.time()
+    reference = comp_PageRank(adjacency)
+    print("comp_PageRank: {0:.1f} s".format(time.time() - start_time))
+    """Reference at tight tolerance to assess the accuracy of both"""
+    exact, _ = pagerank(adjacency, tol=1e-12, verbose=False)
+    print("comp_PageRank vs. exact: L1 {0:.2e}, max. relative {1:.2e}".format(np.abs(reference - exact).sum(), \
+                                                                        (np.abs(reference - exact) / exact).max()))
+    for method in PAGERANK_METHODS:
+        pr, info = pagerank(adjacency, tol=tol, method=method, dtype=dtype, verbose=False)
+        print("{0:14s}: {1:4d} iterations, {2:6.1f} s, L1 vs. comp_PageRank {3:.2e}, L1 vs. exact {4:.2e}, " \
+                "max. relative vs. exact {5:.2e}".format(method, info["iterations"], info["time"], \
+                np.abs(pr - reference).sum(), np.abs(pr - exact).sum(), (np.abs(pr - exact) / exact).max()))
+    """Warm start from a perturbed result (e.g. the previous version of the network)"""
+    perturbed = exact * np.random.default_rng(0).uniform(0.9, 1.1, len(exact))
+    pr, info = pagerank(adjacency, tol=tol, dtype=dtype, start=perturbed, verbose=False)
+    print("warm start    : {0:4d} iterations, {1:6.1f} s, L1 vs. exact {2:.2e}".format(info["iterations"], \
+                                                                                info["time"], np.abs(pr - exact).sum()))
+
+""" main entry point """
+
+if __name__ == "__main__":
+    """Parse terminal arguments"""
+    parser = argparse.ArgumentParser(description="PageRank solvers: timing and validation against comp_PageRank.")
+    parser.add_argument("--matrix", default="citation_network_general.npz", help="Citation network (npz).")
+    parser.add_argument("--tol", type=float, default=1e-7, help="L1 tolerance.")
+    parser.add_argument("--float32", action="store_true", help="Use float32 matrix data and rank vectors.")
+    parser.add_argument("--validate", choices=PAGERANK_METHODS, help="Only validate the given solver (residual norm " \
+                                                        "and direct solver on random subgraphs, see validate_pagerank).")
+    args = parser.parse_args()
+
+    adjacency = scipy.sparse.load_npz(args.matrix)
+    dtype = np.float32 if args.float32 else np.float64
+    print("{0} nodes, {1} edges".format(adjacency.shape[0], adjacency.nnz))
+    if args.validate is not None:
+        x, _ = pagerank(adjacency, tol=args.tol, method=args.validate, dtype=dtype, verbose=False)
+        passed, _ = validate_pagerank(adjacency, x, tol=args.tol, method=args.validate, dtype=dtype)
+        print("Validation {}".format("passed" if passed else "FAILED"))
+    else:
+        benchmark_pagerank(adjacency, tol=args.tol, dtype=dtype)
@@ -0,0 +1,137 @@
+"""Script to compute personalised PageRank of the citation network for green and non-green seed sets.
+   For each green flag of the combined data frame (keyword detection, envtech, IPC green inventory, Y02 codes) two
+   teleport vectors are formed: uniform over the green patents and uniform over the non-green patents (flag False) of
+   the network. Presence-only flags (only True or NaN, like the keyword flag) are False for the other patents of the
+   data frame. Patents not in the data frame are in neither seed set. All teleport vectors are solved together as one dense block (see pagerank.personalized_pagerank), which costs a
+   fraction of separate runs. Optionally, only citations made in a time window (citation dates of the edge list) are
+   used. The network is built from the edge list of citation_ingest.py over its node index and is restricted to the
+   nodes incident to the selected edges (as in citation_parse.py), so that patents that cannot cite or be cited in
+   the network or time window do not take up teleport weight.
+   Output is a pickled pandas dataframe indexed by patent key (see classifications/patent_ids.py), one column per
+   seed set, NaN for patents not in the network: personalized_pagerank_<network>.pkl or personalized_pagerank_<network>_<first day>_<last day>.pkl
+
+How to run:
+
+python3 personalized_pagerank.py --dataframe CPC_sorted_green_patents_combined_df.pkl
+python3 personalized_pagerank.py --dataframe CPC_sorted_green_patents_combined_df.pkl --window 1990-01-01 1999-12-31
+python3 personalized_pagerank.py --dataframe CPC_sorted_green_patents_combined_df.pkl --benchmark
+"""
+
+"""inport modules"""
+import numpy as np
+import pandas as pd
+import argparse
+import time
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "classifications"))
+from patent_ids import encode_index
+from citation_ingest import load_citation_edges, network_selection, window_selection, date_days, NO_DATE, \
+                                                                                                    CITATION_NETWORKS
+from citation_graph import adjacency_matrix, incident_nodes
+from pagerank import pagerank, personalized_pagerank
+
+"""Green flags of the combined data frame (data_frame/join_to_combined_dataframe.py)"""
+GREEN_COLUMNS = ["Shapira et al. GI pattern", "envtech_CPC", "IPCGI_CPC", "Y_Codes"]
+
+"""Function definitions"""
+
+def seed_teleport_block(node_keys, pddf, columns):
+    """Function to obtain teleport weights for green and non-green seed sets.
+        Arguments:
+            node_keys - numpy array of int64 - patent key of each node
+            pddf - pandas DataFrame - green flags indexed by patent ID or key
+            columns - list of strings - flag columns
+        Returns:
+            tuple of:
+                numpy array of float64 (n x k) - 1 for the seeds of each seed set, 0 otherwise (green: flag True,
+                                                 non-green: flag False; presence-only flags, i.e. flags that are only
+                                                 True or NaN, are False for the other patents of the data frame;
+                                                 patents not in the data frame are in neither set)
+                list of strings - seed set names"""
+    flags = encode_index(pddf[columns], errors="coerce")
+    for column in columns:
+        if flags[column].dropna().eq(True).all():
+            """Presence-only flag: patents in the data frame without the flag are non-green"""
+            flags[column] = flags[column].fillna(False)
+    flags = flags[~flags.index.duplicated(keep="first")].reindex(node_keys)
+    weights = []
+    names = []
+    for column in columns:
+        green = flags[column].eq(True).to_numpy()
+        non_green = flags[column].eq(False).to_numpy()
+        for name, seeds in [(column + " green", green), (column + " non-green", non_green)]:
+            if not seeds.any():
+                print("No seeds for {}, skipped".format(name))
+                continue
+            weights.append(seeds.astype(np.float64))
+            names.append(name)
+    return np.column_stack(weights), names
+
+def benchmark_batch(adjacency, teleport, **kwargs):
+    """Function to compare the batched solution with separate PageRank runs for each teleport vector.
+        Arguments:
+            adjacency - scipy.sparse matrix - adjacency matrix
+            teleport - numpy array (n x k) - teleport weights
+            kwargs - further arguments of pagerank.personalized_pagerank
+        Returns None"""
+    X, info = personalized_pagerank(adjacency, teleport, verbose=False, **kwargs)
+    start_time = time.time()
+    iterations = 0
+    max_difference = 0
+    for column in range(teleport.shape[1]):
+        x, column_info = pagerank(adjacency, method="power", teleport=teleport[:, column], \
+                                                                        start=teleport[:, column], verbose=False, **kwargs)
+        iterations += column_info["iterations"]
+        max_difference = max(max_difference, np.abs(x - X[:, column]).sum())
+    print("batched ({0} vectors): {1:4d} iterations, {2:6.1f} s".format(teleport.shape[1], info["iterations"], \
+                                                                                                    info["time"]))
+    print("separate runs        : {0:4d} iterations, {1:6.1f} s, max. L1 difference {2:.2e}".format(iterations, \
+                                                                            time.time() - start_time, max_difference))
+
+""" main entry point """
+
+if __name__ == "__main__":
+    """Parse terminal arguments"""
+    parser = argparse.ArgumentParser(description="Personalised PageRank for green and non-green seed sets.")
+    parser.add_argument("--edges", default="citation_edges", help="Edge list directory (citation_ingest.py).")
+    parser.add_argument("--network", default="general", choices=CITATION_NETWORKS, help="Citation network.")
+    parser.add_argument("--dataframe", default="CPC_sorted_green_patents_combined_df.pkl", \
+                                                                            help="Data frame with green flags.")
+    parser.add_argument("--columns", nargs="+", default=GREEN_COLUMNS, help="Green flag columns.")
+    parser.add_argument("--window", nargs=2, metavar=("FIRST", "LAST"), \
+                                                    help="Use only citations made from FIRST to LAST (YYYY-MM-DD).")
+    parser.add_argument("--float32", action="store_true", help="Compute in single precision.")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="Number of threads.")
+    parser.add_argument("--benchmark", action="store_true", help="Compare with separate runs for each seed set.")
+    args = parser.parse_args()
+
+    """Network (optionally restricted to a time window)"""
+    node_keys, edges = load_citation_edges(args.edges, mmap_mode="r")
+    selected = network_selection(edges, args.network)
+    outputFileName = "personalized_pagerank_{}.pkl".format(args.network)
+    if args.window is not None:
+        first_day, last_day = date_days(pd.Series(args.window))
+        assert NO_DATE < first_day <= last_day, "Invalid time window {}".format(args.window)
+        selected = window_selection(edges, first_day, last_day, selected)
+        outputFileName = "personalized_pagerank_{0}_{1}_{2}.pkl".format(args.network, *args.window)
+    print("Building citation matrix from edge list")
+    adjacency = adjacency_matrix(edges["origin"], edges["destination"], len(node_keys), selected)
+    """Restrict to the nodes of the network (incident to at least one selected edge)"""
+    nodes = np.flatnonzero(incident_nodes(edges["origin"], edges["destination"], len(node_keys), selected))
+    if len(nodes) < len(node_keys):
+        adjacency = adjacency[nodes][:, nodes]
+    print("{0} nodes, {1} edges".format(adjacency.shape[0], adjacency.nnz))
+
+    """Seed sets"""
+    teleport, names = seed_teleport_block(node_keys[nodes], pd.read_pickle(args.dataframe), args.columns)
+    dtype = np.float32 if args.float32 else np.float64
+
+    if args.benchmark:
+        benchmark_batch(adjacency, teleport, dtype=dtype, n_threads=args.threads)
+    else:
+        X, info = personalized_pagerank(adjacency, teleport, dtype=dtype, n_threads=args.threads)
+        print("{0} seed sets: {1} iterations, {2:.1f} s".format(len(names), info["iterations"], info["time"]))
+        ranks = pd.DataFrame(np.nan, index=pd.Index(node_keys, name="PatID"), columns=names)
+        ranks.iloc[nodes] = X
+        ranks.to_pickle(outputFileName)
@@ -0,0 +1,128 @@
+"""Multi-threaded sparse matrix-vector products for the iterative network computations (PageRank, see pagerank.py).
+   The rows of a csr matrix are partitioned into contiguous blocks with about equal numbers of non-zero entries. The
+   blocks share the data of the matrix (no copy). The products of the blocks with the vector are computed in a pool of
+   threads and written to disjoint slices of the result. The compiled csr kernel of scipy releases the GIL, so the
+   threads run in parallel without any extension modules.
+
+How to run (scaling with the number of threads):
+
+python3 spmv.py --matrix citation_network_general.npz --threads 1 2 4 8 16 32
+"""
+
+"""inport modules"""
+import numpy as np
+import scipy
+import scipy.sparse
+import argparse
+import time
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+"""Class definitions"""
+class ParallelSpMV():
+    def __init__(self, M, pool, n_blocks):
+        """Constructor. Partitions the rows of the matrix into blocks.
+            Arguments:
+                M - scipy.sparse csr matrix - the matrix
+                pool - concurrent.futures.ThreadPoolExecutor - thread pool
+                n_blocks - int - number of row blocks (usually the number of threads of the pool)
+            Returns:
+                ParallelSpMV instance."""
+        self.shape = M.shape
+        self.dtype = M.dtype
+        self.pool = pool
+        self.bounds = balanced_row_bounds(M, n_blocks)
+        self.blocks = [row_block(M, start, end) for start, end in zip(self.bounds[:-1], self.bounds[1:])]
+
+    def dot(self, x):
+        """Method to compute the product with a vector or a dense block of vectors.
+            Arguments:
+                x - numpy array - vector (length: number of columns) or block (number of columns x k)
+            Returns:
+                numpy array - product (length: number of rows, or number of rows x k)"""
+        out = np.empty((self.shape[0],) + x.shape[1:], dtype=np.result_type(self.dtype, x.dtype))
+        def block_product(i):
+            out[self.bounds[i]:self.bounds[i + 1]] = self.blocks[i].dot(x)
+        for future in [self.pool.submit(block_product, i) for i in range(len(self.blocks))]:
+            future.result()
+        return out
+
+"""Function definitions"""
+
+def row_block(M, start, end):
+    """Function to obtain rows start to end of a csr matrix as csr matrix sharing the data of M (no copy).
+        Arguments:
+            M - scipy.sparse csr matrix
+            start, end - int - row range
+        Returns scipy.sparse csr matrix"""
+    first, last = M.indptr[start], M.indptr[end]
+    return scipy.sparse.csr_matrix((M.data[first:last], M.indices[first:last], M.indptr[start:end + 1] - first), \
+                                                                                shape=(end - start, M.shape[1]))
+
+def balanced_row_bounds(M, n_blocks):
+    """Function to partition the rows of a csr matrix into contiguous blocks with about equal numbers of entries.
+        Arguments:
+            M - scipy.sparse csr matrix
+            n_blocks - int - number of blocks
+        Returns numpy array of int64 - first row of each block and number of rows"""
+    bounds = np.searchsorted(M.indptr, np.linspace(0, M.nnz, n_blocks + 1)).astype(np.int64)
+    bounds[0], bounds[-1] = 0, M.shape[0]
+    return np.maximum.accumulate(np.minimum(bounds, M.shape[0]))
+
+def matrix_operator(M, n_threads=1, pool=None):
+    """Function to obtain an object computing products with M: M itself (single-threaded) or ParallelSpMV.
+        Arguments:
+            M - scipy.sparse csr matrix
+            n_threads - int - number of threads
+            pool - concurrent.futures.ThreadPoolExecutor or None - thread pool with n_threads threads
+        Returns scipy.sparse csr matrix or ParallelSpMV"""
+    if n_threads < 2 or pool is None:
+        return M
+    return ParallelSpMV(M, pool, n_threads)
+
+def benchmark_spmv(M, thread_counts, repetitions=20):
+    """Function to time the products of M with a vector for different numbers of threads and compare the results.
+        Arguments:
+            M - scipy.sparse csr matrix
+            thread_counts - list of int - numbers of threads
+            repetitions - int - number of products per timing
+        Returns dict - number of threads: seconds per product"""
+    x = np.random.default_rng(0).random(M.shape[1]).astype(M.dtype)
+    reference = M.dot(x)
+    timings = {}
+    for n_threads in thread_counts:
+        with ThreadPoolExecutor(n_threads) as pool:
+            operator = matrix_operator(M, n_threads, pool)
+            operator.dot(x)
+            start_time = time.time()
+            for _ in range(repetitions):
+                y = operator.dot(x)
+            timings[n_threads] = (time.time() - start_time) / repetitions
+        assert np.allclose(y, reference), "Parallel product differs"
+        print("{0:3d} threads: {1:8.4f} s per product, speedup {2:5.2f}".format(n_threads, timings[n_threads], \
+                                                                        timings[thread_counts[0]] / timings[n_threads]))
+    return timings
+
+""" main entry point """
+
+if __name__ == "__main__":
+    """Parse terminal arguments"""
+    parser = argparse.ArgumentParser(description="Scaling of multi-threaded sparse matrix-vector products.")
+    parser.add_argument("--matrix", default="citation_network_general.npz", help="Citation network (npz).")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32], help="Numbers of threads.")
+    parser.add_argument("--float32", action="store_true", help="Use float32 matrix data.")
+    parser.add_argument("--pagerank", action="store_true", help="Also time PageRank for each number of threads.")
+    args = parser.parse_args()
+
+    from pagerank import pagerank, transition_matrix
+    adjacency = scipy.sparse.load_npz(args.matrix)
+    dtype = np.float32 if args.float32 else np.float64
+    print("{0} nodes, {1} edges, {2} cores".format(adjacency.shape[0], adjacency.nnz, os.cpu_count()))
+    M, _ = transition_matrix(adjacency, dtype)
+    benchmark_spmv(M, args.threads)
+    if args.pagerank:
+        for n_threads in args.threads:
+            for method in ["power", "gauss-seidel"]:
+                _, info = pagerank(adjacency, method=method, dtype=dtype, n_threads=n_threads, verbose=False)
+                print("{0:3d} threads, {1:12s}: {2:4d} iterations, {3:6.1f} s".format(n_threads, method, \
+                                                                                info["iterations"], info["time"]))
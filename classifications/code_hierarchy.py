@@ -0,0 +1,268 @@
+"""Hierarchical table of classification codes shared by the CPC and IPC parsers (parse_CPC.py, parse_IPC.py).
+   All codes of all levels are held in one table with integer code ids and parent pointers
+        section -> class -> subclass -> maingroup -> subgroup
+   e.g. "A" -> "A01" -> "A01B" -> "A01B1" -> "A01B1/00". Codes are compared with all whitespace removed, so
+   CPC codes ("A01B1/00", "A01B   1/00") and IPC codes (as constructed in parse_IPC.py) share one table.
+   The level names of parse_CPC.py are mapped to the shared levels (subsection -> class, group -> subclass).
+   The table is built from the codes of the finest level (the columns of the subgroup classification matrix)
+   and allows to roll up a classification matrix to any coarser level with one sparse matrix product
+   (CodeHierarchy.aggregate) instead of parsing and storing one matrix per level.
+   load_level_matrix() obtains the classification matrix of any level from the saved subgroup matrix this way.
+   Results are cached on disk keyed by level and version (size and modification time) of the source files.
+
+How to run (build table from a saved code list):
+
+python3 code_hierarchy.py patent_classification_codes_level_subgroup.pkl
+"""
+
+"""inport modules"""
+import numpy as np
+import scipy
+import scipy.sparse
+import pickle
+import pandas as pd
+import argparse
+import hashlib
+import os
+
+"""Shared levels from coarse to fine and names used for them by the parsers"""
+LEVELS = ['section', 'class', 'subclass', 'maingroup', 'subgroup']
+LEVEL_ALIASES = {'subsection': 'class', 'group': 'subclass'}
+
+"""Class definitions"""
+"""Classification code table. Codes of all levels with integer ids and parent pointers."""
+class CodeHierarchy():
+    def __init__(self, codes, levels, parents, column_ids):
+        """Constructor method. Code ids are consecutive by level (all sections first, then all classes, etc.).
+            Arguments:
+                codes - numpy array of strings - normalised codes
+                levels - numpy array of int - level index (in LEVELS) of each code
+                parents - numpy array of int - id of the parent of each code, -1 for the top level
+                column_ids - numpy array of int - code id of each column of the source classification matrix
+            Returns class instance."""
+        self.codes = np.asarray(codes, dtype=str)
+        self.levels = np.asarray(levels, dtype=np.int8)
+        self.parents = np.asarray(parents, dtype=np.int64)
+        self.column_ids = np.asarray(column_ids, dtype=np.int64)
+        assert (np.diff(self.levels) >= 0).all(), "Codes must be ordered by level"
+        self.level_offsets = np.searchsorted(self.levels, np.arange(len(LEVELS) + 1))
+        self.finest_level = LEVELS[int(self.levels[self.column_ids].max())] if len(self.column_ids) > 0 \
+                                                                                                else LEVELS[-1]
+        self.code_index = {}
+
+    def level_range(self, level):
+        """Method to obtain the range of code ids of a level.
+            Arguments:
+                level - string - level name
+            Returns:
+                tuple of int - first and last + 1 code id of the level"""
+        level_idx = level_index(level)
+        return self.level_offsets[level_idx], self.level_offsets[level_idx + 1]
+
+    def level_codes(self, level):
+        """Method to obtain the codes of a level. The position of a code in the array is its id within the level.
+            Arguments:
+                level - string - level name
+            Returns numpy array of strings"""
+        start, stop = self.level_range(level)
+        return self.codes[start:stop]
+
+    def code_ids(self, codes, level):
+        """Method to look up codes of a level.
+            Arguments:
+                codes - list or array of strings - codes (whitespace is ignored)
+                level - string - level name
+            Returns numpy array of int - ids of the codes within the level, -1 for unknown codes"""
+        level = LEVEL_ALIASES.get(level, level)
+        if level not in self.code_index:
+            self.code_index[level] = pd.Index(self.level_codes(level))
+        return self.code_index[level].get_indexer(normalise_codes(codes))
+
+    def ancestor_ids(self, level):
+        """Method to follow the parent pointers from every column of the source matrix up to a coarser level.
+            Arguments:
+                level - string - level name
+            Returns numpy array of int - id within the level of the ancestor of each column"""
+        level_idx = level_index(level)
+        assert level_idx <= level_index(self.finest_level), \
+                                    "Level {0} is finer than the table ({1})".format(level, self.finest_level)
+        ids = self.column_ids
+        while len(ids) > 0 and self.levels[ids[0]] > level_idx:
+            ids = self.parents[ids]
+        return ids - self.level_offsets[level_idx]
+
+    def column_codes(self, level):
+        """Method to obtain the codes of the columns of the matrix of a level (as returned by aggregate()).
+            Arguments:
+                level - string - level name
+            Returns numpy array of strings"""
+        if level_index(level) == level_index(self.finest_level):
+            return self.codes[self.column_ids]
+        return self.level_codes(level)
+
+    def aggregation_matrix(self, level):
+        """Method to obtain the sparse mapping of the columns of the source matrix to the codes of a level.
+            Arguments:
+                level - string - level name
+            Returns scipy.sparse csr matrix of int32 (columns x codes of the level). Entry (i, j) is 1 if code j
+                    is column i or one of its ancestors."""
+        ancestors = self.ancestor_ids(level)
+        start, stop = self.level_range(level)
+        indptr = np.arange(len(ancestors) + 1)
+        return scipy.sparse.csr_matrix((np.ones(len(ancestors), dtype=np.int32), ancestors, indptr), \
+                                                                            shape=(len(ancestors), stop - start))
+
+    def aggregate(self, classificationmatrix, level):
+        """Method to roll up a classification matrix (columns as in the source code list) to a coarser level.
+            Arguments:
+                classificationmatrix - scipy.sparse matrix - patents x codes classification matrix
+                level - string - level name
+            Returns scipy.sparse csr matrix of bool - patents x codes of the level"""
+        assert classificationmatrix.shape[1] == len(self.column_ids), \
+                    "Matrix has {0} columns, code table {1}".format(classificationmatrix.shape[1], len(self.column_ids))
+        classificationmatrix = scipy.sparse.csr_matrix(classificationmatrix, dtype=np.int32)
+        return (classificationmatrix.dot(self.aggregation_matrix(level)) > 0).tocsr()
+
+    def save(self, filename):
+        """Method to save the code table as npz file.
+            Arguments:
+                filename - string - output file name
+            Returns None"""
+        np.savez(filename, codes=self.codes, levels=self.levels, parents=self.parents, column_ids=self.column_ids)
+
+"""Function definitions"""
+
+def level_index(level):
+    """Function to obtain the index of a level name (shared name or alias used by the parsers) in LEVELS.
+        Arguments:
+            level - string - level name
+        Returns int"""
+    return LEVELS.index(LEVEL_ALIASES.get(level, level))
+
+def normalise_codes(codes):
+    """Function to remove all whitespace from classification codes.
+        Arguments:
+            codes - list or array of strings - classification codes
+        Returns numpy array of strings"""
+    return pd.Series(np.asarray(codes, dtype=str), dtype=object).str.replace(r"\s+", "", regex=True).to_numpy(str)
+
+def ancestor_codes(codes, level):
+    """Function to derive the codes of a level from (normalised) codes of the same or a finer level.
+        Arguments:
+            codes - numpy array of strings - normalised classification codes
+            level - string - level name
+        Returns numpy array of strings"""
+    level = LEVEL_ALIASES.get(level, level)
+    codes = pd.Series(codes, dtype=object)
+    if level == 'section':
+        codes = codes.str[:1]
+    elif level == 'class':
+        codes = codes.str[:3]
+    elif level == 'subclass':
+        codes = codes.str[:4]
+    elif level == 'maingroup':
+        codes = codes.str.split("/").str[0]
+    return codes.to_numpy(str)
+
+def build_code_hierarchy(codes, level='subgroup'):
+    """Function to build the code table from the codes of one level, e.g. the columns of the subgroup
+       classification matrix. The ancestors of all codes at all coarser levels are derived vectorised and
+       factorised level by level.
+        Arguments:
+            codes - list or array of strings - classification codes (columns of the source matrix)
+            level - string - level of the codes
+        Returns CodeHierarchy"""
+    finest = level_index(level)
+    codes = normalise_codes(codes)
+    all_codes = []
+    all_levels = []
+    all_parents = []
+    offset = 0
+    parent_idx = None
+    for level_idx in range(finest + 1):
+        """Factorise codes of this level; ids in order of first appearance"""
+        code_idx, uniques = pd.factorize(ancestor_codes(codes, LEVELS[level_idx]))
+        parents = np.full(len(uniques), -1, dtype=np.int64)
+        if parent_idx is not None:
+            parents[code_idx] = parent_idx + offset - parent_count
+        all_codes.append(np.asarray(uniques, dtype=str))
+        all_levels.append(np.full(len(uniques), level_idx, dtype=np.int8))
+        all_parents.append(parents)
+        parent_idx, parent_count = code_idx, len(uniques)
+        offset += len(uniques)
+    column_ids = parent_idx + offset - parent_count
+    return CodeHierarchy(np.concatenate(all_codes), np.concatenate(all_levels), np.concatenate(all_parents), \
+                                                                                                    column_ids)
+
+def load_code_hierarchy(filename):
+    """Function to load a code table saved with CodeHierarchy.save().
+        Arguments:
+            filename - string - npz file name
+        Returns CodeHierarchy"""
+    with np.load(filename) as data:
+        return CodeHierarchy(data["codes"], data["levels"], data["parents"], data["column_ids"])
+
+def source_version(filenames):
+    """Function to obtain a version key of source files from their size and modification time.
+        Arguments:
+            filenames - list of strings - file names
+        Returns string"""
+    stats = [(os.path.abspath(filename), os.stat(filename).st_size, os.stat(filename).st_mtime_ns) \
+                                                                                        for filename in filenames]
+    return hashlib.md5(repr(stats).encode()).hexdigest()[:12]
+
+def load_level_matrix(level, matrix_file="patent_classification_matrix_level_subgroup.npz", \
+                        hierarchy_file="patent_classification_code_hierarchy.npz", \
+                        codes_file="patent_classification_codes_level_subgroup.pkl", cache_dir="."):
+    """Function to obtain the classification matrix of any level from the subgroup classification matrix. The
+       matrix is rolled up with the code table and cached on disk. The cache file name contains the level and the
+       version of the source files, so it is recomputed when the subgroup matrix or the code table change. If
+       the code table has not been saved, it is built from the subgroup code list and saved.
+        Arguments:
+            level - string - level name (shared name or alias used by the parsers)
+            matrix_file - string - npz file of the subgroup classification matrix
+            hierarchy_file - string - npz file of the code table
+            codes_file - string - pickle file of the subgroup codes (used if the code table is missing)
+            cache_dir - string - directory for cached matrices
+        Returns:
+            tuple of:
+                scipy.sparse csr matrix of bool - patents x codes of the level
+                numpy array of strings - codes of the level (columns of the matrix)"""
+    if not os.path.exists(hierarchy_file):
+        print("Building code hierarchy from {}".format(codes_file))
+        with open(codes_file, "rb") as rfile:
+            build_code_hierarchy(pickle.load(rfile)).save(hierarchy_file)
+    CH = load_code_hierarchy(hierarchy_file)
+    if level_index(level) == level_index(CH.finest_level):
+        return scipy.sparse.load_npz(matrix_file).tocsr(), CH.column_codes(level)
+    
+    """Reload cached matrix or aggregate and cache"""
+    level = LEVEL_ALIASES.get(level, level)
+    cache_file = os.path.join(cache_dir, "patent_classification_matrix_level_{0}_cache_{1}.npz".format(level, \
+                                                                    source_version([matrix_file, hierarchy_file])))
+    if os.path.exists(cache_file):
+        print("Reloading cached matrix {}".format(cache_file))
+        classificationmatrix = scipy.sparse.load_npz(cache_file).tocsr()
+    else:
+        print("Aggregating subgroup matrix to level {}".format(level))
+        classificationmatrix = CH.aggregate(scipy.sparse.load_npz(matrix_file), level)
+        scipy.sparse.save_npz(cache_file, classificationmatrix)
+    return classificationmatrix, CH.column_codes(level)
+
+""" main entry point """
+
+if __name__ == "__main__":
+    """Parse terminal arguments"""
+    parser = argparse.ArgumentParser(description="Build hierarchical classification code table.")
+    parser.add_argument("codes", nargs="?", default="patent_classification_codes_level_subgroup.pkl", \
+                                                            help="Classification codes file (pickle).")
+    parser.add_argument("--level", default="subgroup", help="Level of the codes in the file.")
+    parser.add_argument("--output", default="patent_classification_code_hierarchy.npz", help="Output file.")
+    args = parser.parse_args()
+
+    with open(args.codes, "rb") as rfile:
+        classlist = pickle.load(rfile)
+    CH = build_code_hierarchy(classlist, args.level)
+    for level in LEVELS[:level_index(args.level) + 1]:
+        print("Level {0:10s}: {1:8d} codes".format(level, len(CH.level_codes(level))))
+    CH.save(args.output)
@@ -0,0 +1,190 @@
+"""Script to compute classification code co-occurrence matrices (technology space) per level and grant year.
+   The co-occurrence matrix of a patents x codes classification matrix A is C = A^T A; entry (i, j) is the number
+   of patents with both codes i and j, the diagonal holds the number of patents with each code. At subgroup
+   level A^T A cannot be computed at once, so it is accumulated over blocks of patents (rows of A). Only the upper
+   triangle (including the diagonal) is computed and stored: for each block, the code pairs (i <= j) of each patent
+   are listed directly and counted, instead of forming the full block product.
+   Classification matrices of all levels are obtained from the subgroup matrix (see code_hierarchy.py), grant
+   years from the combined data frame (rows in the order of the classification matrix, see
+   data_frame/join_to_combined_dataframe.py).
+   The script records:
+    - co-occurrence matrices for all years and for each grant year as npz files
+    - relatedness (cosine similarity and association strength) between green and non-green codes as pickled
+        pandas dataframe. Green codes are those matching the search patterns of a pattern file (Y02 by default).
+
+How to run:
+
+python3 cooccurrence.py --level section --level subclass
+python3 cooccurrence.py --level subgroup --years --blocksize 200000
+"""
+
+"""inport modules"""
+import numpy as np
+import scipy
+import scipy.sparse
+import pandas as pd
+import argparse
+from code_hierarchy import load_level_matrix
+from green_inventory import GreenInventory
+
+"""Function definitions"""
+
+def upper_pairs(block):
+    """Function to obtain the upper triangle of the co-occurrence matrix of a block of patents by listing the code
+       pairs (i <= j) of each patent.
+        Arguments:
+            block - scipy.sparse csr matrix - patents x codes classification matrix (canonical format)
+        Returns scipy.sparse csr matrix of int64 (codes x codes) - upper triangle of block^T block"""
+    """Each entry is paired with itself and the following entries of its row"""
+    row_ends = np.repeat(block.indptr[1:].astype(np.int64), np.diff(block.indptr))
+    lengths = row_ends - np.arange(block.nnz, dtype=np.int64)
+    pair_starts = np.cumsum(lengths) - lengths
+    first = np.repeat(np.arange(block.nnz, dtype=np.int64), lengths)
+    second = np.arange(lengths.sum(), dtype=np.int64) - np.repeat(pair_starts, lengths) + first
+    data = block.data.astype(np.int64)
+    n_codes = block.shape[1]
+    return scipy.sparse.coo_matrix((data[first] * data[second], (block.indices[first], block.indices[second])), \
+                                                                            shape=(n_codes, n_codes)).tocsr()
+
+def cooccurrence_matrix(classificationmatrix, blocksize=500000):
+    """Function to compute the upper triangle of the co-occurrence matrix A^T A of a classification matrix by
+       accumulating the code pairs of blocks of rows. Blocks are converted to int64 one at a time, so memory use
+       is bounded by the code pairs of one block and the result (besides the classification matrix).
+        Arguments:
+            classificationmatrix - scipy.sparse matrix - patents x codes classification matrix
+            blocksize - int - number of patents per block
+        Returns scipy.sparse csr matrix of int64 (codes x codes) - upper triangle of A^T A"""
+    classificationmatrix = scipy.sparse.csr_matrix(classificationmatrix)
+    n_codes = classificationmatrix.shape[1]
+    cooccurrence = scipy.sparse.csr_matrix((n_codes, n_codes), dtype=np.int64)
+    for start in range(0, classificationmatrix.shape[0], blocksize):
+        block = scipy.sparse.csr_matrix(classificationmatrix[start:start + blocksize], dtype=np.int64)
+        block.sum_duplicates()
+        cooccurrence = cooccurrence + upper_pairs(block)
+    return cooccurrence
+
+def symmetric_cooccurrence(cooccurrence):
+    """Function to obtain the full co-occurrence matrix from its upper triangle.
+        Arguments:
+            cooccurrence - scipy.sparse matrix - upper triangle of the co-occurrence matrix
+        Returns scipy.sparse csr matrix (codes x codes)"""
+    cooccurrence = scipy.sparse.csr_matrix(cooccurrence)
+    return (cooccurrence + scipy.sparse.triu(cooccurrence, k=1, format="csr").T).tocsr()
+
+def cooccurrence_by_year(classificationmatrix, years, blocksize=500000):
+    """Function to compute co-occurrence matrices for each grant year. Patents are grouped by year with one sort.
+        Arguments:
+            classificationmatrix - scipy.sparse matrix - patents x codes classification matrix
+            years - numpy array of float or int - grant year of each patent (NaN if unknown)
+            blocksize - int - number of patents per block
+        Returns dict - year: scipy.sparse csr matrix (upper triangle of the co-occurrence matrix)"""
+    classificationmatrix = scipy.sparse.csr_matrix(classificationmatrix)
+    known = np.flatnonzero(~pd.isna(years))
+    years = np.asarray(years)[known].astype(np.int64)
+    order = np.argsort(years, kind="stable")
+    year_values, year_starts = np.unique(years[order], return_index=True)
+    year_stops = np.append(year_starts[1:], len(order))
+    cooccurrence = {}
+    for year, start, stop in zip(year_values, year_starts, year_stops):
+        print("\rYear {0}: {1} patents".format(year, stop - start), end="")
+        cooccurrence[int(year)] = cooccurrence_matrix(classificationmatrix[known[order[start:stop]]], blocksize)
+    print("")
+    return cooccurrence
+
+def cosine_similarity(cooccurrence):
+    """Function to compute the cosine similarity of codes from their co-occurrence: C_ij / sqrt(C_ii C_jj).
+        Arguments:
+            cooccurrence - scipy.sparse matrix - co-occurrence matrix (full or upper triangle)
+        Returns scipy.sparse csr matrix of float (same sparsity pattern)"""
+    cooccurrence = scipy.sparse.csr_matrix(cooccurrence, dtype=np.float64)
+    norms = np.sqrt(cooccurrence.diagonal())
+    return normalise_entries(cooccurrence, norms, norms)
+
+def association_strength(cooccurrence, n_patents):
+    """Function to compute the association strength of codes from their co-occurrence: N C_ij / (C_ii C_jj), i.e.
+       the ratio of observed co-occurrences to those expected if codes were assigned independently.
+        Arguments:
+            cooccurrence - scipy.sparse matrix - co-occurrence matrix (full or upper triangle)
+            n_patents - int - number of patents N
+        Returns scipy.sparse csr matrix of float (same sparsity pattern)"""
+    cooccurrence = scipy.sparse.csr_matrix(cooccurrence, dtype=np.float64)
+    occurrences = cooccurrence.diagonal()
+    return normalise_entries(cooccurrence * n_patents, occurrences, occurrences)
+
+def normalise_entries(matrix, row_norms, col_norms):
+    """Function to divide each nonzero entry (i, j) of a sparse matrix by row_norms[i] * col_norms[j].
+        Arguments:
+            matrix - scipy.sparse csr matrix of float - the matrix
+            row_norms - numpy array of float - row norms
+            col_norms - numpy array of float - column norms
+        Returns scipy.sparse csr matrix of float"""
+    matrix = matrix.copy()
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        matrix.data = matrix.data / (row_norms[rows] * col_norms[matrix.indices])
+    matrix.data[~np.isfinite(matrix.data)] = 0
+    matrix.eliminate_zeros()
+    return matrix
+
+def green_relatedness(cooccurrence, codes, green_columns, n_patents):
+    """Function to obtain cosine similarity and association strength between all co-occurring pairs of green and
+       non-green codes.
+        Arguments:
+            cooccurrence - scipy.sparse matrix - co-occurrence matrix (upper triangle)
+            codes - numpy array of strings - codes (rows and columns of the co-occurrence matrix)
+            green_columns - numpy array of int - indices of green codes
+            n_patents - int - number of patents
+        Returns pandas DataFrame with columns green code, code, cooccurrence, cosine, association strength"""
+    cooccurrence = symmetric_cooccurrence(cooccurrence)
+    is_green = np.zeros(len(codes), dtype=bool)
+    is_green[green_columns] = True
+    green_idx = np.flatnonzero(is_green)
+    nongreen_idx = np.flatnonzero(~is_green)
+
+    """Co-occurring pairs of green rows and non-green columns"""
+    occurrences = cooccurrence.diagonal().astype(np.float64)
+    pairs = cooccurrence[green_idx][:, nongreen_idx].tocoo()
+    green_occurrences = occurrences[green_idx[pairs.row]]
+    occurrences = occurrences[nongreen_idx[pairs.col]]
+    relatedness = pd.DataFrame({"green code": np.asarray(codes)[green_idx[pairs.row]], \
+                                "code": np.asarray(codes)[nongreen_idx[pairs.col]], \
+                                "cooccurrence": pairs.data, \
+                                "cosine": pairs.data / np.sqrt(green_occurrences * occurrences), \
+                                "association strength": n_patents * pairs.data / (green_occurrences * occurrences)})
+    return relatedness.sort_values("association strength", ascending=False).reset_index(drop=True)
+
+""" main entry point """
+
+if __name__ == "__main__":
+    """Parse terminal arguments"""
+    parser = argparse.ArgumentParser(description="Classification code co-occurrence and relatedness.")
+    parser.add_argument("--level", action="append", default=[], help="Classification level (repeatable). " \
+                                                                                        "Default: section, subclass.")
+    parser.add_argument("--years", action="store_true", help="Compute co-occurrence matrices per grant year.")
+    parser.add_argument("--dataframe", default="CPC_sorted_green_patents_combined_df.pkl", \
+                                                            help="Combined data frame with 'granted year' column.")
+    parser.add_argument("--patterns", default="y02_codes.txt", help="Search pattern file defining green codes.")
+    parser.add_argument("--blocksize", type=int, default=500000, help="Number of patents per block.")
+    args = parser.parse_args()
+    levels = args.level if len(args.level) > 0 else ["section", "subclass"]
+    GI = GreenInventory(args.patterns)
+
+    for level in levels:
+        print("Level {}".format(level))
+        classificationmatrix, codes = load_level_matrix(level)
+        n_patents = classificationmatrix.shape[0]
+
+        """All years"""
+        cooccurrence = cooccurrence_matrix(classificationmatrix, args.blocksize)
+        scipy.sparse.save_npz("cooccurrence_level_{}.npz".format(level), cooccurrence)
+        relatedness = green_relatedness(cooccurrence, codes, GI.filter_matching(codes), n_patents)
+        relatedness.to_pickle("cooccurrence_relatedness_level_{}.pkl".format(level))
+        print(relatedness.head(10))
+
+        """By grant year"""
+        if args.years:
+            years = pd.read_pickle(args.dataframe)["granted year"].to_numpy()
+            assert len(years) >= n_patents, "Data frame has fewer rows than the classification matrix"
+            for year, year_cooccurrence in cooccurrence_by_year(classificationmatrix, years[:n_patents], \
+                                                                                        args.blocksize).items():
+                scipy.sparse.save_npz("cooccurrence_level_{0}_year_{1}.npz".format(level, year), year_cooccurrence)
@@ -0,0 +1,39 @@
+"""Function to combine partial greenness data frames (as saved by parse_CPC.py --greennesslines i j,
+   parse_IPC.py --greennesslines i j and parse_CPC_based_on_USPTO_gov_rawdata.py i) into one data frame.
+   All partial data frames are concatenated at once and duplicate patent IDs are checked in one vectorised
+   step. This keeps the join linear in the number of partial data frames.
+"""
+
+"""inport modules"""
+import pandas as pd
+
+"""Function definitions"""
+
+def concat_partial_dataframes(dfs, conflict_filename=None):
+    """Function to concatenate partial data frames indexed by patent ID. Patent IDs that occur more than once
+       are kept once (first occurrence). If the duplicate rows of a patent ID differ, the patent ID is reported
+       as conflicting and written to conflict_filename (one ID per line).
+        Arguments:
+            dfs - list of pandas DataFrames - partial data frames with identical columns
+            conflict_filename - string or None - file to record conflicting patent IDs in
+        Returns:
+            tuple of:
+                pandas DataFrame - combined data frame
+                pandas Index - conflicting patent IDs"""
+    pddf = pd.concat(dfs)
+    duplicated = pddf.index.duplicated(keep=False)
+    conflicts = pddf.index[:0]
+    if duplicated.any():
+        print("Overlapping patent keys found: {}".format(pddf.index[duplicated].nunique()))
+        """Patent IDs with more than one distinct row"""
+        duplicate_rows = pddf[duplicated]
+        distinct_rows = duplicate_rows[~duplicate_rows.reset_index().duplicated().to_numpy()]
+        conflicts = distinct_rows.index[distinct_rows.index.duplicated()].unique()
+        pddf = pddf[~pddf.index.duplicated(keep='first')]
+    if len(conflicts) > 0:
+        print("Warning: Mismatched entries for {} patent keys".format(len(conflicts)))
+        if conflict_filename is not None:
+            with open(conflict_filename, "w") as wfile:
+                wfile.write("\n".join(str(idx) for idx in conflicts) + "\n")
+            print("Conflicting patent keys written to {}".format(conflict_filename))
+    return pddf, conflicts
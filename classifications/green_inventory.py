@@ -0,0 +1,296 @@
+"""Green inventory search patterns shared by the classification parsers (parse_CPC.py, parse_IPC.py,
+   parse_CPC_based_on_USPTO_gov_rawdata.py).
+   Search pattern files (envtech_03.txt, green_inventory_03.txt, ...) are compiled into prefix tries over
+   classification codes with all whitespace removed (so that "B01D   53/34", "B01D  53/34" and "B01D53/34" are
+   the same code). Range patterns like "B01D   53/34-72" are stored natively at the trie node of their stem
+   instead of being expanded into one literal per number. Checking a code against all patterns of a file
+   therefore costs O(length of the code) instead of O(number of patterns).
+   Patterns match as prefixes of the normalised code, i.e. "F23J15" matches "F23J15/02". For well-formed
+   classification codes this is the same as the substring test (pattern in code) used previously.
+   Combined patterns ("[F17D    5/02 and E03]") can be evaluated for all patents at once on a patent x code
+   classification matrix with sparse matrix products (GreenInventory.match_combined_matrix).
+   The module defines two classes:
+    - PatternTrie as compiled matcher.
+    - GreenInventory as search pattern class.
+"""
+
+"""inport modules"""
+import numpy as np
+import scipy.sparse
+
+"""Class definitions"""
+"""Node of the search pattern trie."""
+class PatternTrieNode:
+    __slots__ = ("children", "pattern_ids", "ranges")
+
+    def __init__(self):
+        """Constructor. Prepares empty node.
+            No Arguments
+            Returns: Class instance"""
+        self.children = {}
+        self.pattern_ids = []           # ids of patterns ending at this node
+        self.ranges = []                # tuples (startnum, endnum, width, pattern_id) of ranges with this stem
+
+"""Compiled search pattern matcher. Prefix trie over normalised classification codes with native support
+   for numeric ranges."""
+class PatternTrie:
+    def __init__(self):
+        """Constructor. Prepares empty trie.
+            No Arguments
+            Returns: Class instance"""
+        self.root = PatternTrieNode()
+        self.range_widths = set()
+
+    def get_node(self, prefix):
+        """Method to find (and create if necessary) the trie node of a prefix.
+            Arguments:
+                prefix - string - normalised code prefix
+            Returns: PatternTrieNode"""
+        node = self.root
+        for char in prefix:
+            child = node.children.get(char)
+            if child is None:
+                child = PatternTrieNode()
+                node.children[char] = child
+            node = child
+        return node
+
+    def add_pattern(self, pattern, pattern_id=0):
+        """Method to add a search pattern. Patterns are either simple codes ("F23G    7/06") or ranges of
+           codes ("B01D   53/34-72", "F02M   39-71"). In the latter case, the number in front of the hyphen is
+           the start of the range and its number of digits gives the zero padding of all numbers in the range.
+            Arguments:
+                pattern - string - the search pattern
+                pattern_id - int - identifier returned by matching_ids() if the pattern matches
+            Returns: None"""
+        pattern = normalise_code(pattern)
+        if "-" in pattern:
+            """Identify start and endpoint of range"""
+            stem, endnum = pattern.split("-")
+            startnum_idx = len(stem)
+            while startnum_idx > 0 and stem[startnum_idx - 1].isdigit():
+                startnum_idx -= 1
+            stem, startnum = stem[:startnum_idx], stem[startnum_idx:]
+            """Record range at the node of the stem"""
+            width = len(startnum)
+            self.get_node(stem).ranges.append((int(startnum), int(endnum), width, pattern_id))
+            self.range_widths.update(range(width, max(width, len(str(int(endnum)))) + 1))
+        else:
+            self.get_node(pattern).pattern_ids.append(pattern_id)
+
+    def matching_ids(self, code):
+        """Method to obtain the ids of all patterns matching a classification code.
+            Arguments:
+                code - string - classification code
+            Returns: set of int - ids of matching patterns"""
+        code = normalise_code(code)
+        found = set()
+        node = self.root
+        for pos in range(len(code) + 1):
+            found.update(node.pattern_ids)
+            for startnum, endnum, width, pattern_id in node.ranges:
+                if self.range_matches(code[pos:], startnum, endnum, width):
+                    found.add(pattern_id)
+            if pos == len(code):
+                break
+            node = node.children.get(code[pos])
+            if node is None:
+                break
+        return found
+
+    def matches(self, code):
+        """Method to check if any pattern matches a classification code. Stops at the first match.
+            Arguments:
+                code - string - classification code
+            Returns: bool"""
+        code = normalise_code(code)
+        node = self.root
+        for pos in range(len(code) + 1):
+            if node.pattern_ids:
+                return True
+            for startnum, endnum, width, _ in node.ranges:
+                if self.range_matches(code[pos:], startnum, endnum, width):
+                    return True
+            if pos == len(code):
+                break
+            node = node.children.get(code[pos])
+            if node is None:
+                break
+        return False
+
+    def range_matches(self, remainder, startnum, endnum, width):
+        """Method to check if the remainder of a code after the stem of a range pattern starts with one of the
+           (zero padded) numbers of the range.
+            Arguments:
+                remainder - string - part of the normalised code following the stem
+                startnum - int - start of the range
+                endnum - int - end of the range (inclusive)
+                width - int - zero padding width of the numbers of the range
+            Returns: bool"""
+        for length in self.range_widths:
+            number = remainder[:length]
+            if len(number) == length and number.isdigit() and startnum <= int(number) <= endnum and \
+                                                                        str(int(number)).zfill(width) == number:
+                return True
+        return False
+
+"""Green patents search pattern class. Can parse and apply OECD ENVTECH and IPC green inventory patterns"""
+class GreenInventory:
+    def __init__(self, patternsfile, patterns=None):
+        """Constructor. Records patternfile and calls methods to read and compile patterns
+            Arguments:
+                patternfile - string - path to pattern file (or name of the patterns if patterns are given)
+                patterns - list of strings or None - search patterns (same syntax as the lines of a pattern file)
+                                                     to be used instead of reading the pattern file
+            Returns: Class instance"""
+        self.name = patternsfile
+        if patterns is None:
+            patterns = line_generator_from_file(patternsfile)
+        self.read_search_patterns(patterns)
+        self.compile_search_patterns()
+
+    def read_search_patterns(self, patterns):
+        """Method to read search patterns (lines of a pattern file). Whitespace is removed from all patterns as
+           classification codes are compared in normalised form.
+            Arguments:
+                patterns - iterable of strings - search patterns
+            Returns: None"""
+
+        """Prepare record variables"""
+        self.single_patterns = []
+        self.combined_patterns = []
+
+        """Parse file"""
+        for line in patterns:
+            if line[0]=="[":                        #find conditional patterns
+                elements = line[1:].split("]")[0].split(" and ")
+                self.combined_patterns.append([normalise_code(element) for element in elements])
+            else:                                   #find simple and range patterns
+                self.single_patterns.append(normalise_code(line))
+
+    def compile_search_patterns(self):
+        """Method to compile the search patterns into tries. Elements of combined patterns are numbered
+           consecutively; self.combined_element_ids holds the element ids of each combined pattern.
+            No Arguments
+            Returns: None"""
+        self.single_trie = PatternTrie()
+        for pattern in self.single_patterns:
+            self.single_trie.add_pattern(pattern)
+
+        self.combined_trie = PatternTrie()
+        self.combined_element_ids = []
+        element_id = 0
+        for cp in self.combined_patterns:
+            self.combined_element_ids.append([])
+            for pattern_element in cp:
+                self.combined_trie.add_pattern(pattern_element, element_id)
+                self.combined_element_ids[-1].append(element_id)
+                element_id += 1
+        self.n_combined_elements = element_id
+
+    def filter_matching(self, class_strings):
+        """Method to filter all strings in a list that are matched by the single patterns of the green inventory.
+            Arguments:
+                class_strings - list of strings - classification codes
+            Returns: numpy array of int - indices of matched strings"""
+        filtered = [i for i, cs in enumerate(class_strings) if self.single_trie.matches(cs)]
+        return np.array(filtered, dtype=np.int64)
+
+    def match_single(self, class_string):
+        """Method to check if a class string matches a green technology as defined as single string.
+            Arguments:
+                class_string - string - classification code
+            Returns: bool - patent is a green technology"""
+        return self.single_trie.matches(class_string)
+
+    def match_combined(self, class_strings):
+        """Method to check if a list of class strings matches a green technology as defined
+           in combined strings that all have to match.
+            Arguments:
+                class_strings - list of strings - list of classification codes
+            Returns: bool - patent is a green technology"""
+        found = set()
+        for cs in class_strings:
+            found.update(self.combined_trie.matching_ids(cs))
+        return any(all(element_id in found for element_id in element_ids) \
+                                                            for element_ids in self.combined_element_ids)
+
+    def combined_element_matrix(self, class_strings):
+        """Method to obtain the column masks of all elements of combined patterns as one sparse matrix.
+            Arguments:
+                class_strings - list of strings - classification codes (columns of the classification matrix)
+            Returns: scipy.sparse csr matrix of int32 (codes x combined pattern elements). Entry (i, j) is 1 if
+                     code i matches element j."""
+        rows = []
+        cols = []
+        for i, cs in enumerate(class_strings):
+            for element_id in self.combined_trie.matching_ids(cs):
+                rows.append(i)
+                cols.append(element_id)
+        return scipy.sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), \
+                                                        shape=(len(class_strings), self.n_combined_elements))
+
+    def match_combined_matrix(self, classificationmatrix, class_strings):
+        """Method to check for all patents at once if they match any combined pattern. Computes
+                (patents x elements) = classificationmatrix * element masks
+                (patents x patterns) = (patents x elements > 0) * (elements x patterns)
+           and records a patent as green if for some pattern the number of matched elements equals the
+           number of elements of the pattern.
+            Arguments:
+                classificationmatrix - scipy.sparse matrix - patents x codes classification matrix
+                class_strings - list of strings - classification codes (columns of the classification matrix)
+            Returns: numpy array of bool - patent matches some combined pattern"""
+        if len(self.combined_patterns) == 0:
+            return np.zeros(classificationmatrix.shape[0], dtype=bool)
+
+        """Obtain patents x elements incidence"""
+        element_matrix = self.combined_element_matrix(class_strings)
+        classificationmatrix = scipy.sparse.csr_matrix(classificationmatrix, dtype=np.int32)
+        patent_elements = classificationmatrix.dot(element_matrix)
+        return self.match_combined_elements(patent_elements)
+
+    def match_combined_elements(self, patent_elements):
+        """Method to check for all patents at once if they match any combined pattern given the incidence of
+           combined pattern elements (e.g. as obtained from classificationmatrix * combined_element_matrix()).
+            Arguments:
+                patent_elements - scipy.sparse matrix - patents x combined pattern elements, nonzero if the
+                                                        patent has a code matching the element
+            Returns: numpy array of bool - patent matches some combined pattern"""
+        if len(self.combined_patterns) == 0:
+            return np.zeros(patent_elements.shape[0], dtype=bool)
+        patent_elements = scipy.sparse.csr_matrix(patent_elements, dtype=np.int32)
+        patent_elements.data = (patent_elements.data > 0).astype(np.int32)
+
+        """Count matched elements per pattern"""
+        pattern_rows = [element_id for element_ids in self.combined_element_ids for element_id in element_ids]
+        pattern_cols = [p_idx for p_idx, element_ids in enumerate(self.combined_element_ids) for _ in element_ids]
+        pattern_matrix = scipy.sparse.csr_matrix((np.ones(len(pattern_rows), dtype=np.int32), \
+                    (pattern_rows, pattern_cols)), shape=(self.n_combined_elements, len(self.combined_element_ids)))
+        patent_patterns = patent_elements.dot(pattern_matrix).tocsr()
+
+        """Patterns are matched if all of their elements are"""
+        pattern_lengths = np.array([len(element_ids) for element_ids in self.combined_element_ids])
+        patent_patterns.data = (patent_patterns.data == pattern_lengths[patent_patterns.indices])
+        patent_patterns.eliminate_zeros()
+        return np.diff(patent_patterns.indptr) > 0
+
+"""Function definitions"""
+
+def normalise_code(code):
+    """Function to remove all whitespace from a classification code or search pattern.
+        Arguments:
+            code - string - classification code
+        Returns: string"""
+    return "".join(code.split())
+
+def line_generator_from_file(filename):
+    """Generator function. Opens pattern file and creates a generator that returns the relevant
+       lines one by one (ignoring empty lines and those starting with "#").
+        Arguments:
+            filename - string - file name
+        Returns generator"""
+    with open(filename, "r") as rfile:
+        for line in rfile:
+            line = line.replace("\n", "")
+            if line.strip() and (not line[0] == "#"):
+                yield line
@@ -0,0 +1,184 @@
+"""Script to compute the greenness of all patents for several search pattern schemes in one pass over the
+   classification matrix.
+   The script loads a patent x code classification matrix (as saved by parse_CPC.py or parse_IPC.py) once,
+   builds a sparse (codes x columns) selector matrix for all registered schemes and obtains all
+   (patents x schemes) greenness flags with a single sparse matrix product. Default schemes are:
+    - OECD ENVTECH from file envtech_03.txt
+    - IPC green inventory from file green_inventory_03.txt
+    - CPC Y02 codes and each Y02 subfamily (Y02A, Y02B, ...) as prefix patterns (Y02_SCHEMES)
+   Further schemes can be added as pattern files (same syntax as envtech_03.txt) with --scheme NAME FILE.
+   Combined patterns ("[A and B]") are evaluated from additional selector columns, one per pattern element,
+   that are computed in the same product.
+   The script records a pandas dataframe of all schemes as pickle file.
+
+How to run:
+
+python3 greenness_engine.py
+python3 greenness_engine.py --scheme custom my_patterns.txt --output patent_greenness_custom.pkl
+"""
+
+"""inport modules"""
+import numpy as np
+import scipy
+import scipy.sparse
+import pickle
+import pandas as pd
+import argparse
+from green_inventory import GreenInventory
+
+"""Y02 schemes: column names and code prefixes of all Y02 codes and the Y02 subfamilies. Subfamilies require a
+   matrix of 4 character codes or finer."""
+Y02_SCHEMES = {'Y_Codes': 'Y02', 'Y02A': 'Y02A', 'Y02B': 'Y02B', 'Y02C': 'Y02C', 'Y02D': 'Y02D', 'Y02E': 'Y02E', \
+               'Y02P': 'Y02P', 'Y02T': 'Y02T', 'Y02W': 'Y02W'}
+
+"""Class definitions"""
+"""Greenness engine class. Evaluates several search pattern schemes on one classification matrix."""
+class GreennessEngine():
+    def __init__(self, classificationmatrix, classlist, patlist):
+        """Constructor method.
+            Arguments:
+                classificationmatrix - scipy.sparse matrix - patents x codes classification matrix
+                classlist - list or array of strings - classification codes (columns of the matrix)
+                patlist - list of strings - patent IDs (rows of the matrix)
+            Returns class instance."""
+        assert classificationmatrix.shape == (len(patlist), len(classlist)), \
+                            "Matrix shape {0} does not match node keys ({1}, {2})".format(classificationmatrix.shape, \
+                                                                                    len(patlist), len(classlist))
+        self.classificationmatrix = scipy.sparse.csr_matrix(classificationmatrix)
+        self.classlist = classlist
+        self.patlist = patlist
+        self.schemes = {}
+
+    def register_scheme(self, name, patternsfile):
+        """Method to add a search pattern scheme.
+            Arguments:
+                name - string - name of the scheme; column name in the greenness data frame
+                patternsfile - string - path to pattern file
+            Returns None"""
+        self.register_inventory(name, GreenInventory(patternsfile))
+
+    def register_inventory(self, name, GI):
+        """Method to add a search pattern scheme that is already loaded.
+            Arguments:
+                name - string - name of the scheme; column name in the greenness data frame
+                GI - GreenInventory - search patterns of the scheme
+            Returns None"""
+        self.schemes[name] = GI
+
+    def register_patterns(self, name, patterns):
+        """Method to add a search pattern scheme given as list of patterns (same syntax as pattern files).
+            Arguments:
+                name - string - name of the scheme; column name in the greenness data frame
+                patterns - list of strings - search patterns
+            Returns None"""
+        self.register_inventory(name, GreenInventory(name, patterns))
+
+    def register_Y02_schemes(self, schemes=None):
+        """Method to add the Y02 schemes (one scheme per code prefix).
+            Arguments:
+                schemes - dict or None - scheme names and code prefixes. Y02_SCHEMES if None.
+            Returns None"""
+        if schemes is None:
+            schemes = Y02_SCHEMES
+        for name, prefix in schemes.items():
+            self.register_patterns(name, [prefix])
+
+    def selector_matrix(self):
+        """Method to build the selector matrix of all registered schemes. The first columns hold one column per
+           scheme (codes matching any single pattern of the scheme), followed by one column per combined pattern
+           element of each scheme.
+            No Arguments
+            Returns:
+                tuple of:
+                    scipy.sparse csr matrix of int32 (codes x columns) - selector matrix
+                    dict - column offset of the combined pattern elements of each scheme"""
+        rows = []
+        cols = []
+        element_offsets = {}
+        next_col = len(self.schemes)
+        for scheme_idx, (name, GI) in enumerate(self.schemes.items()):
+            """Single patterns"""
+            col_array = GI.filter_matching(self.classlist)
+            rows.append(col_array)
+            cols.append(np.full(len(col_array), scheme_idx, dtype=np.int64))
+
+            """Combined pattern elements"""
+            element_offsets[name] = next_col
+            if GI.n_combined_elements > 0:
+                element_matrix = GI.combined_element_matrix(self.classlist).tocoo()
+                rows.append(element_matrix.row)
+                cols.append(element_matrix.col + next_col)
+                next_col += GI.n_combined_elements
+
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+        selector = scipy.sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), \
+                                                                        shape=(len(self.classlist), next_col))
+        return selector, element_offsets
+
+    def compute_greenness(self):
+        """Method to compute the greenness flags of all patents for all registered schemes.
+            No Arguments
+            Returns:
+                pandas DataFrame of bool - patents x schemes, indexed by patent ID"""
+        selector, element_offsets = self.selector_matrix()
+
+        """One product for all schemes and combined pattern elements"""
+        print("Computing greenness for schemes: {}".format(", ".join(self.schemes)))
+        patent_columns = self.classificationmatrix.dot(selector).tocsc()
+
+        """Read off flags"""
+        greenness = {}
+        for scheme_idx, (name, GI) in enumerate(self.schemes.items()):
+            is_green = np.zeros(len(self.patlist), dtype=bool)
+            start, stop = patent_columns.indptr[scheme_idx], patent_columns.indptr[scheme_idx + 1]
+            is_green[patent_columns.indices[start:stop]] = patent_columns.data[start:stop] > 0
+            if GI.n_combined_elements > 0:
+                offset = element_offsets[name]
+                patent_elements = patent_columns[:, offset:offset + GI.n_combined_elements]
+                is_green |= GI.match_combined_elements(patent_elements)
+            greenness[name] = is_green
+        return pd.DataFrame(greenness, index=self.patlist)
+
+"""Function definitions"""
+
+def load_greenness_engine(classificationmatrix_filename, classlist_filename, patlist_filename):
+    """Function to create a GreennessEngine from saved classification matrix and node keys.
+        Arguments:
+            classificationmatrix_filename - string - npz file of the classification matrix
+            classlist_filename - string - pickle file of the classification codes
+            patlist_filename - string - pickle file of the patent IDs
+        Returns GreennessEngine"""
+    print("Reloading node keys")
+    with open(patlist_filename, "rb") as rfile:
+        patlist = pickle.load(rfile)
+    with open(classlist_filename, "rb") as rfile:
+        classlist = pickle.load(rfile)
+    print("Reloading matrix...")
+    classificationmatrix = scipy.sparse.load_npz(classificationmatrix_filename)
+    return GreennessEngine(classificationmatrix, classlist, patlist)
+
+""" main entry point """
+
+if __name__ == "__main__":
+    """Parse terminal arguments"""
+    parser = argparse.ArgumentParser(description="Greenness of patents for several pattern schemes in one pass.")
+    parser.add_argument("--matrix", default="patent_classification_matrix_level_subgroup.npz", \
+                                                            help="Classification matrix file (npz).")
+    parser.add_argument("--codes", default="patent_classification_codes_level_subgroup.pkl", \
+                                                            help="Classification codes file (pickle).")
+    parser.add_argument("--patents", default="patent_codes.pkl", help="Patent IDs file (pickle).")
+    parser.add_argument("--scheme", nargs=2, action="append", default=[], metavar=("NAME", "FILE"), \
+                                                            help="Additional scheme name and pattern file.")
+    parser.add_argument("--output", default="patent_greenness_all_schemes.pkl", help="Output data frame file.")
+    args = parser.parse_args()
+
+    GE = load_greenness_engine(args.matrix, args.codes, args.patents)
+    GE.register_scheme("envtech", "envtech_03.txt")
+    GE.register_scheme("IPCGI", "green_inventory_03.txt")
+    GE.register_Y02_schemes()
+    for name, patternsfile in args.scheme:
+        GE.register_scheme(name, patternsfile)
+    pddf = GE.compute_greenness()
+    print("Done. Saving.")
+    pddf.to_pickle(args.output)
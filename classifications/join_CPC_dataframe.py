@@ -1,21 +1,14 @@
 import numpy as np
 import pandas as pd
 import glob
-import pdb
+from dataframe_merge import concat_partial_dataframes
 
-def join_pandas(filenames, outputfile, zerofile):
-    pddf = pd.read_pickle(zerofile)
+def join_pandas(filenames, outputfile, zerofile, conflictfile):
+    dfs = [pd.read_pickle(zerofile)]
     for i, filename in enumerate(filenames):
-        print("parsing {0} of {1}".format(i+1, len(filenames)))
-        next_df = pd.read_pickle(filename)
-        pddf = pddf.append(next_df)
-        ndup = len(pddf.index.get_duplicates())
-        try:
-            assert ndup == 0, "duplicate entries found: {0}".format(ndup)
-        except:
-            print("duplicate entries found: {0}".format(ndup))
-            pdb.set_trace()
-            pass
+        print("reading {0} of {1}".format(i+1, len(filenames)))
+        dfs.append(pd.read_pickle(filename))
+    pddf, conflicts = concat_partial_dataframes(dfs, conflictfile)
     
     pddf.to_pickle(outputfile)
 
@@ -23,6 +16,6 @@ def join_pandas(filenames, outputfile, zerofile):
 filenames = glob.glob("patent_greenness_based_on_CPC*[0-9].pkl")
 outputFileName = "patent_greenness_based_on_CPC_all.pkl"
 zerofile = "patent_greenness_based_on_CPC.pkl"
+conflictFileName = "patent_greenness_based_on_CPC_conflicts.txt"
 
-join_pandas(filenames, outputFileName, zerofile)
-
+join_pandas(filenames, outputFileName, zerofile, conflictFileName)
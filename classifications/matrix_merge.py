@@ -0,0 +1,91 @@
+"""Functions to merge sparse classification matrix chunks (as saved by parse_CPC.py --parse --chunk i,
+   parse_IPC.py --parse --chunk i and parse_CPC_based_on_USPTO_gov_rawdata.py i) into one matrix.
+   The (row, column) triplets of all chunks are concatenated and deduplicated once, so merging costs
+   O(total nnz log total nnz) instead of adding the chunks one by one and summing the accumulated matrix
+   after every step. Consistency is checked by bookkeeping of the nonzero entries of every chunk.
+   ragged_slices gathers rows of ragged arrays (offsets and values, e.g. indptr and indices of a csr matrix) without
+   touching the other rows.
+"""
+
+"""inport modules"""
+import numpy as np
+import scipy
+import scipy.sparse
+
+"""Function definitions"""
+
+def merge_sparse_matrices(matrices, shape=None):
+    """Function to merge boolean sparse matrices of identical shape (logical or of all entries).
+        Arguments:
+            matrices - iterable of scipy.sparse matrices or of strings (npz file names) - the chunks
+            shape - tuple of int or None - expected shape of all chunks. Taken from first chunk if None.
+        Returns:
+            tuple of:
+                scipy.sparse csr matrix of bool - merged matrix
+                list of int - number of nonzero entries of each chunk"""
+    rows = []
+    cols = []
+    chunk_nnz = []
+    for i, matrix in enumerate(matrices):
+        if isinstance(matrix, str):
+            print("Loading chunk {0}: {1}".format(i, matrix))
+            matrix = scipy.sparse.load_npz(matrix)
+        matrix = scipy.sparse.coo_matrix(matrix)
+        if shape is None:
+            shape = matrix.shape
+        assert matrix.shape == shape, "Chunk {0} has shape {1}, expected {2}".format(i, matrix.shape, shape)
+        matrix.sum_duplicates()
+        nonzero = matrix.data != 0
+        rows.append(matrix.row[nonzero].astype(np.int64))
+        cols.append(matrix.col[nonzero].astype(np.int64))
+        chunk_nnz.append(int(nonzero.sum()))
+    assert shape is not None, "No chunks to merge"
+
+    """Deduplicate all entries at once"""
+    print("Merging {0} chunks with {1} entries".format(len(chunk_nnz), sum(chunk_nnz)))
+    keys = np.unique(np.concatenate(rows) * shape[1] + np.concatenate(cols)) if rows else np.zeros(0, np.int64)
+    del rows, cols
+    merged_rows = keys // shape[1]
+    merged_cols = keys % shape[1]
+
+    """Build csr matrix directly; keys are sorted by row and column"""
+    indptr = np.zeros(shape[0] + 1, dtype=np.int64)
+    np.cumsum(np.bincount(merged_rows, minlength=shape[0]), out=indptr[1:])
+    merged = scipy.sparse.csr_matrix((np.ones(len(keys), dtype=bool), merged_cols, indptr), shape=shape)
+
+    """Bookkeeping"""
+    check_merge(merged, chunk_nnz)
+    return merged, chunk_nnz
+
+def ragged_slices(offsets, values, rows):
+    """Function to gather the values of some rows of a ragged array (e.g. indptr and indices of a csr matrix).
+        Arguments:
+            offsets - numpy array of int64 - offsets of the ragged array
+            values - numpy array - values of the ragged array
+            rows - numpy array of int - rows to gather, in order
+        Returns:
+            tuple of:
+                numpy array of int64 - offsets of the gathered rows (len(rows) + 1)
+                numpy array - values of the gathered rows"""
+    starts = offsets[rows].astype(np.int64)
+    lengths = offsets[np.asarray(rows) + 1] - starts
+    new_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_offsets[1:])
+    positions = np.arange(new_offsets[-1], dtype=np.int64) + np.repeat(starts - new_offsets[:-1], lengths)
+    return new_offsets, values[positions]
+
+def check_merge(merged, chunk_nnz):
+    """Function to check the merged matrix against the nonzero counts of the chunks. The merged matrix must have
+       at least as many entries as the largest chunk and at most as many as all chunks together. Entries present
+       in more than one chunk are reported.
+        Arguments:
+            merged - scipy.sparse matrix - merged matrix
+            chunk_nnz - list of int - number of nonzero entries of each chunk
+        Returns None"""
+    total_nnz = sum(chunk_nnz)
+    assert max(chunk_nnz + [0]) <= merged.nnz <= total_nnz, \
+                        "Merged matrix has {0} entries, chunks have {1} (largest chunk {2})".format(merged.nnz, \
+                                                                                total_nnz, max(chunk_nnz + [0]))
+    if merged.nnz < total_nnz:
+        print("Warning: {0} entries were present in more than one chunk".format(total_nnz - merged.nnz))
+    print("Merged matrix: {0} entries from {1} chunks".format(merged.nnz, len(chunk_nnz)))
@@ -0,0 +1,90 @@
+"""Functions to store sparse classification matrices and their node keys (patent IDs, classification codes) as
+   raw numpy arrays that can be memory mapped.
+   A matrix is saved as a directory holding indptr.npy, indices.npy, data.npy, shape.npy and (optionally)
+   codes.npy. Reloading with mmap_mode="r" attaches the files read-only without copying them, so read-only
+   steps start in milliseconds and several processes working on the same matrices share the same pages.
+   Key lists (e.g. the patent IDs) are saved as fixed width string arrays (.npy) in the same way.
+   Matrices are saved in canonical csr format (sorted indices, no duplicates) as memory mapped arrays cannot be
+   modified in place. Files are written to a temporary file and then moved into place, so a store can be
+   overwritten while an older version of it is still mapped.
+"""
+
+"""inport modules"""
+import numpy as np
+import scipy
+import scipy.sparse
+import os
+
+"""Function definitions"""
+
+def save_matrix_store(dirname, matrix, codes=None):
+    """Function to save a sparse matrix (and the codes of its columns) as raw arrays.
+        Arguments:
+            dirname - string - directory name; created if it does not exist
+            matrix - scipy.sparse matrix - the matrix
+            codes - list or array of strings or None - column keys
+        Returns None"""
+    matrix = scipy.sparse.csr_matrix(matrix, copy=True)
+    matrix.sum_duplicates()
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    save_array(os.path.join(dirname, "indptr.npy"), matrix.indptr)
+    save_array(os.path.join(dirname, "indices.npy"), matrix.indices)
+    save_array(os.path.join(dirname, "data.npy"), matrix.data)
+    save_array(os.path.join(dirname, "shape.npy"), np.array(matrix.shape, dtype=np.int64))
+    if codes is not None:
+        save_key_array(os.path.join(dirname, "codes.npy"), codes)
+
+def load_matrix_store(dirname, mmap_mode="r"):
+    """Function to reload a sparse matrix saved with save_matrix_store().
+        Arguments:
+            dirname - string - directory name
+            mmap_mode - string or None - numpy memory map mode; "r" attaches read-only, None reads into memory
+        Returns:
+            tuple of:
+                scipy.sparse csr matrix - the matrix (sharing memory with the mapped files)
+                numpy array of strings or None - column keys"""
+    indptr = np.load(os.path.join(dirname, "indptr.npy"), mmap_mode=mmap_mode)
+    indices = np.load(os.path.join(dirname, "indices.npy"), mmap_mode=mmap_mode)
+    data = np.load(os.path.join(dirname, "data.npy"), mmap_mode=mmap_mode)
+    shape = tuple(np.load(os.path.join(dirname, "shape.npy")))
+    matrix = scipy.sparse.csr_matrix((data, indices, indptr), shape=shape, copy=False)
+    matrix.has_canonical_format = True
+    codes = None
+    if os.path.exists(os.path.join(dirname, "codes.npy")):
+        codes = load_key_array(os.path.join(dirname, "codes.npy"), mmap_mode=mmap_mode)
+    return matrix, codes
+
+def save_key_array(filename, keys):
+    """Function to save a list of keys (patent IDs or classification codes) as fixed width string array.
+        Arguments:
+            filename - string - npy file name
+            keys - list or array of strings - the keys
+        Returns None"""
+    save_array(filename, np.asarray(keys, dtype=str))
+
+def load_key_array(filename, mmap_mode="r"):
+    """Function to reload a key array saved with save_key_array().
+        Arguments:
+            filename - string - npy file name
+            mmap_mode - string or None - numpy memory map mode
+        Returns numpy array of strings"""
+    return np.load(filename, mmap_mode=mmap_mode)
+
+def save_array(filename, array):
+    """Function to save an array as npy file. Writes to a temporary file first and replaces the file afterwards.
+        Arguments:
+            filename - string - npy file name
+            array - numpy array - the array
+        Returns None"""
+    with open(filename + ".tmp", "wb") as wfile:
+        np.save(wfile, array)
+    os.replace(filename + ".tmp", filename)
+
+def matrix_store_exists(dirname):
+    """Function to check if a complete matrix store exists.
+        Arguments:
+            dirname - string - directory name
+        Returns bool"""
+    return all(os.path.exists(os.path.join(dirname, name)) for name in ["indptr.npy", "indices.npy", "data.npy", \
+                                                                                                    "shape.npy"])
@@ -2,18 +2,19 @@ import numpy as np
 import pandas as pd
 import scipy.sparse
 import pickle
-import pdb
+from greenness_engine import GreennessEngine
 
-
-def obtain_Y02_greenness(df_save_filename, patlist_filename, classificationmatrix_filename, classlist_filename=None):
+def obtain_Y02_greenness(df_save_filename, patlist_filename, classificationmatrix_filename, classlist_filename=None, \
+                                                                                                    prefixes=None):
     """Function to check for Y02 codes and save dataframe identifying green patents based on Y codes
         Arguments:
             df_save_filename (str)  - Filename under which to save the Y codes dataframe
             patlist_filename (str)  - Name of the file to read patent IDs from
             classificationmatrix_filename (str) - Name of the file to read classification matrix from
             classlist_filename (str or None)    - Name of file to read classification codes from
+            prefixes (dict or None) - Output columns and code prefixes. greenness_engine.Y02_SCHEMES if None.
+                                      Subfamilies (Y02A, ...) require a matrix of 4 character codes or finer.
         Returns None"""
-    
     """Read classification matrix"""
     print("Reloading node keys")
     with open(patlist_filename, "rb") as rfile:
@@ -35,26 +36,16 @@ def obtain_Y02_greenness(df_save_filename, patlist_filename, classificationmatri
     #    patlist, classlist, classlist_coarse = pickle.load(rfile)
     """This is the one handled and saved in parse_CPC_USPTO_gov_based.py as classificationmatrix_coarse."""
     #classificationmatrix = (scipy.sparse.load_npz("../CPCs/patent_classification_matrix_all.npz")).todok()     
-    classificationmatrix = (scipy.sparse.load_npz(classificationmatrix_filename)).todok()     
-    
-    y02codes = [cc for cc in classlist_coarse if cc[0:3] == "Y02"]
-    y02code_idxs = [i for i, cc in enumerate(classlist_coarse) if cc[0:3]=="Y02"]
-    
-    if len(y02code_idxs) > 0:
-        """sum over these columns"""
-        b = np.zeros((1, classificationmatrix.shape[1]), 'int8')
-        b[:, y02code_idxs] = 1
-        y02codes_green = (classificationmatrix * np.transpose(b)).flatten()
-    else:
-        y02codes_green = np.zeros(len(patlist), 'int8')
-            
-    y02codes_green = (y02codes_green > 0)
+    classificationmatrix = (scipy.sparse.load_npz(classificationmatrix_filename)).tocsr()
     
-    """Compile df"""
-    dfdict = {'PatID': patlist, 'Y_Codes': y02codes_green}
-    pddf = pd.DataFrame(dfdict).set_index('PatID')
+    """Flags of all Y02 schemes in one product (see greenness_engine.py)"""
+    GE = GreennessEngine(classificationmatrix, classlist_coarse, patlist)
+    GE.register_Y02_schemes(prefixes)
+    pddf = GE.compute_greenness()
+    pddf.index.name = 'PatID'
+    print("Patents with codes by prefix family:")
+    print(pddf.sum())
     
-    pdb.set_trace()
     """save"""
     #pddf.to_pickle("patent_greenness_based_on_CPC_Y_classes_USPTO.pkl")
     pddf.to_pickle(df_save_filename)
@@ -67,5 +58,5 @@ if __name__ == "__main__":
                          classlist_filename = None)
     obtain_Y02_greenness(df_save_filename = "patent_greenness_based_on_CPC_Y_classes_patstat.pkl",
                          patlist_filename = "../CPC/patent_codes.pkl",
-                         classificationmatrix_filename = "../CPC/patent_classification_matrix_level_subsection.npz",
-                         classlist_filename = "../CPC/patent_classification_codes_level_subsection.pkl")                         
+                         classificationmatrix_filename = "../CPC/patent_classification_matrix_level_group.npz",
+                         classlist_filename = "../CPC/patent_classification_codes_level_group.pkl")                         
@@ -9,9 +9,11 @@
         class and subclass only, disregarding group and subgroup) as npz file
     - the detailed classification bipartite network (patents vs. unique classification codes) 
         as npz file.
-   The script defines two classes:
-    - GreenInventory as search pattern class.
-    - GreenRecord as record class
+    - the hierarchical table of all classification codes with parent pointers (see code_hierarchy.py)
+        as npz file.
+    - the canonical int64 keys of the patents (rows of the matrices, see patent_ids.py) as npy file.
+   The script defines the class ClassificationAndGreennessRecord as record class. The search pattern class
+   GreenInventory is imported from green_inventory.py.
 
 How to run:
 
@@ -27,6 +29,11 @@ python3 parse_CPC.py --parse --chunk i # for i in 0-19 in parallel in different
 python3 parse_CPC.py --loadchunks
 python3 parse_CPC.py --greenness
 
+To update parsed matrices and greenness with a reissued classification file (only patents in the file are
+changed; greenness is recomputed for patents with changed codes):
+
+python3 parse_CPC.py --update cpc_current_new.tsv
+
 NOTE: 
 A problem with this: the patentsview file has only 6.25M patents. The other CPC records at USPTO on
 https://bulkdata.uspto.gov/data/patent/classification/cpc/ have almost 10M. Maybe we should use these 
@@ -52,77 +59,17 @@ import time
 import os.path
 import subprocess
 import argparse
+import csv
+from green_inventory import GreenInventory
+from greenness_engine import GreennessEngine
+from matrix_merge import merge_sparse_matrices, ragged_slices
+from dataframe_merge import concat_partial_dataframes
+from code_hierarchy import build_code_hierarchy
+from matrix_store import save_matrix_store, load_matrix_store, save_key_array, load_key_array, save_array, \
+                                                                                            matrix_store_exists
+from patent_ids import encode_patent_ids
 
 """Class definitions"""
-"""Green patents search pattern class. Can parse and apply OECD ENvtech and CPC green inventory 
-   patterns"""
-class GreenInventory:
-    def __init__(self, patternsfile):
-        """Constructor. Recods patternfile and calls method to read pattern
-            Arguments:
-                patternfile - string - path to pattern file
-            Returns: Class instance"""
-        self.name = patternsfile
-        self.read_search_patterns(patternsfile)
-        self.strip_space_from_search_patterns()
-        
-    def strip_space_from_search_patterns(self):
-        """Method to strip space from between group ID and subgroup ID as CPC does not use that.
-            Arguments: None
-            Returns: None."""
-        for i, pattern in enumerate(self.single_patterns):
-            self.single_patterns[i] = pattern.replace(" ", "")
-        
-    def read_search_patterns(self, patternsfile):
-        """Method to read search patterns from file
-            Arguments:
-                patternfile - string - path to pattern file
-            Returns: None"""
-            
-        """Prepare record variables"""
-        self.single_patterns = []
-        self.combined_patterns = []
-        
-        """Parse file"""
-        for line in line_generator_from_file(patternsfile):
-            if line[0]=="[":                        #find conditional patterns
-                elements = line[1:].split("]")[0].split(" and ")
-                self.combined_patterns.append(elements)
-            elif "-" in line:                       #find wildcard patterns
-                """Identify start and endpoint of range"""
-                line, endnum = line.split("-")
-                if "/" in line:
-                    startnum_idx = len(line) - line[::-1].index("/")
-                else:
-                    startnum_idx = len(line) - line[::-1].index(" ")
-                line, startnum = line[:startnum_idx], line[startnum_idx:]
-                """Build numeric range and corresponding classification codes"""
-                allnum = list(range(int(startnum), int(endnum)+1))
-                allendings = [str(x) for x in allnum]
-                """Record patterns"""
-                for ending in allendings:
-                    while len(ending) < len(startnum):
-                        ending = "0" + ending
-                    self.single_patterns.append(line + ending)
-            else:                                   #find simple patterns
-                self.single_patterns.append(line)
-    
-    def filter_matching(self, class_strings):
-        """Method to filter all strings in a list that are matched by the green inventory.
-            Arguments:
-                class_strings - list of strings - classification codes
-            Returns: list of int - indices of matched strings"""
-        filtered = []
-        for i, cs in enumerate(class_strings):
-            if any(st in cs for st in self.single_patterns):
-                filtered.append(i)
-            #    if "H01" in cs:
-            #        print(cs)
-            #else:
-            #    if "H01" in cs:
-            #        print(cs, " NOT PRESENT")
-        return np.array(filtered)
-
 """Green patents record class. Can parse classification files, apply search patterns and save records"""
 class ClassificationAndGreennessRecord():
     def __init__(self, setup=False, loadchunks=False, chunk_idx=None):
@@ -142,6 +89,11 @@ class ClassificationAndGreennessRecord():
         self.patlist = None
         self.classlist = {}
         self.classificationmatrix = {}
+        self.readonly = False                                   # matrices are memory mapped read-only
+        self.changed_greenness = True                           # data frame, node lists and matrices to be written by save()
+        self.changed_patlist = True
+        self.changed_classlists = set(self.levels_list)
+        self.changed_matrices = set(self.levels_list)
         self.pddf = pd.DataFrame(columns=['envtech', 'IPCGI'])  #greenness data frame. Will be overwritten when created.
         """Prepare search patterns"""
         #print("Preparing search patterns")
@@ -209,37 +161,94 @@ class ClassificationAndGreennessRecord():
                 start - int - Index of first to be parsed
                 stop - int - 1 + Index of last line to be parsed 
             Returns: None"""
-        """Obtain 3 lists of Envtech matrix columns"""
-        """Single code"""
-        col_array_Envtech_single = self.GIenvtech.filter_matching(self.classlist['subgroup'])
-        green_Envtech_single = self.classification_matrix_sum_by_indices(col_array_Envtech_single, level='subgroup')
+        """Evaluate both schemes in one pass over the rows start to stop of the subgroup level matrix"""
+        GE = GreennessEngine(scipy.sparse.csr_matrix(self.classificationmatrix['subgroup'])[start:stop], \
+                                                                self.classlist['subgroup'], self.patlist[start:stop])
+        GE.register_inventory('envtech', self.GIenvtech)
+        GE.register_inventory('IPCGI', self.GI_CPC)
+        greenness = GE.compute_greenness()
         
-        """Combined codes E03 and ..."""
-        pseudoGIenvtech = GreenInventory("pseudo_envtech_conditional_complement_E03.txt")
-        pseudoGIenvtech_E03 = GreenInventory("pseudo_envtech_conditional_E03.txt")
-        col_array_Envtech_E03_complement = pseudoGIenvtech.filter_matching(self.classlist['subgroup'])
-        col_array_Envtech_E03 = pseudoGIenvtech_E03.filter_matching(self.classlist['subgroup'])
-        green_Envtech_E03_complement = self.classification_matrix_sum_by_indices(col_array_Envtech_E03_complement, \
-                                                                                                    level='subgroup')
-        green_Envtech_E03 = self.classification_matrix_sum_by_indices(col_array_Envtech_E03, level='subgroup')
+        """Enter results in self.pddf data frame"""
+        self.pddf = pd.concat([self.pddf[~self.pddf.index.isin(greenness.index)], greenness])
         
-        """Perform computation to combine the 3 lists"""
-        green_Envtech = green_Envtech_E03 * green_Envtech_E03_complement + green_Envtech_single
-        green_Envtech = (green_Envtech>0)
+    def update(self, classificationfile):
+        """Method to update the matrices, node lists and greenness data frame with a new (e.g. reissued)
+           classification file without rebuilding them. The classification codes of all patents in the file are
+           replaced by those in the file; patents not in the file are not changed. New patents and codes are
+           appended to the node lists. The csr matrices are spliced: the index slices of untouched rows are kept
+           and only the rows of patents in the file are built, so the work besides copying the kept slices is
+           proportional to the size of the file. Greenness is recomputed only for patents whose codes changed.
+           Only changed node lists and matrices are saved afterwards.
+            Arguments:
+                classificationfile - string - path to the classification file (same format as cpc_current.tsv)
+            Returns None"""
+        table = read_CPC_table(classificationfile)
+        print("Updating from {0}: {1} lines".format(classificationfile, len(table)))
         
-        """Obtain 1 list of IPCGI matrix columns"""
-        col_array_IPCGI = self.GI_CPC.filter_matching(self.classlist['subgroup'])
-        green_IPCGI = self.classification_matrix_sum_by_indices(col_array_IPCGI, level='subgroup')
-        green_IPCGI = (green_IPCGI>0)
+        """Patent indices; append new patents"""
+        n_old_patents = len(self.patlist)
+        pat_codes, pat_uniques = pd.factorize(table['patent_id'])
+        pat_uniques_idx = pd.Index(self.patlist).get_indexer(pat_uniques)
+        is_new = pat_uniques_idx < 0
+        pat_uniques_idx[is_new] = n_old_patents + np.arange(is_new.sum())
+        if is_new.any():
+            self.patlist = np.asarray(self.patlist).tolist() + pat_uniques[is_new].tolist()
+        rows = pat_uniques_idx[pat_codes]
+        touched_rows = np.sort(pat_uniques_idx)
+        changed_rows = [pat_uniques_idx[is_new]]
+        self.changed_patlist = bool(is_new.any())
+        self.changed_classlists = set()
+        self.changed_matrices = set()
+        print("{0} patents in file, {1} new".format(len(pat_uniques), is_new.sum()))
         
-        """Enter results in self.pddf data frame"""
-        assert len(green_Envtech) == len(green_IPCGI) == len(self.patlist)
-        for pat_idx, patID in enumerate(self.patlist):
-            if start <= pat_idx < stop:
-                print("\rCheck greenness {0:10d}".format(pat_idx), end="")
-                self.pddf.loc[patID] = [green_Envtech[pat_idx], green_IPCGI[pat_idx]]
-        print("")
+        for level in self.levels_list:
+            """Code indices; append new codes"""
+            class_codes, class_uniques = pd.factorize(table[level])
+            class_uniques_idx = pd.Index(self.classlist[level]).get_indexer(class_uniques)
+            is_new_code = class_uniques_idx < 0
+            class_uniques_idx[is_new_code] = len(self.classlist[level]) + np.arange(is_new_code.sum())
+            if is_new_code.any():
+                self.classlist[level] = np.concatenate([np.asarray(self.classlist[level]), \
+                                                                np.asarray(class_uniques[is_new_code], dtype=str)])
+                self.changed_classlists.add(level)
+            n_codes = len(self.classlist[level])
+            
+            """Rows of patents in the file, sorted by row and code"""
+            new_keys = np.unique(rows.astype(np.int64) * n_codes + class_uniques_idx[class_codes])
+            new_indptr = np.searchsorted(new_keys, touched_rows.astype(np.int64) * n_codes)
+            new_indptr = np.append(new_indptr, len(new_keys))
+            new_indices = new_keys % n_codes
+            
+            """Compare with the current rows of these patents"""
+            matrix = scipy.sparse.csr_matrix(self.classificationmatrix[level])
+            old_rows = touched_rows[touched_rows < n_old_patents]
+            old_indptr, old_indices = ragged_slices(matrix.indptr, matrix.indices, old_rows)
+            old_keys = np.unique(np.repeat(old_rows.astype(np.int64), np.diff(old_indptr)) * n_codes + old_indices)
+            level_changed = np.unique(np.setxor1d(old_keys, new_keys[:new_indptr[len(old_rows)]], \
+                                                                                    assume_unique=True) // n_codes)
+            changed_rows.append(level_changed)
+            
+            """Splice the new rows into the matrix"""
+            if len(level_changed) > 0 or is_new.any() or is_new_code.any():
+                self.classificationmatrix[level] = splice_csr_rows(matrix, touched_rows, new_indptr, new_indices, \
+                                                                                    (len(self.patlist), n_codes))
+                self.changed_matrices.add(level)
+            print("Level {0:10s}: {1} new codes, {2} changed rows, {3} entries".format(level, is_new_code.sum(), \
+                                                        len(level_changed), self.classificationmatrix[level].nnz))
+        self.readonly = False
         
+        """Recompute greenness of changed patents"""
+        changed_idx = np.unique(np.concatenate(changed_rows))
+        print("Recomputing greenness for {} patents".format(len(changed_idx)))
+        self.changed_greenness = len(changed_idx) > 0
+        if len(changed_idx) > 0:
+            GE = GreennessEngine(self.classificationmatrix['subgroup'][changed_idx], self.classlist['subgroup'], \
+                                                                        [self.patlist[i] for i in changed_idx])
+            GE.register_inventory('envtech', self.GIenvtech)
+            GE.register_inventory('IPCGI', self.GI_CPC)
+            greenness = GE.compute_greenness()
+            self.pddf = pd.concat([self.pddf[~self.pddf.index.isin(greenness.index)], greenness])
+
     def classification_matrix_sum_by_indices(self, col_array, level='subgroup'):
         """Method for summing columns by indices in the classificationmatrices.
             Arguments: 
@@ -306,17 +315,10 @@ class ClassificationAndGreennessRecord():
                 print("Warning: Lines duplicated {}-{}".format(partial_df_files[i]["start"] - 1, \
                                                         partial_df_files[i-1]["stop"]))
         assert all_good, "Error: lines missing."
-        for pdfile in partial_df_files:
-            df = pd.read_pickle(pdfile["filename"])
-            overlapping_indices = self.pddf.index.intersection(df.index)
-            if len(overlapping_indices) > 0:
-                print("Overlapping patent keys found: {}".format(len(overlapping_indices)))
-                for idx in overlapping_indices:
-                    assert (self.pddf.loc[idx] == df.loc[idx]).all(), "Error: Mismatched entries for {}".format(idx)
-                self.pddf = pd.concat([self.pddf, df])
-                self.pddf = self.pddf[~self.pddf.index.duplicated()]
-            else:
-                self.pddf = pd.concat([self.pddf, df])
+        dfs = [self.pddf] + [pd.read_pickle(pdfile["filename"]) for pdfile in partial_df_files]
+        conflict_filename = "patent_greenness_based_on_CPC_conflicts.txt"
+        self.pddf, conflicts = concat_partial_dataframes(dfs, conflict_filename)
+        assert len(conflicts) == 0, "Error: Mismatched entries, see {}".format(conflict_filename)
         self.pddf.to_pickle("patent_greenness_based_on_CPC.pkl")
 
     def save(self):
@@ -324,7 +326,11 @@ class ClassificationAndGreennessRecord():
             No Arguments
             Returns None"""
         """Save data frame"""
-        self.pddf.to_pickle("patent_greenness_based_on_CPC.pkl")
+        if self.changed_greenness:
+            self.pddf.to_pickle("patent_greenness_based_on_CPC.pkl")
+        if self.readonly:
+            """Matrices are unchanged (and mapped from the files)"""
+            return
         
         """save classification matrices"""
         if self.chunk_idx is not None:
@@ -335,27 +341,51 @@ class ClassificationAndGreennessRecord():
                                                                             for level in self.levels_list}
             classlist_save_names = {level: "patent_classification_codes_level_" + str(level) + ".pkl" \
                                                                             for level in self.levels_list}
+            matrix_store_names = {level: "patent_classification_matrix_level_" + str(level) + "_store" \
+                                                                            for level in self.levels_list}
             patentID_save_name = "patent_codes.pkl"
-            print("Saving node keys")
-            with open(patentID_save_name, "wb") as wfile:
-                pickle.dump(self.patlist, wfile, protocol=pickle.HIGHEST_PROTOCOL)
-            for level in self.levels_list:
+            if self.changed_patlist:
+                print("Saving node keys")
+                with open(patentID_save_name, "wb") as wfile:
+                    pickle.dump(self.patlist, wfile, protocol=pickle.HIGHEST_PROTOCOL)
+                save_key_array("patent_codes.npy", self.patlist)
+                save_array("patent_keys.npy", encode_patent_ids(self.patlist, errors="coerce"))
+            for level in self.changed_classlists:
                 with open(classlist_save_names[level], "wb") as wfile:
                     pickle.dump(self.classlist[level], wfile, protocol=pickle.HIGHEST_PROTOCOL)
-        for level in self.levels_list:
+            if 'subgroup' in self.changed_classlists:
+                print("Saving code hierarchy")
+                build_code_hierarchy(self.classlist['subgroup']).save("patent_classification_code_hierarchy.npz")
+        for level in [level for level in self.levels_list if level in self.changed_matrices]:
             print("Transforming matrix")
             save_mtx = self.classificationmatrix[level].tocsr()
             print("Matrix transformed. Saving...")
             scipy.sparse.save_npz(matrix_save_names[level], save_mtx)
+            if self.chunk_idx is None:
+                save_matrix_store(matrix_store_names[level], save_mtx, self.classlist[level])
             print("Matrix saved.")
     
-    def reload(self):
+    def reload(self, readonly=False):
         """Method to reload the initial data frame, matrixes and node lists.
-            No Arguments
+            Arguments:
+                readonly - bool - Attach memory mapped matrices and node lists (if saved) instead of loading
+                                  modifiable copies. Use for steps that do not change the matrices.
             Returns None"""
         """Read data frame"""
         self.pddf = pd.read_pickle("patent_greenness_based_on_CPC.pkl")
         
+        """Attach read-only matrices"""
+        matrix_store_names = {level: "patent_classification_matrix_level_" + str(level) + "_store" \
+                                                                                for level in self.levels_list}
+        if readonly and os.path.exists("patent_codes.npy") and \
+                                all(matrix_store_exists(matrix_store_names[level]) for level in self.levels_list):
+            print("Attaching memory mapped node keys and matrices")
+            self.patlist = load_key_array("patent_codes.npy")
+            for level in self.levels_list:
+                self.classificationmatrix[level], self.classlist[level] = load_matrix_store(matrix_store_names[level])
+            self.readonly = True
+            return
+        
         """Read classification matrices"""
         matrix_save_names = {level: "patent_classification_matrix_level_" + str(level) + ".npz" \
                                                                                 for level in self.levels_list}
@@ -435,19 +465,11 @@ class ClassificationAndGreennessRecord():
             for i in range(len(filenames[level])):
                 assert os.path.exists(filenames[level][i]), "File not found: {}".format(filenames[level][i])
         
-        """Load and add one by one."""
+        """Merge chunks (and the reloaded matrix) in one pass"""
         for level in self.levels_list:
-            for i, filename in enumerate(filenames[level]):
-                print("Level {2:10s}; parsing {0} of {1}".format(i, len(filenames[level]), level))
-                pcm = scipy.sparse.load_npz(filename)
-                expected_sum = np.sum(self.classificationmatrix[level]) + np.sum(pcm)
-                self.classificationmatrix[level] = self.classificationmatrix[level] + pcm
-                try:
-                    assert expected_sum == np.sum(self.classificationmatrix[level]), \
-                                    "expected sum does not match actual sum: {0} != {1}".format(expected_sum, 
-                                                                    np.sum(self.classificationmatrix[level]))
-                except:
-                    pass
+            print("Level {0:10s}; merging {1} chunks".format(level, len(filenames[level])))
+            self.classificationmatrix[level], _ = merge_sparse_matrices([self.classificationmatrix[level]] + \
+                                                                                            filenames[level])
 
 """Function definitions"""
 
@@ -463,6 +485,53 @@ def line_generator_from_file(filename):
                 line = line.replace("\n", "")
                 yield line
 
+def read_CPC_table(filename):
+    """Function to read a classification file (cpc_current.tsv format) into a data frame in one go. Skips the
+       same lines as line_generator_from_file().
+        Arguments:
+            filename - string - file name
+        Returns pandas DataFrame with columns patent_id, section, subsection, group, subgroup (strings)"""
+    table = pd.read_csv(filename, sep="\t", header=None, usecols=range(6), dtype=str, quoting=csv.QUOTE_NONE, \
+                                                                            keep_default_na=False, na_filter=False)
+    skip = table[0].str.startswith("#") | ((table[0] == "uuid") & (table[1] == "patent_id"))
+    table = table[~skip.to_numpy()].iloc[:, 1:6]
+    table.columns = ['patent_id', 'section', 'subsection', 'group', 'subgroup']
+    return table.reset_index(drop=True)
+
+def splice_csr_rows(matrix, rows, row_indptr, row_indices, shape):
+    """Function to replace rows of a csr matrix without rebuilding it. The index slices of the other rows are kept
+       as they are and the new rows are inserted at their row boundaries. Rows beyond the rows of the matrix are
+       appended; the matrix may also get more columns.
+        Arguments:
+            matrix - scipy.sparse csr matrix - the matrix (not changed)
+            rows - numpy array of int - sorted unique indices of the rows to replace; all rows from matrix.shape[0]
+                                        to shape[0] - 1 must be included
+            row_indptr - numpy array of int - index pointer of the new rows (len(rows) + 1)
+            row_indices - numpy array of int - column indices of the new rows, sorted within rows
+            shape - tuple of int - shape of the resulting matrix
+        Returns scipy.sparse csr matrix of bool"""
+    old_rows = rows[rows < matrix.shape[0]]
+    """Slices of untouched rows between the replaced rows, and the new rows"""
+    bounds = np.empty(2 * len(old_rows), dtype=np.int64)
+    bounds[0::2] = matrix.indptr[old_rows]
+    bounds[1::2] = matrix.indptr[old_rows + 1]
+    kept = np.split(matrix.indices, bounds)[0::2]
+    new = np.split(row_indices, row_indptr[1:-1])
+    pieces = [kept[0]]
+    for i in range(len(old_rows)):
+        pieces += [new[i], kept[i + 1]]
+    pieces += new[len(old_rows):]
+    """Row lengths"""
+    lengths = np.zeros(shape[0], dtype=np.int64)
+    lengths[:matrix.shape[0]] = np.diff(matrix.indptr)
+    lengths[rows] = np.diff(row_indptr)
+    nnz = lengths.sum()
+    index_dtype = np.int32 if max(nnz, shape[1]) < np.iinfo(np.int32).max else np.int64
+    indptr = np.zeros(shape[0] + 1, dtype=index_dtype)
+    np.cumsum(lengths, out=indptr[1:])
+    indices = np.concatenate(pieces).astype(index_dtype, copy=False)
+    return scipy.sparse.csr_matrix((np.ones(nnz, dtype=bool), indices, indptr), shape=shape)
+
 def splitCPCfile():
     """Function for splitting the input class file into 20 chunks to be parsed subsequently.
        Determines the appropriate file length using UNIX 'wc -l' via python subprocess. Then creates the files
@@ -506,6 +575,10 @@ if __name__ == "__main__":
         python3 parse_CPC.py --greennesslines i j # for each range of patents indices i-j (should be 6.25M in total)
         python3 parse_CPC.py --combinegreennessdataframes
     
+    update of parsed matrices and greenness with a reissued classification file:
+    
+        python3 parse_CPC.py --update cpc_current_new.tsv
+    
     """, formatter_class=argparse.RawDescriptionHelpFormatter)
     parser.add_argument("--setup", action="store_true", help="Do the initial setup of matrices, data structures.")
     parser.add_argument("--parse", action="store_true", help="Parse classifications.")
@@ -517,6 +590,7 @@ if __name__ == "__main__":
     parser.add_argument("--loadchunks", action="store_true", help="Load and combine chunks after parsing by chunk.")
     parser.add_argument("--greennesslines", nargs=2, type=int, help="Check for greenness between line X and line Y " \
                                                                     "only and save partial data frame.")
+    parser.add_argument("--update", help="Update matrices and greenness with new classification file.")
     parser.add_argument("--combineDF", action="store_true", help="Load and combine partial greenness data frames " \
                                                                     "after checking by line ranges.")
     
@@ -549,9 +623,14 @@ if __name__ == "__main__":
         GR = ClassificationAndGreennessRecord(setup=False, loadchunks=False, chunk_idx=args.chunk)
     else:
         GR = ClassificationAndGreennessRecord(setup=False, loadchunks=False, chunk_idx=None)
-    if args.setup or args.parse or args.loadchunks or args.greenness or args.greennesslines:
-        GR.reload()
+    if args.setup or args.parse or args.loadchunks or args.greenness or args.greennesslines or args.update:
+        GR.reload(readonly=not (args.setup or args.parse or args.loadchunks))
         print("Setup is done.")
+    if args.update:
+        print("Running update ...")
+        GR.update(args.update)
+        print("Done. Saving.")
+        GR.save()
     if args.parse:
         print("Running parse. Chunk ", end="")
         if args.chunk is not None:
@@ -9,9 +9,9 @@
         class and subclass only, disregarding group and subgroup) as npz file
     - the detailed classification bipartite network (patents vs. unique classification codes) 
         as npz file.
-   The script defines two classes:
-    - GreenInventory as search pattern class.
-    - GreenRecord as record class
+    - the canonical int64 keys of the patents (rows of the matrices, see patent_ids.py) as npy file.
+   The script defines the class GreennessRecord as record class. The search pattern class GreenInventory is
+   imported from green_inventory.py.
 
 The script is intended to be run in 10 different instances in different shells after an initial
 setup of the matrices and dataframe. First do the setup:
@@ -38,82 +38,13 @@ import pandas as pd
 import glob
 import pdb
 import sys
+from green_inventory import GreenInventory
+from matrix_merge import merge_sparse_matrices
+from matrix_store import save_array
+from patent_ids import encode_patent_ids
 
 
 """Class definitions"""
-"""Green patents search pattern class. Can parse and apply OECD ENvtech and IPC green inventory 
-   patterns"""
-class GreenInventory:
-    def __init__(self, patternsfile):
-        """Constructor. Recods patternfile and calls method to read pattern
-            Arguments:
-                patternfile - string - path to pattern file
-            Returns: Class instance"""
-        self.name = patternsfile
-        self.read_search_patterns(patternsfile)
-        
-    def read_search_patterns(self, patternsfile):
-        """Method to read search patterns from file
-            Arguments:
-                patternfile - string - path to pattern file
-            Returns: None"""
-            
-        """Prepare record variables"""
-        self.single_patterns = []
-        self.combined_patterns = []
-        
-        """Parse file"""
-        for line in line_generator_from_file(patternsfile):
-            if line[0]=="[":                        #find conditional patterns
-                elements = line[1:].split("]")[0].split(" and ")
-                self.combined_patterns.append(elements)
-            elif "-" in line:                       #find wildcard patterns
-                """Identify start and endpoint of range"""
-                line, endnum = line.split("-")
-                if "/" in line:
-                    startnum_idx = len(line) - line[::-1].index("/")
-                else:
-                    startnum_idx = len(line) - line[::-1].index(" ")
-                line, startnum = line[:startnum_idx], line[startnum_idx:]
-                """Build numeric range and corresponding classification codes"""
-                allnum = list(range(int(startnum), int(endnum)+1))
-                allendings = [str(x) for x in allnum]
-                """Record patterns"""
-                for ending in allendings:
-                    while len(ending) < len(startnum):
-                        ending = "0" + ending
-                    self.single_patterns.append(line + ending)
-            else:                                   #find simple patterns
-                self.single_patterns.append(line)
-    
-    def match_combined(self, class_strings):
-        """Method to check if a list of class strings matches a green technology as defined
-           in combined strings that all have to match.
-            Arguments:
-                class_strings - list of strings - list of classification codes
-            Returns: bool - patent is a green technology"""
-        
-        """For each pattern cp, if every element is found, return True"""
-        for cp in self.combined_patterns:
-            cp_found = True
-            for pattern_element in cp:
-                if not any(pattern_element in st for st in class_strings):
-                    cp_found = False
-            if cp_found:
-                return True
-        """If none of the patterns matched, return False"""
-        return False
-            
-    def match_single(self, class_string):
-        """Method to check if a class string matches a green technology as defined as single string.
-            Arguments:
-                class_string - string - classification code
-            Returns: bool - patent is a green technology"""
-        if any(st in class_string for st in self.single_patterns):
-            return True
-        else:
-            return False
-
 """Green patents record class. Can parse classification files, apply search patterns and save records"""
 class GreennessRecord():
     def __init__(self, chunk_idx = None):
@@ -159,92 +90,93 @@ class GreennessRecord():
         self.pddf = pd.DataFrame(columns=['envtech', 'IPCGI'])  #greenness data frame
         print("All set up.")
         
-    def finalize_greenness_record(self, patID, is_green_ENVTECH, is_green_IPCGI, class_strings):
-        """Method to affect final checks on green pattern matching (with combined patterns of several
-           classification strings) and to record the result in data frame.
+    def match_records(self, GI, classes, record_idx, class_idx, n_records):
+        """Method to check greenness of all patent records of a classification file at once. Single patterns are
+           checked once per unique code, combined patterns on the records x codes incidence matrix.
             Arguments:
-                patID - string - patent ID
-                is_green_ENVTECH - bool - OECD envtech green patterns found so far
-                is_green_IPCGI - bool - IPC green inventory patterns found so far
-                class_strings - list of strings - list of classification codes.
-            Returns None"""
-        
-        """Check combined patterns"""
-        if len(class_strings) > 1: 
-            if not is_green_ENVTECH:
-                is_green_ENVTECH = self.GIenvtech.match_combined(class_strings)
-            if not is_green_IPCGI:
-                is_green_IPCGI = self.GI_IPC.match_combined(class_strings)
-        """Record greenness in data frame"""
-        self.pddf.loc[patID] = [is_green_ENVTECH, is_green_IPCGI]
-        
+                GI - GreenInventory - search patterns
+                classes - numpy array of strings - unique classification codes of the file
+                record_idx - numpy array of int - record index of each line
+                class_idx - numpy array of int - index in classes of the code of each line
+                n_records - int - number of records
+            Returns: numpy array of bool - record is a green technology"""
+        code_is_green = np.array([GI.match_single(cs) for cs in classes], dtype=bool)
+        is_green = np.bincount(record_idx, weights=code_is_green[class_idx], minlength=n_records) > 0
+        record_matrix = scipy.sparse.csr_matrix((np.ones(len(record_idx), dtype=np.int32), (record_idx, class_idx)), \
+                                                                                shape=(n_records, len(classes)))
+        return is_green | GI.match_combined_matrix(record_matrix, classes)
+
     def search_file(self, classificationfile):
         """Method to parse one classification file. Will identify all patent classification codes for
            each patent, check greenness, record greenness and update the classification networks.
             Arguments:
                 classificationfile - string - path to classification file
             Returns None"""
-
-        """prepare variables"""
-        class_strings = []
-        is_green_ENVTECH = False
-        is_green_IPCGI = False    
+        MCF = read_MCF_file(classificationfile)
+        if len(MCF["record_idx"]) == 0:
+            return
+        n_records = MCF["record_idx"][-1] + 1
         
-        """cycle through lines of classification file"""
-        first_record = True
-        n = 0
-        print("Parsing line: ")
-        for line in line_generator_from_file(classificationfile):
-            n += 1
-            print("{0:4d}".format(n), end="\r")
-            """read class codes"""
-            classID = line[18:33].strip()
-            classID_coarse = line[18:22]
-            primary_ID = True if line[41]=="F" else False
-            
-            """record and reset if records for the previous patent are concluded"""
-            if primary_ID == True and first_record == False:      # end records for single patent
-                self.finalize_greenness_record(patID, is_green_ENVTECH, is_green_IPCGI, class_strings)
-                is_green_ENVTECH = False
-                is_green_IPCGI = False    
-                class_strings = []
-            
-            """Set first_record to false so that subsequent ends of patent records can be sucessfully recognized"""
-            first_record = False
-
-            """read new patent ID. (Up to the record and reset step, the previous patentID must be in memory.)"""
-            patID = line[10:18]
-            
-            """update greenness"""
-            class_strings.append(classID)
-            if not is_green_ENVTECH:
-                is_green_ENVTECH = self.GIenvtech.match_single(classID)
-            if not is_green_IPCGI:
-                is_green_IPCGI = self.GI_IPC.match_single(classID)
-            
-            """update matrices"""
-            pat_idx = self.patlist.index(patID)
-            class_idx = self.classlist.index(classID)
-            class_coarse_idx = self.classlist_coarse.index(classID_coarse)
-            self.classificationmatrix[pat_idx, class_idx] = 1
-            self.classificationmatrix_coarse[pat_idx, class_coarse_idx] = 1
+        """check greenness of records"""
+        is_green_ENVTECH = self.match_records(self.GIenvtech, MCF["classes"], MCF["record_idx"], MCF["class_idx"], \
+                                                                                                        n_records)
+        is_green_IPCGI = self.match_records(self.GI_IPC, MCF["classes"], MCF["record_idx"], MCF["class_idx"], \
+                                                                                                        n_records)
+        record_patIDs = MCF["patents"][MCF["patent_idx"][MCF["record_start"]]]
+        self.pddf_parts.append(pd.DataFrame({'envtech': is_green_ENVTECH, 'IPCGI': is_green_IPCGI}, \
+                                                                                            index=record_patIDs))
         
-        """record last patent"""    
-        self.finalize_greenness_record(patID, is_green_ENVTECH, is_green_IPCGI, class_strings)
-        print("")
+        """record matrix entries"""
+        pat_idx = self.patindex.get_indexer(MCF["patents"])[MCF["patent_idx"]]
+        class_idx = self.classindex.get_indexer(MCF["classes"])[MCF["class_idx"]]
+        class_coarse_idx = self.classindex_coarse.get_indexer(MCF["classes_coarse"])[MCF["class_coarse_idx"]]
+        assert (pat_idx >= 0).all() and (class_idx >= 0).all() and (class_coarse_idx >= 0).all(), \
+                                        "Error: unknown patent ID or classification code in {}".format(classificationfile)
+        self.matrix_entries.append((pat_idx, class_idx))
+        self.matrix_entries_coarse.append((pat_idx, class_coarse_idx))
     
     def run(self):
-        """Method to parse all classification files.
+        """Method to parse all classification files. Greenness records and matrix entries of all files are
+           collected and added to the data frame and matrices once at the end.
             No Arguments
             Returns None"""
         
         print("Commencing search. File: ")
+        self.patindex = pd.Index(self.patlist)
+        self.classindex = pd.Index(self.classlist)
+        self.classindex_coarse = pd.Index(self.classlist_coarse)
+        self.pddf_parts = []
+        self.matrix_entries = []
+        self.matrix_entries_coarse = []
+        
         """parse all files"""
         n = 0
         for fname in self.classfilelist:
             n += 1
             print("{0:4d}".format(n), end="\r")
             self.search_file(fname)
+        print("")
+        
+        """record greenness. Later records of the same patent replace earlier ones"""
+        self.pddf = pd.concat([self.pddf] + self.pddf_parts)
+        self.pddf = self.pddf[~self.pddf.index.duplicated(keep='last')]
+        
+        """update matrices"""
+        self.classificationmatrix = self.add_matrix_entries(self.classificationmatrix, self.matrix_entries)
+        self.classificationmatrix_coarse = self.add_matrix_entries(self.classificationmatrix_coarse, \
+                                                                                    self.matrix_entries_coarse)
+    
+    def add_matrix_entries(self, matrix, entries):
+        """Method to add collected (row, column) entries to a classification matrix.
+            Arguments:
+                matrix - scipy.sparse matrix - classification matrix
+                entries - list of tuples of numpy arrays of int - rows and columns of the entries
+            Returns: scipy.sparse csr matrix of bool"""
+        rows = np.concatenate([entry[0] for entry in entries] + [np.zeros(0, dtype=np.int64)])
+        cols = np.concatenate([entry[1] for entry in entries] + [np.zeros(0, dtype=np.int64)])
+        new_entries = scipy.sparse.coo_matrix((np.ones(len(rows), dtype=bool), (rows, cols)), shape=matrix.shape)
+        merged, _ = merge_sparse_matrices([matrix, new_entries])
+        return merged
     
     def save(self):
         """Method to save the current state of data frame, matrixes and node lists.
@@ -265,6 +197,7 @@ class GreennessRecord():
         else:
             matrix_save_names = ["patent_detailed_classification_matrix.npz", "patent_classification_matrix.npz"]
             save_list_name = "patent_classification_matrix_node_keys.pkl"
+            save_array("patent_keys.npy", encode_patent_ids(self.patlist, errors="coerce"))
         for i in range(len(matrix_save_names)):
             print("Saving node keys")
             with open(save_list_name, "wb") as wfile:
@@ -304,45 +237,25 @@ class GreennessRecord():
                 filelist - list of strings - list of paths to classification files
             Returns None"""
         
-        """Prepare local variables: dicts of IDs and codes and counters"""
-        patdict = {}
-        classdict = {}
-        classdict_coarse = {}
-        pat_idx = 0
-        class_idx = 0
-        class_c_idx = 0
-        
         """Parse all files"""
+        patents = []
+        classes = []
+        classes_coarse = []
         for filename in filelist:
-            for line in line_generator_from_file(filename):
-                
-                """Obtain current ID and code"""
-                classID = line[18:33].strip()
-                classID_coarse = line[18:22]
-                patID = line[10:18]
-                
-                """Check if ID and code have been recorded already, otherwise update."""
-                
-                if patdict.get(patID) is None:
-                    patdict[patID] = pat_idx
-                    pat_idx += 1
-                    
-                if classdict.get(classID) is None:
-                    classdict[classID] = class_idx
-                    class_idx += 1
-                
-                if classdict_coarse.get(classID_coarse) is None:
-                    classdict_coarse[classID_coarse] = class_c_idx
-                    class_c_idx += 1
+            MCF = read_MCF_file(filename)
+            patents.append(MCF["patents"])
+            classes.append(MCF["classes"])
+            classes_coarse.append(MCF["classes_coarse"])
         
-        """Record lists of uniques IDs and codes"""
-        self.patlist = list(patdict.keys())
-        self.classlist = list(classdict.keys())
-        self.classlist_coarse = list(classdict_coarse.keys())
+        """Record lists of uniques IDs and codes (in order of first appearance)"""
+        self.patlist = pd.unique(np.concatenate(patents + [np.zeros(0, dtype=str)])).tolist()
+        self.classlist = pd.unique(np.concatenate(classes + [np.zeros(0, dtype=str)])).tolist()
+        self.classlist_coarse = pd.unique(np.concatenate(classes_coarse + [np.zeros(0, dtype=str)])).tolist()
         
         """Setup sparse matrices"""
-        self.classificationmatrix = scipy.sparse.dok_matrix((pat_idx, class_idx), dtype=bool)
-        self.classificationmatrix_coarse = scipy.sparse.dok_matrix((pat_idx, class_c_idx), dtype=bool)
+        self.classificationmatrix = scipy.sparse.dok_matrix((len(self.patlist), len(self.classlist)), dtype=bool)
+        self.classificationmatrix_coarse = scipy.sparse.dok_matrix((len(self.patlist), len(self.classlist_coarse)), \
+                                                                                                        dtype=bool)
 
 """Function definitions"""
 
@@ -358,6 +271,84 @@ def line_generator_from_file(filename):
                 line = line.replace("\n", "")
                 yield line
 
+def read_MCF_file(filename):
+    """Function to read a USPTO CPC master classification file (US_Grant_CPC_MCF_*.txt) with vectorised
+       operations. The file is read as a (lines x line length) byte array, fixed width columns are sliced
+       for all lines at once:
+            line[10:18] - patent ID
+            line[18:33] - classification code (stripped)
+            line[18:22] - coarse classification code (subclass)
+            line[41]    - "F" for the first code of a patent record
+       Patent IDs and codes are factorised (in order of first appearance). Lines starting with "#" are ignored.
+        Arguments:
+            filename - string - file name
+        Returns dict of numpy arrays:
+            patents, classes, classes_coarse - unique patent IDs and codes (strings)
+            patent_idx, class_idx, class_coarse_idx - index of each line's ID and codes in these arrays
+            record_idx - patent record index of each line
+            record_start - line indices at which patent records start"""
+    with open(filename, "rb") as rfile:
+        data = rfile.read()
+    
+    """Obtain (lines x line length) byte array"""
+    width = data.find(b"\n")
+    if width > 0 and len(data) % (width + 1) == 0 and (np.frombuffer(data, dtype=np.uint8)[width::width + 1] == \
+                                                                                                ord("\n")).all():
+        """All lines have the same length; use the file buffer directly"""
+        chars = np.frombuffer(data, dtype=np.uint8).reshape(-1, width + 1)[:, :width]
+    else:
+        lines = np.array(data.splitlines(), dtype=bytes)
+        chars = lines.view(np.uint8).reshape(len(lines), -1).copy()
+        chars[chars == 0] = ord(" ")
+    if chars.shape[1] < 42:
+        chars = np.hstack([chars, np.full((chars.shape[0], 42 - chars.shape[1]), ord(" "), dtype=np.uint8)])
+    chars = chars[(chars[:, 0] != ord("#")) & (chars != ord(" ")).any(axis=1)]
+    
+    """Slice and factorise columns"""
+    patent_idx, patents = factorize_fixed_width(chars[:, 10:18])
+    class_idx, classes = factorize_fixed_width(chars[:, 18:33], strip=True)
+    class_coarse_idx, classes_coarse = factorize_fixed_width(chars[:, 18:22])
+    
+    """Patent records start at primary codes (and at the first line)"""
+    record_start = chars[:, 41] == ord("F")
+    record_start[:1] = True
+    record_idx = np.cumsum(record_start) - 1
+    
+    return {"patents": patents, "classes": classes, "classes_coarse": classes_coarse, "patent_idx": patent_idx, \
+            "class_idx": class_idx, "class_coarse_idx": class_coarse_idx, "record_idx": record_idx, \
+            "record_start": np.flatnonzero(record_start)}
+
+
+def factorize_fixed_width(chars, strip=False):
+    """Function to factorise the rows of a fixed width byte array in order of first appearance. Rows are
+       split into 8 byte words that are factorised as integers one after the other.
+        Arguments:
+            chars - numpy array of uint8 (rows x width) - fixed width column
+            strip - bool - should leading and trailing spaces be removed from the values
+        Returns:
+            tuple of:
+                numpy array of int - index of each row in the unique values
+                numpy array of strings - unique values"""
+    n, width = chars.shape
+    padded = np.zeros((n, -(-width // 8) * 8), dtype=np.uint8)
+    padded[:, :width] = chars
+    words = padded.view("<u8")
+    codes = np.zeros(n, dtype=np.int64)
+    n_uniques = 1
+    for k in range(words.shape[1]):
+        word_codes, word_uniques = pd.factorize(words[:, k])
+        codes, uniques = pd.factorize(codes * len(word_uniques) + word_codes)
+        n_uniques = len(uniques)
+    
+    """Obtain unique values from their first occurrence"""
+    first_idx = np.zeros(n_uniques, dtype=np.int64)
+    first_idx[codes[::-1]] = np.arange(n)[::-1]
+    uniques = np.ascontiguousarray(chars[first_idx]).view("S{}".format(width)).ravel().astype(str)
+    if strip:
+        stripped_codes, uniques = pd.factorize(np.char.strip(uniques))
+        codes = stripped_codes[codes]
+        uniques = np.asarray(uniques, dtype=str)
+    return codes, uniques
 
 
 """ main entry point """
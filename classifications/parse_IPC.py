@@ -9,9 +9,11 @@
         class and subclass only, disregarding group and subgroup) as npz file
     - the detailed classification bipartite network (patents vs. unique classification codes) 
         as npz file.
-   The script defines two classes:
-    - GreenInventory as search pattern class.
-    - GreenRecord as record class
+    - the hierarchical table of all classification codes with parent pointers (see code_hierarchy.py)
+        as npz file.
+    - the canonical int64 keys of the patents (rows of the matrices, see patent_ids.py) as npy file.
+   The script defines the class ClassificationAndGreennessRecord as record class. The search pattern class
+   GreenInventory is imported from green_inventory.py.
 
 How to run:
 
@@ -51,80 +53,17 @@ import time
 import os.path
 import subprocess
 import argparse
+import csv
+from green_inventory import GreenInventory
+from greenness_engine import GreennessEngine
+from matrix_merge import merge_sparse_matrices
+from dataframe_merge import concat_partial_dataframes
+from code_hierarchy import build_code_hierarchy
+from matrix_store import save_matrix_store, load_matrix_store, save_key_array, load_key_array, save_array, \
+                                                                                            matrix_store_exists
+from patent_ids import encode_patent_ids
 
 """Class definitions"""
-"""Green patents search pattern class. Can parse and apply OECD ENvtech and IPC green inventory 
-   patterns"""
-class GreenInventory:
-    def __init__(self, patternsfile):
-        """Constructor. Recods patternfile and calls method to read pattern
-            Arguments:
-                patternfile - string - path to pattern file
-            Returns: Class instance"""
-        self.name = patternsfile
-        self.read_search_patterns(patternsfile)
-        self.strip_space_from_search_patterns()
-        
-    def strip_space_from_search_patterns(self):
-        """Method to strip space from between group ID and subgroup ID as IPC does not use that.
-            Arguments: None
-            Returns: None."""
-        for i, pattern in enumerate(self.single_patterns):
-            self.single_patterns[i] = pattern.replace(" ", "")
-        
-    def read_search_patterns(self, patternsfile):
-        """Method to read search patterns from file
-            Arguments:
-                patternfile - string - path to pattern file
-            Returns: None"""
-            
-        """Prepare record variables"""
-        self.single_patterns = []
-        self.combined_patterns = []
-        
-        """Parse file"""
-        for line in line_generator_from_file(patternsfile):
-            if line[0]=="[":                        #find conditional patterns
-                elements = line[1:].split("]")[0].split(" and ")
-                self.combined_patterns.append(elements)
-            elif "-" in line:                       #find wildcard patterns
-                """Identify start and endpoint of range"""
-                line, endnum = line.split("-")
-                if "/" in line:
-                    startnum_idx = len(line) - line[::-1].index("/")
-                else:
-                    startnum_idx = len(line) - line[::-1].index(" ")
-                line, startnum = line[:startnum_idx], line[startnum_idx:]
-                """Build numeric range and corresponding classification codes"""
-                allnum = list(range(int(startnum), int(endnum)+1))
-                allendings = [str(x) for x in allnum]
-                """Record patterns"""
-                for ending in allendings:
-                    while len(ending) < len(startnum):
-                        ending = "0" + ending
-                    self.single_patterns.append(line + ending)
-            else:                                   #find simple patterns
-                self.single_patterns.append(line)
-    
-    def filter_matching(self, class_strings):
-        """Method to filter all strings in a list that are matched by the green inventory.
-            Arguments:
-                class_strings - list of strings - classification codes
-            Returns: list of int - indices of matched strings"""
-        filtered = []
-        for i, cs in enumerate(class_strings):
-            #if "F01" in cs:
-            #    print(cs)
-            #    pdb.set_trace()
-            if any(st in cs for st in self.single_patterns):
-                filtered.append(i)
-            #    if "H01" in cs:
-            #        print(cs)
-            #else:
-            #    if "H01" in cs:
-            #        print(cs, " NOT PRESENT")
-        return np.array(filtered)
-
 """Green patents record class. Can parse classification files, apply search patterns and save records"""
 class ClassificationAndGreennessRecord():
     def __init__(self, setup=False, loadchunks=False, chunk_idx=None):
@@ -144,6 +83,7 @@ class ClassificationAndGreennessRecord():
         self.patlist = None
         self.classlist = {}
         self.classificationmatrix = {}
+        self.readonly = False                                   # matrices are memory mapped read-only
         self.pddf = pd.DataFrame(columns=['envtech', 'IPCGI'])  #greenness data frame. Will be overwritten when created.
         """Prepare search patterns"""
         #print("Preparing search patterns")
@@ -163,7 +103,8 @@ class ClassificationAndGreennessRecord():
         #print("All set up.")
 
     def parse_line(self, line):
-        """Method to parse one lingle line from the classification file
+        """Method to parse one lingle line from the classification file. Reference implementation of
+           factorize_IPC_table(), which parses whole chunks of the file.
             Arguments:
                 line - string - The line
             Returns:
@@ -195,64 +136,80 @@ class ClassificationAndGreennessRecord():
         return patID, class_code
     
     def search_IPC_file(self, classificationfile):
-        """Method for parsing IPC file. Identifies citations and records matrices
+        """Method for parsing IPC file. Identifies citations and records matrices. The file is parsed in chunks;
+           the level codes of each chunk are factorised and looked up in the node lists at once.
             Arguments:
                 classificationfile - string - the classification file to be used
             Returns None."""
+        patindex = pd.Index(self.patlist)
+        classindex = {level: pd.Index(self.classlist[level]) for level in self.levels_list}
+        rows = []
+        cols = {level: [] for level in self.levels_list}
         i = 0
-        for line in line_generator_from_file(classificationfile):
-            i += 1
+        for codes in read_IPC_file_chunks(classificationfile):
+            i += len(codes['patent_id'][0])
             print("\rSearch IPC file {0:10d}".format(i), end="")
-            """read class codes and patent ID"""
-            patID, class_code = self.parse_line(line)
-            
-            """update matrices"""
+            """look up patent IDs and class codes"""
+            pat_codes, pat_uniques = codes['patent_id']
+            rows.append(patindex.get_indexer(pat_uniques)[pat_codes])
             for level in self.levels_list:
-                classID = class_code[level]
-                pat_idx = self.patlist.index(patID)
-                class_idx = int(np.where(self.classlist[level]==classID)[0])
-                self.classificationmatrix[level][pat_idx, class_idx] = 1
+                class_codes, class_uniques = codes[level]
+                cols[level].append(classindex[level].get_indexer(class_uniques)[class_codes])
         print("")
         
+        """update matrices"""
+        rows = np.concatenate(rows + [np.zeros(0, dtype=np.int64)])
+        assert (rows >= 0).all(), "Unknown patent IDs in {}".format(classificationfile)
+        for level in self.levels_list:
+            level_cols = np.concatenate(cols[level] + [np.zeros(0, dtype=np.int64)])
+            assert (level_cols >= 0).all(), "Unknown {0} codes in {1}".format(level, classificationfile)
+            entries = scipy.sparse.coo_matrix((np.ones(len(rows), dtype=bool), (rows, level_cols)), \
+                                                                        shape=self.classificationmatrix[level].shape)
+            self.classificationmatrix[level], _ = merge_sparse_matrices([self.classificationmatrix[level], entries])
+        
+    def benchmark_parser(self, classificationfile):
+        """Method to compare the chunked parser (read_IPC_file_chunks) with the line by line parser (parse_line)
+           on a classification file. Reports run times and asserts identical codes.
+            Arguments:
+                classificationfile - string - the classification file to be used
+            Returns None."""
+        print("Line by line parser ...")
+        start_time = time.time()
+        parsed = [self.parse_line(line) for line in line_generator_from_file(classificationfile)]
+        line_time = time.time() - start_time
+        print("Chunked parser ...")
+        start_time = time.time()
+        chunks = list(read_IPC_file_chunks(classificationfile))
+        chunk_time = time.time() - start_time
+        
+        """compare"""
+        for field in ['patent_id'] + self.levels_list:
+            values = np.concatenate([uniques[codes] for codes, uniques in (chunk[field] for chunk in chunks)] + \
+                                                                                    [np.zeros(0, dtype=object)])
+            if field == 'patent_id':
+                expected = [patID for patID, _ in parsed]
+            else:
+                expected = [class_code[field] for _, class_code in parsed]
+            assert values.tolist() == expected, "Codes differ at {}".format(field)
+            print("{0:10s}: {1:8d} unique codes".format(field, len(pd.unique(values))))
+        print("{0} lines. Line by line: {1:.2f}s, chunked: {2:.2f}s (speedup {3:.1f}x). Codes are identical.".format(\
+                                                len(parsed), line_time, chunk_time, line_time / max(chunk_time, 1e-9)))
+
     def check_greenness2(self, start=0, stop=np.iinfo(np.intc).max):
         """Method to find green patents based in the subgroup level classification matrix. Records this in pandas df.
             Arguments 
                 start - int - Index of first to be parsed
                 stop - int - 1 + Index of last line to be parsed 
             Returns: None"""
-        """Obtain 3 lists of Envtech matrix columns"""
-        """Single code"""
-        col_array_Envtech_single = self.GIenvtech.filter_matching(self.classlist['subgroup'])
-        green_Envtech_single = self.classification_matrix_sum_by_indices(col_array_Envtech_single, level='subgroup')
-        
-        """Combined codes E03 and ..."""
-        pseudoGIenvtech = GreenInventory("pseudo_envtech_conditional_complement_E03.txt")
-        pseudoGIenvtech_E03 = GreenInventory("pseudo_envtech_conditional_E03.txt")
-        col_array_Envtech_E03_complement = pseudoGIenvtech.filter_matching(self.classlist['subgroup'])
-        col_array_Envtech_E03 = pseudoGIenvtech_E03.filter_matching(self.classlist['subgroup'])
-        green_Envtech_E03_complement = self.classification_matrix_sum_by_indices(col_array_Envtech_E03_complement, \
-                                                                                                    level='subgroup')
-        green_Envtech_E03 = self.classification_matrix_sum_by_indices(col_array_Envtech_E03, level='subgroup')
-        
-        """Perform computation to combine the 3 lists"""
-        green_Envtech = green_Envtech_E03 * green_Envtech_E03_complement + green_Envtech_single
-        green_Envtech = (green_Envtech>0)
-        
-        """Obtain 1 list of IPCGI matrix columns"""
-        col_array_IPCGI = self.GI_IPC.filter_matching(self.classlist['subgroup'])
-        green_IPCGI = self.classification_matrix_sum_by_indices(col_array_IPCGI, level='subgroup')
-        green_IPCGI = (green_IPCGI>0)
+        """Evaluate both schemes in one pass over the rows start to stop of the subgroup level matrix"""
+        GE = GreennessEngine(scipy.sparse.csr_matrix(self.classificationmatrix['subgroup'])[start:stop], \
+                                                                self.classlist['subgroup'], self.patlist[start:stop])
+        GE.register_inventory('envtech', self.GIenvtech)
+        GE.register_inventory('IPCGI', self.GI_IPC)
+        greenness = GE.compute_greenness()
         
         """Enter results in self.pddf data frame"""
-        assert len(green_Envtech) == len(green_IPCGI) == len(self.patlist)
-        for pat_idx, patID in enumerate(self.patlist):
-            #print(patID)
-            if patID == "4205637":
-                pdb.set_trace()
-            if start <= pat_idx < stop:
-                print("\rCheck greenness {0:10d}".format(pat_idx), end="")
-                self.pddf.loc[patID] = [green_Envtech[pat_idx], green_IPCGI[pat_idx]]
-        print("")
+        self.pddf = pd.concat([self.pddf[~self.pddf.index.isin(greenness.index)], greenness])
         
     def classification_matrix_sum_by_indices(self, col_array, level='subgroup'):
         """Method for summing columns by indices in the classificationmatrices.
@@ -320,17 +277,10 @@ class ClassificationAndGreennessRecord():
                 print("Warning: Lines duplicated {}-{}".format(partial_df_files[i]["start"] - 1, \
                                                         partial_df_files[i-1]["stop"]))
         assert all_good, "Error: lines missing."
-        for pdfile in partial_df_files:
-            df = pd.read_pickle(pdfile["filename"])
-            overlapping_indices = self.pddf.index.intersection(df.index)
-            if len(overlapping_indices) > 0:
-                print("Overlapping patent keys found: {}".format(len(overlapping_indices)))
-                for idx in overlapping_indices:
-                    assert (self.pddf.loc[idx] == df.loc[idx]).all(), "Error: Mismatched entries for {}".format(idx)
-                self.pddf = pd.concat([self.pddf, df])
-                self.pddf = self.pddf[~self.pddf.index.duplicated()]
-            else:
-                self.pddf = pd.concat([self.pddf, df])
+        dfs = [self.pddf] + [pd.read_pickle(pdfile["filename"]) for pdfile in partial_df_files]
+        conflict_filename = "patent_greenness_based_on_IPC_conflicts.txt"
+        self.pddf, conflicts = concat_partial_dataframes(dfs, conflict_filename)
+        assert len(conflicts) == 0, "Error: Mismatched entries, see {}".format(conflict_filename)
         self.pddf.to_pickle("patent_greenness_based_on_IPC.pkl")
 
     def save(self):
@@ -339,6 +289,9 @@ class ClassificationAndGreennessRecord():
             Returns None"""
         """Save data frame"""
         self.pddf.to_pickle("patent_greenness_based_on_IPC.pkl")
+        if self.readonly:
+            """Matrices are unchanged (and mapped from the files)"""
+            return
         
         """save classification matrices"""
         if self.chunk_idx is not None:
@@ -349,27 +302,49 @@ class ClassificationAndGreennessRecord():
                                                                             for level in self.levels_list}
             classlist_save_names = {level: "patent_classification_codes_level_" + str(level) + ".pkl" \
                                                                             for level in self.levels_list}
+            matrix_store_names = {level: "patent_classification_matrix_level_" + str(level) + "_store" \
+                                                                            for level in self.levels_list}
             patentID_save_name = "patent_codes.pkl"
             print("Saving node keys")
             with open(patentID_save_name, "wb") as wfile:
                 pickle.dump(self.patlist, wfile, protocol=pickle.HIGHEST_PROTOCOL)
+            save_key_array("patent_codes.npy", self.patlist)
+            save_array("patent_keys.npy", encode_patent_ids(self.patlist, errors="coerce"))
             for level in self.levels_list:
                 with open(classlist_save_names[level], "wb") as wfile:
                     pickle.dump(self.classlist[level], wfile, protocol=pickle.HIGHEST_PROTOCOL)
+            print("Saving code hierarchy")
+            build_code_hierarchy(self.classlist['subgroup']).save("patent_classification_code_hierarchy.npz")
         for level in self.levels_list:
             print("Transforming matrix")
             save_mtx = self.classificationmatrix[level].tocsr()
             print("Matrix transformed. Saving...")
             scipy.sparse.save_npz(matrix_save_names[level], save_mtx)
+            if self.chunk_idx is None:
+                save_matrix_store(matrix_store_names[level], save_mtx, self.classlist[level])
             print("Matrix saved.")
     
-    def reload(self):
+    def reload(self, readonly=False):
         """Method to reload the initial data frame, matrixes and node lists.
-            No Arguments
+            Arguments:
+                readonly - bool - Attach memory mapped matrices and node lists (if saved) instead of loading
+                                  modifiable copies. Use for steps that do not change the matrices.
             Returns None"""
         """Read data frame"""
         self.pddf = pd.read_pickle("patent_greenness_based_on_IPC.pkl")
         
+        """Attach read-only matrices"""
+        matrix_store_names = {level: "patent_classification_matrix_level_" + str(level) + "_store" \
+                                                                                for level in self.levels_list}
+        if readonly and os.path.exists("patent_codes.npy") and \
+                                all(matrix_store_exists(matrix_store_names[level]) for level in self.levels_list):
+            print("Attaching memory mapped node keys and matrices")
+            self.patlist = load_key_array("patent_codes.npy")
+            for level in self.levels_list:
+                self.classificationmatrix[level], self.classlist[level] = load_matrix_store(matrix_store_names[level])
+            self.readonly = True
+            return
+        
         """Read classification matrices"""
         matrix_save_names = {level: "patent_classification_matrix_level_" + str(level) + ".npz" \
                                                                                 for level in self.levels_list}
@@ -395,41 +370,26 @@ class ClassificationAndGreennessRecord():
                 filelist - list of strings - list of paths to classification files
             Returns None"""
         
-        """Prepare local variables: dicts of IDs and codes and counters"""
-        patdict = {}
-        classdict = {item: {} for item in self.levels_list}
-        pat_idx = 0
-        class_idx = {item: 0 for item in self.levels_list}
-        
-        """Parse all files"""
+        """Collect unique IDs and codes of all chunks of all files (in order of first appearance)"""
+        patents = []
+        classes = {level: [] for level in self.levels_list}
         for filename in filelist:
             i = 0
-            for line in line_generator_from_file(filename):
-                i += 1
+            for codes in read_IPC_file_chunks(filename):
+                i += len(codes['patent_id'][0])
                 print("\rPrepare matrices {0:10d}".format(i), end="")
-
-                """Obtain current code and paten ID"""
-                
-                patID, class_code = self.parse_line(line)
-                
-                """Check if ID and code have been recorded already, otherwise update."""
-                
-                if patdict.get(patID) is None:
-                    patdict[patID] = pat_idx
-                    pat_idx += 1
-                
+                patents.append(codes['patent_id'][1])
                 for level in self.levels_list:
-                    classID = class_code[level]
-                    if classdict[level].get(classID) is None:
-                        classdict[level][classID] = class_idx
-                        class_idx[level] += 1
-                
+                    classes[level].append(codes[level][1])
         print("")
         
         """Record lists of uniques IDs and codes"""
-        self.patlist = list(patdict.keys())
+        self.patlist = pd.unique(np.concatenate(patents + [np.zeros(0, dtype=object)])).tolist()
         for level in self.levels_list:
-            self.classlist[level] = np.array(list(classdict[level].keys()))
+            self.classlist[level] = np.array(pd.unique(np.concatenate(classes[level] + \
+                                                                        [np.zeros(0, dtype=object)])).tolist())
+        pat_idx = len(self.patlist)
+        class_idx = {level: len(self.classlist[level]) for level in self.levels_list}
         
         """Setup sparse matrices"""
         for level in self.levels_list:
@@ -449,19 +409,11 @@ class ClassificationAndGreennessRecord():
             for i in range(len(filenames[level])):
                 assert os.path.exists(filenames[level][i]), "File not found: {}".format(filenames[level][i])
         
-        """Load and add one by one."""
+        """Merge chunks (and the reloaded matrix) in one pass"""
         for level in self.levels_list:
-            for i, filename in enumerate(filenames[level]):
-                print("Level {2:10s}; parsing {0} of {1}".format(i, len(filenames[level]), level))
-                pcm = scipy.sparse.load_npz(filename)
-                expected_sum = np.sum(self.classificationmatrix[level]) + np.sum(pcm)
-                self.classificationmatrix[level] = self.classificationmatrix[level] + pcm
-                try:
-                    assert expected_sum == np.sum(self.classificationmatrix[level]), \
-                                    "expected sum does not match actual sum: {0} != {1}".format(expected_sum, 
-                                                                    np.sum(self.classificationmatrix[level]))
-                except:
-                    pass
+            print("Level {0:10s}; merging {1} chunks".format(level, len(filenames[level])))
+            self.classificationmatrix[level], _ = merge_sparse_matrices([self.classificationmatrix[level]] + \
+                                                                                            filenames[level])
 
 """Function definitions"""
 
@@ -477,6 +429,80 @@ def line_generator_from_file(filename):
                 line = line.replace("\n", "")
                 yield line
 
+def read_IPC_file_chunks(filename, chunksize=1000000):
+    """Generator function. Reads the classification file in chunks and returns the factorised patent IDs and
+       class codes of each chunk (see factorize_IPC_table). Like line_generator_from_file(), lines starting with
+       "#" and the header are skipped.
+        Arguments:
+            filename - string - file name
+            chunksize - int - number of lines per chunk
+        Returns generator of dicts (see factorize_IPC_table)"""
+    reader = pd.read_csv(filename, sep="\t", header=None, usecols=[0, 1, 3, 4, 5, 6, 7], dtype=str, \
+                        quoting=csv.QUOTE_NONE, keep_default_na=False, na_filter=False, chunksize=chunksize)
+    for chunk in reader:
+        skip = chunk[0].str.startswith("#") | ((chunk[0] == "uuid") & (chunk[1] == "patent_id"))
+        yield factorize_IPC_table(chunk[~skip.to_numpy()])
+
+def factorize_IPC_table(table):
+    """Function to obtain patent IDs and the class codes at all depth levels for a chunk of lines of the
+       classification file. Vectorised equivalent of ClassificationAndGreennessRecord.parse_line: slashes are
+       stripped from all fields, one digit classes and subgroups are padded with "0", leading zeros are removed
+       from main groups. The fields are factorised first, so that string operations are only applied to their
+       unique values. Codes of deeper levels are obtained by factorising pairs of integer codes (code of the
+       parent level, code of the field).
+        Arguments:
+            table - pandas DataFrame - fields of the lines (columns 1-7 are used)
+        Returns dict - keys 'patent_id', 'section', 'class', 'subclass', 'maingroup', 'subgroup'; values tuples
+                        of numpy array of int (code index of each line) and numpy array of strings (unique codes
+                        in order of first appearance)"""
+    fields = {}
+    fields['patent_id'] = factorize_normalised(table[1], lambda raw: raw.str.strip("/"))
+    fields['section'] = factorize_normalised(table[3], lambda raw: raw.str.strip("/"))
+    fields['class'] = factorize_normalised(table[4], lambda raw: pad_one_digit(raw.str.strip("/")))
+    fields['subclass'] = factorize_normalised(table[5], lambda raw: raw.str.strip("/"))
+    fields['maingroup'] = factorize_normalised(table[6], lambda raw: raw.str.strip("/").str.replace(r"^0+(?=.)", \
+                                                                                                    "", regex=True))
+    fields['subgroup'] = factorize_normalised(table[7], lambda raw: "/" + pad_one_digit(raw.str.strip("/")).str.strip())
+    
+    codes = {'patent_id': fields['patent_id'], 'section': fields['section']}
+    codes['class'] = factorize_concatenated(codes['section'], fields['class'])
+    codes['subclass'] = factorize_concatenated(codes['class'], fields['subclass'])
+    codes['maingroup'] = factorize_concatenated(codes['subclass'], fields['maingroup'])
+    codes['subgroup'] = factorize_concatenated(codes['maingroup'], fields['subgroup'])
+    return codes
+
+def factorize_normalised(raw, normalise):
+    """Function to factorise a column of strings after normalising it. The normalisation is applied to the unique
+       values only.
+        Arguments:
+            raw - pandas Series of strings - the column
+            normalise - function - takes and returns a pandas Series of strings
+        Returns tuple of numpy array of int (code index of each line) and numpy array of strings (unique codes)"""
+    raw_codes, raw_uniques = pd.factorize(raw)
+    codes, uniques = pd.factorize(normalise(pd.Series(raw_uniques, dtype=object)))
+    return codes[raw_codes], np.asarray(uniques, dtype=object)
+
+def factorize_concatenated(prefix, suffix):
+    """Function to factorise the concatenation of two factorised columns of strings. Only the unique pairs of codes
+       are concatenated as strings.
+        Arguments:
+            prefix - tuple of numpy array of int and numpy array of strings - first factorised column
+            suffix - tuple of numpy array of int and numpy array of strings - second factorised column
+        Returns tuple of numpy array of int (code index of each line) and numpy array of strings (unique codes)"""
+    n_suffix = max(len(suffix[1]), 1)
+    pair_codes, pairs = pd.factorize(prefix[0].astype(np.int64) * n_suffix + suffix[0])
+    concatenated = pd.Series(prefix[1][pairs // n_suffix], dtype=object) + \
+                                                            pd.Series(suffix[1][pairs % n_suffix], dtype=object)
+    codes, uniques = pd.factorize(concatenated)
+    return codes[pair_codes], np.asarray(uniques, dtype=object)
+
+def pad_one_digit(raw):
+    """Function to pad strings of length one with a leading "0".
+        Arguments:
+            raw - pandas Series of strings
+        Returns pandas Series of strings"""
+    return raw.where(raw.str.len() != 1, "0" + raw)
+
 def splitIPCfile():
     """Function for splitting the input class file into 20 chunks to be parsed subsequently.
        Determines the appropriate file length using UNIX 'wc -l' via python subprocess. Then creates the files
@@ -531,6 +557,8 @@ if __name__ == "__main__":
     parser.add_argument("--loadchunks", action="store_true", help="Load and combine chunks after parsing by chunk.")
     parser.add_argument("--greennesslines", nargs=2, type=int, help="Check for greenness between line X and line Y " \
                                                                     "only and save partial data frame.")
+    parser.add_argument("--benchmarkparser", action="store_true", help="Compare chunked and line by line " \
+                                                                    "parsers on the classification file.")
     parser.add_argument("--combineDF", action="store_true", help="Load and combine partial greenness data frames " \
                                                                     "after checking by line ranges.")
     
@@ -563,8 +591,10 @@ if __name__ == "__main__":
         GR = ClassificationAndGreennessRecord(setup=False, loadchunks=False, chunk_idx=args.chunk)
     else:
         GR = ClassificationAndGreennessRecord(setup=False, loadchunks=False, chunk_idx=None)
+    if args.benchmarkparser:
+        GR.benchmark_parser(GR.classfilelist[0])
     if args.setup or args.parse or args.loadchunks or args.greenness or args.greennesslines:
-        GR.reload()
+        GR.reload(readonly=not (args.setup or args.parse or args.loadchunks))
         print("Setup is done.")
     if args.parse:
         print("Running parse. Chunk ", end="")
@@ -0,0 +1,113 @@
+"""Functions to encode patent IDs as canonical int64 keys and to decode them again.
+   Patent IDs appear with inconsistent leading zeros and whitespace in the different sources (e.g. "4000001",
+   " 4000001", "04000001", "D0123456", "D123456"). All of them are mapped to one int64 key:
+        key = type * TYPE_FACTOR + number
+   where type is the index of the type prefix in PATENT_TYPES (0 for utility patents, so that the key of a utility
+   patent is its number) and number is the numeric part of the ID. Decoding gives the canonical string form without
+   whitespace and leading zeros ("4000001", "D123456").
+   Encoding works on the characters of fixed width string arrays as integer arrays, column by column, so that no
+   ID is converted individually; 10M IDs are encoded in a few seconds. Keys are used as index of stored data
+   frames and as row keys of stored matrices (patent_keys.npy), so that joins between stages are integer joins.
+"""
+
+"""inport modules"""
+import numpy as np
+import pandas as pd
+
+"""Type prefixes: utility, design, plant, reissue, defensive publication, statutory invention registration,
+   X-patent, reissued X-patent, additional improvement"""
+PATENT_TYPES = ["", "D", "PP", "RE", "T", "H", "X", "RX", "AI"]
+TYPE_FACTOR = 10**12
+
+"""Lookup table from prefix code (letters in base 32, A=1) to type index"""
+_PREFIX_TYPES = np.full(32 * 32, -1, dtype=np.int64)
+for _type, _prefix in enumerate(PATENT_TYPES):
+    _code = 0
+    for _letter in _prefix:
+        _code = _code * 32 + ord(_letter) - ord("A") + 1
+    _PREFIX_TYPES[_code] = _type
+
+"""Function definitions"""
+
+def encode_patent_ids(patent_ids, errors="raise"):
+    """Function to encode patent IDs as canonical int64 keys.
+        Arguments:
+            patent_ids - list, numpy array, pandas Index or Series of strings (or of ints) - patent IDs
+            errors - string - "raise": raise ValueError for IDs that cannot be encoded; "coerce": encode them as -1
+        Returns numpy array of int64"""
+    patent_ids = np.asarray(patent_ids)
+    if np.issubdtype(patent_ids.dtype, np.integer):
+        return patent_ids.astype(np.int64)
+    patent_ids = patent_ids.astype(str)
+    n = len(patent_ids)
+    keys = np.zeros(n, dtype=np.int64)
+    prefix = np.zeros(n, dtype=np.int64)
+    n_letters = np.zeros(n, dtype=np.int64)
+    has_digits = np.zeros(n, dtype=bool)
+    invalid = np.zeros(n, dtype=bool)
+    if n == 0 or patent_ids.dtype.itemsize == 0:
+        invalid[:] = True
+    else:
+        chars = patent_ids.view(np.uint32).reshape(n, -1)
+        for column in chars.T:
+            column = column.astype(np.int64)
+            is_digit = (column >= ord("0")) & (column <= ord("9"))
+            column = np.where((column >= ord("a")) & (column <= ord("z")), column - ord("a") + ord("A"), column)
+            is_letter = (column >= ord("A")) & (column <= ord("Z"))
+            is_space = (column == 0) | (column == ord(" ")) | (column == ord("\t"))
+            """Letters are only allowed before the number, at most two of them"""
+            invalid |= ~(is_digit | is_letter | is_space) | (is_letter & has_digits)
+            n_letters += is_letter
+            prefix = np.where(is_letter, (prefix * 32 + column - ord("A") + 1) % (32 * 32), prefix)
+            keys = np.where(is_digit, keys * 10 + column - ord("0"), keys)
+            has_digits |= is_digit
+        types = _PREFIX_TYPES[prefix]
+        invalid |= ~has_digits | (n_letters > 2) | (types < 0) | (keys >= TYPE_FACTOR)
+        keys = keys + types * TYPE_FACTOR
+    if invalid.any():
+        if errors == "raise":
+            raise ValueError("Cannot encode {0} patent IDs, e.g. {1}".format(invalid.sum(), \
+                                                                                patent_ids[invalid][:5].tolist()))
+        keys[invalid] = -1
+    return keys
+
+def decode_patent_ids(keys):
+    """Function to decode int64 keys into canonical patent IDs (no whitespace, no leading zeros).
+        Arguments:
+            keys - numpy array of int64 - keys obtained with encode_patent_ids
+        Returns numpy array of strings ("" for key -1)"""
+    keys = np.asarray(keys, dtype=np.int64)
+    valid = keys >= 0
+    prefixes = np.asarray(PATENT_TYPES)[np.where(valid, keys // TYPE_FACTOR, 0)]
+    patent_ids = np.char.add(prefixes, (keys % TYPE_FACTOR).astype(str))
+    patent_ids[~valid] = ""
+    return patent_ids
+
+def canonical_patent_ids(patent_ids):
+    """Function to obtain the canonical string form of patent IDs.
+        Arguments:
+            patent_ids - list or array of strings - patent IDs
+        Returns numpy array of strings"""
+    return decode_patent_ids(encode_patent_ids(patent_ids))
+
+def canonical_patent_id(patent_id):
+    """Function to obtain the canonical string form of a single patent ID (for code that handles IDs one by one).
+        Arguments:
+            patent_id - string - patent ID
+        Returns string"""
+    patent_id = "".join(patent_id.split()).upper()
+    number = patent_id.lstrip("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+    prefix = patent_id[:len(patent_id) - len(number)]
+    if not number.isdigit() or prefix not in PATENT_TYPES:
+        raise ValueError("Cannot encode patent ID {}".format(patent_id))
+    return prefix + str(int(number))
+
+def encode_index(pddf, errors="raise"):
+    """Function to replace the (string) patent ID index of a data frame by int64 keys.
+        Arguments:
+            pddf - pandas DataFrame or Series - indexed by patent ID
+            errors - string - see encode_patent_ids; rows with IDs that cannot be encoded are dropped if "coerce"
+        Returns pandas DataFrame or Series - copy indexed by int64 keys (index name "PatID")"""
+    pddf = pddf.copy()
+    pddf.index = pd.Index(encode_patent_ids(pddf.index, errors=errors), name="PatID")
+    return pddf[pddf.index >= 0]
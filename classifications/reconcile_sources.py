@@ -0,0 +1,224 @@
+"""Script to reconcile the patents covered by the classification sources:
+    - CPC from patentsview.org (parse_CPC.py; patent_codes.pkl, patent_classification_matrix_level_subgroup.npz)
+    - CPC from the USPTO master classification files (parse_CPC_based_on_USPTO_gov_rawdata.py;
+        patent_classification_matrix_node_keys.pkl, patent_detailed_classification_matrix.npz)
+    - IPC from patentsview.org (parse_IPC.py; same file names as parse_CPC.py, in a different directory)
+   Patent IDs of all sources are encoded as canonical int64 keys (see patent_ids.py); malformed IDs are dropped and
+   counted by source. The vocabularies are merged with sorted merge joins on these keys (numpy sort and searchsorted)
+   instead of set operations on string lists.
+   The script records:
+    - the membership of each patent in each source as pickled pandas dataframe
+    - coverage statistics (number of patents by combination of sources, overall and by grant year if a data
+        frame with grant years is available) as pickled pandas dataframe
+    - the number of malformed (dropped) patent IDs by source as pickled pandas series
+    - optionally, the union classification matrix of the CPC sources (rows: union of patents, columns: union of
+        normalised codes) with node keys, in the layout read by greenness_engine.py
+
+How to run:
+
+python3 reconcile_sources.py --cpc ../CPC --mcf ../CPCs --ipc ../IPC --dates ../data_frame/patents_dates_years.pkl
+python3 reconcile_sources.py --cpc ../CPC --mcf ../CPCs --union
+python3 greenness_engine.py --matrix patent_classification_matrix_union.npz \
+                            --codes patent_classification_codes_union.pkl --patents patent_codes_union.pkl
+"""
+
+"""inport modules"""
+import numpy as np
+import scipy
+import scipy.sparse
+import pickle
+import pandas as pd
+import argparse
+import os
+from code_hierarchy import normalise_codes
+from matrix_merge import merge_sparse_matrices
+from patent_ids import encode_patent_ids, decode_patent_ids
+
+"""Function definitions"""
+
+def lookup_keys(sorted_keys, order, query):
+    """Function to look up keys in a sorted key array (merge join of the query onto the keys).
+        Arguments:
+            sorted_keys - numpy array of int64 - sorted unique keys
+            order - numpy array of int - row of each sorted key in the original (unsorted) array
+            query - numpy array of int64 - keys to look up
+        Returns numpy array of int64 - row of each query key in the original array, -1 if absent"""
+    if len(sorted_keys) == 0:
+        return np.full(len(query), -1, dtype=np.int64)
+    position = np.minimum(np.searchsorted(sorted_keys, query), len(sorted_keys) - 1)
+    return np.where(sorted_keys[position] == query, order[position], -1).astype(np.int64)
+
+def encode_source_keys(patent_ids):
+    """Function to encode the patent IDs of a source as int64 keys, dropping malformed IDs.
+        Arguments:
+            patent_ids - list or array of strings - patent IDs of the source
+        Returns:
+            tuple of:
+                numpy array of int64 - keys of the well-formed IDs
+                numpy array of int64 - row of each of these keys in the source"""
+    keys = encode_patent_ids(patent_ids, errors="coerce")
+    valid = np.flatnonzero(keys >= 0)
+    return keys[valid], valid
+
+def source_rows(rows, valid):
+    """Function to map rows in the array of well-formed keys of a source back to rows in the source.
+        Arguments:
+            rows - numpy array of int64 - row in the array of well-formed keys, -1 if absent
+            valid - numpy array of int64 - row of each well-formed key in the source (see encode_source_keys)
+        Returns numpy array of int64 - row in the source, -1 if absent"""
+    mapped = np.full(len(rows), -1, dtype=np.int64)
+    present = rows >= 0
+    mapped[present] = valid[rows[present]]
+    return mapped
+
+def merge_join(source_keys):
+    """Function to merge the key vocabularies of several sources with sorted merge joins.
+        Arguments:
+            source_keys - dict - source name: numpy array of int64 (unique keys of the source, any order)
+        Returns:
+            tuple of:
+                numpy array of int64 - sorted union of keys
+                dict - source name: numpy array of int64 (row of each union key in the source, -1 if absent)"""
+    sorted_keys = {}
+    for name, keys in source_keys.items():
+        order = np.argsort(keys)
+        sorted_keys[name] = (keys[order], order)
+        assert (np.diff(sorted_keys[name][0]) > 0).all(), "Duplicate patent keys in source {}".format(name)
+    """Union of the sorted runs; the stable sort (timsort) merges presorted runs in linear time"""
+    union = np.concatenate([keys for keys, _ in sorted_keys.values()] + [np.zeros(0, dtype=np.int64)])
+    union.sort(kind="stable")
+    union = union[np.append(True, union[1:] != union[:-1])] if len(union) > 0 else union
+    rows = {name: lookup_keys(keys, order, union) for name, (keys, order) in sorted_keys.items()}
+    return union, rows
+
+def coverage_statistics(membership, years=None):
+    """Function to count the patents by combination of sources, overall and by year.
+        Arguments:
+            membership - pandas DataFrame of bool - patents x sources
+            years - pandas Series or None - grant year of each patent (same index as membership)
+        Returns pandas DataFrame - counts by combination (columns) for all years (row "all") and each year"""
+    combination = pd.Series("", index=membership.index)
+    for name in membership.columns:
+        combination = combination + np.where(membership[name], name + " ", "- ")
+    combination = combination.str.strip()
+    coverage = combination.value_counts().to_frame("all").T
+    if years is not None:
+        known = years.notna().to_numpy()
+        by_year = pd.crosstab(years.to_numpy()[known].astype(np.int64), combination.to_numpy()[known])
+        coverage = pd.concat([coverage, by_year])
+    return coverage.fillna(0).astype(np.int64)
+
+def load_source(dirname, source_type):
+    """Function to load patent IDs (and matrix and codes file names) of a classification source.
+        Arguments:
+            dirname - string - directory with the output of the parser
+            source_type - string - "patentsview" (parse_CPC.py, parse_IPC.py) or "mcf"
+                                   (parse_CPC_based_on_USPTO_gov_rawdata.py)
+        Returns:
+            tuple of:
+                list of strings - patent IDs
+                string - file name of the detailed classification matrix
+                list of strings - classification codes (columns of the matrix)"""
+    if source_type == "mcf":
+        with open(os.path.join(dirname, "patent_classification_matrix_node_keys.pkl"), "rb") as rfile:
+            patlist, classlist, _ = pickle.load(rfile)
+        return patlist, os.path.join(dirname, "patent_detailed_classification_matrix.npz"), classlist
+    with open(os.path.join(dirname, "patent_codes.pkl"), "rb") as rfile:
+        patlist = pickle.load(rfile)
+    with open(os.path.join(dirname, "patent_classification_codes_level_subgroup.pkl"), "rb") as rfile:
+        classlist = pickle.load(rfile)
+    return patlist, os.path.join(dirname, "patent_classification_matrix_level_subgroup.npz"), classlist
+
+def union_classification_matrix(union, rows, matrix_files, classlists):
+    """Function to merge the classification matrices of several sources into one matrix of the union of patents
+       and the union of (normalised) classification codes. Entries present in any source are set.
+        Arguments:
+            union - numpy array of int64 - sorted union of patent keys
+            rows - dict - source name: numpy array of int (row of each union key in the source, -1 if absent);
+                          source rows without union key (malformed patent IDs) are dropped
+            matrix_files - dict - source name: npz file name of the classification matrix
+            classlists - dict - source name: list of strings (classification codes of the source)
+        Returns:
+            tuple of:
+                scipy.sparse csr matrix of bool - union patents x union codes
+                numpy array of strings - union codes"""
+    codes = {name: normalise_codes(classlists[name]) for name in matrix_files}
+    union_codes = np.unique(np.concatenate([codes[name] for name in matrix_files]))
+    shape = (len(union), len(union_codes))
+    chunks = []
+    for name, matrix_file in matrix_files.items():
+        print("Mapping {} to union".format(name))
+        matrix = scipy.sparse.load_npz(matrix_file).tocoo()
+        """Union row of each source row and union column of each source column"""
+        source_to_union = np.full(matrix.shape[0], -1, dtype=np.int64)
+        present = rows[name] >= 0
+        source_to_union[rows[name][present]] = np.flatnonzero(present)
+        column_to_union = np.searchsorted(union_codes, codes[name])
+        """Rows of malformed patent IDs are not in the union"""
+        keep = source_to_union[matrix.row] >= 0
+        chunks.append(scipy.sparse.coo_matrix((matrix.data[keep], (source_to_union[matrix.row[keep]], \
+                                                                column_to_union[matrix.col[keep]])), shape=shape))
+    merged, _ = merge_sparse_matrices(chunks, shape=shape)
+    return merged, union_codes
+
+""" main entry point """
+
+if __name__ == "__main__":
+    """Parse terminal arguments"""
+    parser = argparse.ArgumentParser(description="Reconciliation of patent classification sources.")
+    parser.add_argument("--cpc", help="Directory with parse_CPC.py output (patentsview CPC).")
+    parser.add_argument("--mcf", help="Directory with parse_CPC_based_on_USPTO_gov_rawdata.py output (USPTO MCF).")
+    parser.add_argument("--ipc", help="Directory with parse_IPC.py output (patentsview IPC).")
+    parser.add_argument("--dates", help="Data frame with column 'granted year' indexed by patent ID.")
+    parser.add_argument("--union", action="store_true", help="Save union classification matrix of CPC sources.")
+    args = parser.parse_args()
+
+    """Load sources"""
+    sources = {}
+    for name, dirname, source_type in [("CPC", args.cpc, "patentsview"), ("MCF", args.mcf, "mcf"), \
+                                                                                ("IPC", args.ipc, "patentsview")]:
+        if dirname is not None:
+            print("Loading {0} from {1}".format(name, dirname))
+            sources[name] = load_source(dirname, source_type)
+    assert len(sources) > 0, "No classification sources given"
+    names = list(sources.keys())
+    patent_id_lists = [sources[name][0] for name in names]
+    dates = None
+    if args.dates is not None:
+        dates = pd.read_pickle(args.dates)
+        patent_id_lists.append(dates.index)
+
+    """Encode patent IDs (malformed IDs are dropped) and merge"""
+    keys, valid = zip(*[encode_source_keys(patent_ids) for patent_ids in patent_id_lists])
+    malformed = pd.Series([len(patent_ids) - len(valid_rows) for patent_ids, valid_rows in zip(patent_id_lists, \
+                                        valid)], index=names + (["dates"] if dates is not None else []), name="malformed IDs")
+    print("Malformed patent IDs dropped by source:")
+    print(malformed.to_string())
+    malformed.to_pickle("patent_classification_sources_malformed_ids.pkl")
+    union, rows = merge_join({name: keys[i] for i, name in enumerate(names)})
+    rows = {name: source_rows(rows[name], valid[i]) for i, name in enumerate(names)}
+    membership = pd.DataFrame({name: rows[name] >= 0 for name in names}, index=pd.Index(union, name="PatID"))
+    membership.to_pickle("patent_classification_sources.pkl")
+
+    """Coverage"""
+    years = None
+    if dates is not None:
+        order = np.argsort(keys[-1], kind="stable")
+        year_rows = source_rows(lookup_keys(keys[-1][order], order, union), valid[-1])
+        years = pd.Series(np.where(year_rows >= 0, dates["granted year"].to_numpy()[year_rows], np.nan), \
+                                                                                    index=membership.index)
+    coverage = coverage_statistics(membership, years)
+    coverage.to_pickle("patent_classification_sources_coverage.pkl")
+    print(coverage)
+
+    """Union matrix of CPC sources"""
+    if args.union:
+        cpc_names = [name for name in names if name in ["CPC", "MCF"]]
+        merged, union_codes = union_classification_matrix(union, rows, \
+                                                            {name: sources[name][1] for name in cpc_names}, \
+                                                            {name: sources[name][2] for name in cpc_names})
+        scipy.sparse.save_npz("patent_classification_matrix_union.npz", merged)
+        with open("patent_codes_union.pkl", "wb") as wfile:
+            pickle.dump(decode_patent_ids(union).tolist(), wfile, protocol=pickle.HIGHEST_PROTOCOL)
+        with open("patent_classification_codes_union.pkl", "wb") as wfile:
+            pickle.dump(union_codes.tolist(), wfile, protocol=pickle.HIGHEST_PROTOCOL)
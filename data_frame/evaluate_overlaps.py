@@ -4,6 +4,10 @@ import pickle
 import pandas as pd
 import numpy as np
 import scipy.sparse
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "classifications"))
+from code_hierarchy import load_level_matrix
 
 def generate_index_plots(jaccard_indices_all, tversky_indices_all):
     n_classes = len(jaccard_indices_all)
@@ -59,10 +63,9 @@ def generate_index_plots(jaccard_indices_all, tversky_indices_all):
 def main():
     """load files"""
     level = "section"
-    classification_matrix = scipy.sparse.load_npz("patent_classification_matrix_level_" + level + ".npz")    # matrix
+    classification_matrix, classification_codes = load_level_matrix(level)    # matrix rolled up from subgroup level
+    classification_matrix = classification_matrix.tocsc()
     pddf = pd.read_pickle("CPC_sorted_green_patents_combined_df.pkl")    # dataframe
-    with open("patent_classification_codes_level_" + level + ".pkl", "rb") as infile:
-        classification_codes = pickle.load(infile)
 
     """overlaps for all codes and years (Envtech, IPCGI, Y Codes): {'111': 98094, '110': 52535, '101': 35298, '100': 36570, '011': 42345, '010': 454659, '001': 146203, '000': 5152545}"""
             
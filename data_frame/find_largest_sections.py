@@ -5,11 +5,13 @@ import pandas as pd
 import numpy as np
 import scipy.sparse
 import pdb
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "classifications"))
+from code_hierarchy import load_level_matrix
 
 def find_incidence(pddf, scheme, level = "section"):
-    classification_matrix = (scipy.sparse.load_npz("patent_classification_matrix_level_" + level + ".npz")).tocsr()    # matrix
-    with open("patent_classification_codes_level_" + level + ".pkl", "rb") as infile:
-        classification_codes = pickle.load(infile)
+    classification_matrix, classification_codes = load_level_matrix(level)    # matrix rolled up from subgroup level
     #patentID_save_name = "patent_codes.pkl"
     #with open(patentID_save_name, "rb") as rfile:
     #    patlist = pickle.load(rfile)
@@ -42,11 +44,9 @@ def combine_incidences(level=None):
     print(df.sort_values("Y_Codes", ascending=0).head(10))
     #pdb.set_trace()
 
-def return_by_years(level, section_code, )
+def return_by_years(level, section_code):
     pddf = pd.read_pickle("CPC_sorted_green_patents_combined_df.pkl")    # dataframe
-    classification_matrix = (scipy.sparse.load_npz("patent_classification_matrix_level_" + level + ".npz")).tocsr()    # matrix
-    with open("patent_classification_codes_level_" + level + ".pkl", "rb") as infile:
-        classification_codes = pickle.load(infile)
+    classification_matrix, classification_codes = load_level_matrix(level)    # matrix rolled up from subgroup level
     # id in classification codes, get index
     # get patents
     # count in pddf by year
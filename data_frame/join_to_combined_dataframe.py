@@ -1,7 +1,12 @@
 #join df
 import pandas as pd
+import numpy as np
 import pickle
 import pdb
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "classifications"))
+from patent_ids import encode_index, encode_patent_ids, decode_patent_ids
 
 def join_all_dfs(filenames, outputfilepickle, outputfilefeather, patent_codes_files):
     colnames = {"detected_green_patents.pkl": "Shapira et al. GI pattern",
@@ -18,8 +23,9 @@ def join_all_dfs(filenames, outputfilepickle, outputfilefeather, patent_codes_fi
     for i, df in enumerate(dfs):
         print("parsing {0} of {1}: {2}".format(i+1, len(dfs), filenames[i]))
         merge_direction = 'left' if i>0 else 'right'
-        if filenames[i] in ["patent_greenness_based_on_CPC_all.pkl", "patent_greenness_based_on_CPC_Y_classes_USPTO.pkl"]:     # in this file the indices (patent numbers) have for some reason a leading space character
-                df.index = df.index.str.strip() 
+        """Index by canonical int64 patent keys (removes leading spaces and zeros of some files), merges are
+           integer joins"""
+        df = encode_index(df, errors="coerce")
         if filenames[i] in ["detected_green_patents.pkl"]:
             colname = colnames["detected_green_patents.pkl"]
             df = pd_from_gi_table(df, colname)
@@ -49,28 +55,21 @@ def join_all_dfs(filenames, outputfilepickle, outputfilefeather, patent_codes_fi
             
             """reindex to match CPC/IPC matrix"""
             with open(patent_codes_files.get(classification_scheme), "rb") as infile:
-                pcs = pickle.load(infile)
-            additionals = list(set(pddf.index) - set(pcs))
-            pcs += additionals
-            pddf2 = pddf.reindex(pcs)
+                pcs = encode_patent_ids(pickle.load(infile), errors="coerce")
+            additionals = np.setdiff1d(pddf.index.to_numpy(), pcs)
+            pcs = np.concatenate([pcs, additionals])
+            pddf2 = pddf.reindex(pd.Index(pcs, name="PatID"))
             
             """save combined dataframe"""
             #pddf.sort_index(inplace=True)          # No sorting. We want the index in the same order as the CPC/IPC matrix
             pddf2.to_pickle(classification_scheme + "_sorted_" + outputfilepickle)
             pddf2.to_pickle(classification_scheme + "_sorted_" + outputfilepickle[:-4] + "_pickleProtocol2.pkl", protocol=2)
-            pddf2.rename_axis("Patent ID", inplace=True)
             pddf2.reset_index(inplace=True)
+            pddf2.insert(0, "Patent ID", decode_patent_ids(pddf2.pop("PatID")))
             pddf2.to_feather(classification_scheme + "_sorted_" + outputfilefeather)
 
 def pd_from_gi_table(df, framename):
-    idx = df.index
-    oldlen= -1
-    newlen = len(idx)
-    while oldlen != newlen:
-        oldlen = newlen
-        idx = [di[1:] if di[0]=="0" else di for di in idx]
-        newlen = len(idx)
-    new_df = pd.DataFrame(index=idx)
+    new_df = pd.DataFrame(index=df.index)
     new_df[framename] = True
     new_df = new_df[~new_df.index.duplicated(keep='first')]
     return new_df